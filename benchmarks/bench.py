@@ -0,0 +1,203 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+from eulith_web3.erc20 import TokenSymbol
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.signing import LocalSigner, construct_signing_middleware, sign_transaction
+from eulith_web3.swap import EulithSwapRequest
+from eulith_web3.uniswap import EulithUniswapPoolLookupRequest, UniswapPoolFee
+
+sys.path.insert(0, os.getcwd())
+from benchmarks.replay_server import DEFAULT_RECORDING, ReplayServer
+
+"""
+Micro-benchmarks for the client-side hot paths the examples use, run against the local replay server.
+
+Each operation is timed per call (p50/p99), along with the process CPU time it costs and the memory it allocates
+(tracemalloc, in a separate pass so tracing doesn't skew the timings). With the default zero server latency the
+numbers are almost entirely client overhead: web3 middlewares, JSON and ABI encoding, the websocket threads.
+
+Results are compared against benchmarks/baseline.json and the run fails if an operation got slower than the
+tolerance allows. Baselines are machine specific, so none is checked in: the first run on a machine saves its
+results as the baseline, and --save-baseline replaces it (e.g. after an intended change).
+
+    python benchmarks/bench.py
+    python benchmarks/bench.py --latency-ms 20 --only get_swap_quote
+"""
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# A throwaway key; nothing signed here leaves the machine
+BENCH_PRIVATE_KEY = '0x' + '01' * 32
+
+# Differences smaller than this are noise, whatever the ratio
+MIN_REGRESSION_US = 20.0
+
+
+@dataclass
+class OperationStats:
+    iterations: int
+    p50_us: float
+    p99_us: float
+    mean_us: float
+    cpu_us: float
+    alloc_kib: float      # peak traced memory during one call
+    retained_kib: float   # still allocated after the call, averaged
+
+
+class Context:
+    def __init__(self, ew3: EulithWeb3, wallet: LocalSigner):
+        self.ew3 = ew3
+        self.wallet = wallet
+        self.usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
+        self.weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
+        self.pool = ew3.v0.get_univ3_pool(EulithUniswapPoolLookupRequest(
+            token_a=self.usdc, token_b=self.weth, fee=UniswapPoolFee.FiveBips))
+        self.tx = {'from': wallet.address, 'to': self.weth.address, 'value': 10 ** 15, 'data': '0x',
+                   'nonce': 7, 'gas': 60000, 'chainId': 1, 'maxFeePerGas': 30 * 10 ** 9,
+                   'maxPriorityFeePerGas': 10 ** 9}
+
+
+def _atomic_round_trip(ctx: Context):
+    ctx.ew3.v0.start_atomic_transaction(ctx.wallet.address)
+    ctx.ew3.v0.commit_atomic_transaction()
+
+
+OPERATIONS: Dict[str, Callable[[Context], Any]] = {
+    'get_erc_token': lambda ctx: ctx.ew3.v0.get_erc_token(TokenSymbol.USDC),
+    'get_swap_quote': lambda ctx: ctx.ew3.v0.get_swap_quote(EulithSwapRequest(
+        sell_token=ctx.usdc, buy_token=ctx.weth, sell_amount=1000)),
+    'get_univ3_pool': lambda ctx: ctx.ew3.v0.get_univ3_pool(EulithUniswapPoolLookupRequest(
+        token_a=ctx.usdc, token_b=ctx.weth, fee=UniswapPoolFee.FiveBips)),
+    'pool.get_quote': lambda ctx: ctx.pool.get_quote(ctx.usdc, 1000),
+    'atomic_start_commit': _atomic_round_trip,
+    'balance_of_float': lambda ctx: ctx.usdc.balance_of_float(ctx.wallet.address),
+    'local_signer_sign': lambda ctx: sign_transaction(ctx.tx, ctx.wallet),
+}
+
+
+def measure(operation: Callable[[Context], Any], ctx: Context, iterations: int, warmup: int,
+            alloc_iterations: int) -> OperationStats:
+    for _ in range(warmup):
+        operation(ctx)
+
+    timings = np.empty(iterations)
+    gc.collect()
+    cpu_start = time.process_time()
+    for i in range(iterations):
+        start = time.perf_counter()
+        operation(ctx)
+        timings[i] = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    peaks = []
+    tracemalloc.start()
+    retained_start = tracemalloc.get_traced_memory()[0]
+    for _ in range(alloc_iterations):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        operation(ctx)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    retained = tracemalloc.get_traced_memory()[0] - retained_start
+    tracemalloc.stop()
+
+    timings *= 1e6
+    return OperationStats(iterations=iterations,
+                          p50_us=round(float(np.percentile(timings, 50)), 1),
+                          p99_us=round(float(np.percentile(timings, 99)), 1),
+                          mean_us=round(float(timings.mean()), 1),
+                          cpu_us=round(cpu * 1e6 / iterations, 1),
+                          alloc_kib=round(sum(peaks) / len(peaks) / 1024, 1) if peaks else 0.0,
+                          retained_kib=round(retained / max(alloc_iterations, 1) / 1024, 2))
+
+
+def regressions(results: Dict[str, OperationStats], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    found = []
+    for name, stats in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_us', 'cpu_us'):
+            old, new = previous[metric], getattr(stats, metric)
+            if new > old * (1 + tolerance) and new - old > MIN_REGRESSION_US:
+                found.append(f'{name} {metric}: {old} -> {new} (+{(new / old - 1) * 100:.0f}%)')
+    return found
+
+
+def print_table(results: Dict[str, OperationStats], baseline: Dict[str, Any]):
+    print(f'{"operation":<22}{"p50 us":>10}{"p99 us":>10}{"cpu us":>10}{"alloc KiB":>11}{"kept KiB":>10}'
+          f'{"vs base":>10}')
+    for name, s in results.items():
+        previous = baseline.get('results', {}).get(name)
+        change = f'{(s.p50_us / previous["p50_us"] - 1) * 100:+.0f}%' if previous else '-'
+        print(f'{name:<22}{s.p50_us:>10}{s.p99_us:>10}{s.cpu_us:>10}{s.alloc_kib:>11}{s.retained_kib:>10}'
+              f'{change:>10}')
+
+
+parser = argparse.ArgumentParser(
+    prog='Eulith client benchmarks',
+    description='Time the client hot paths against a local server replaying recorded responses.')
+
+parser.add_argument('--iterations', type=int, default=300)
+parser.add_argument('--warmup', type=int, default=20)
+parser.add_argument('--alloc-iterations', type=int, default=30)
+parser.add_argument('--latency-ms', type=float, default=0.0, help='simulated server latency per response')
+parser.add_argument('--jitter-ms', type=float, default=0.0)
+parser.add_argument('--recording', default=DEFAULT_RECORDING)
+parser.add_argument('--only', action='append', choices=list(OPERATIONS), help='run just this operation')
+parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown before failing, 0.25 = 25%%')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    wallet = LocalSigner(BENCH_PRIVATE_KEY)
+    names = args.only or list(OPERATIONS)
+    results: Dict[str, OperationStats] = {}
+
+    with ReplayServer(args.recording, args.latency_ms / 1000, args.jitter_ms / 1000) as server:
+        with EulithWeb3(server.url, 'offline', construct_signing_middleware(wallet)) as ew3:
+            ctx = Context(ew3, wallet)
+            for name in names:
+                results[name] = measure(OPERATIONS[name], ctx, args.iterations, args.warmup, args.alloc_iterations)
+
+    print_table(results, baseline)
+
+    if args.save_baseline or not baseline:
+        merged = {**baseline.get('results', {}), **{name: asdict(s) for name, s in results.items()}}
+        meta = {'python': platform.python_version(), 'machine': platform.machine(), 'latency_ms': args.latency_ms,
+                'iterations': args.iterations}
+        with open(args.baseline, 'w') as f:
+            json.dump({'meta': meta, 'results': merged}, f, indent=2, sort_keys=True)
+        later = '' if args.save_baseline else '; later runs compare against it'
+        print(f'\nBaseline saved to {args.baseline}{later}')
+        sys.exit(0)
+
+    if baseline.get('meta', {}).get('latency_ms', args.latency_ms) != args.latency_ms:
+        print('\nBaseline was recorded with a different --latency-ms; not comparing')
+        sys.exit(0)
+
+    slower = regressions(results, baseline, args.tolerance)
+    if slower:
+        print('\nRegressions against the baseline:')
+        for line in slower:
+            print(f'  {line}')
+        sys.exit(1)
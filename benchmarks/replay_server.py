@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+from typing import Any, Dict, List, Optional
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from websockets.exceptions import ConnectionClosed
+
+"""
+A local stand-in for the Eulith websocket endpoint that replays recorded JSON-RPC responses.
+
+Point EulithWeb3 at `ReplayServer.url` and every request is answered from a recording file after a configurable
+latency, so client-side costs can be measured offline and without the network's noise. A request matches a
+recorded one with identical params; failing that, the first response recorded for the same method is used (atomic
+commits, for instance, carry a fresh transaction id on every call). Methods that were never recorded get a
+JSON-RPC error back.
+
+Recordings are made by running the server in record mode in front of the real endpoint:
+
+    python benchmarks/replay_server.py --record --upstream wss://eth-main.eulithrpc.com/v0 --token $EULITH_TOKEN
+
+and pointing a script at the printed URL instead of eulithrpc.com.
+"""
+
+DEFAULT_RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'recordings', 'eth_main.json')
+
+
+def _params_key(params: Any) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+class Recording:
+    def __init__(self, entries: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        # method -> [{'params': [...], 'result': ...} or {'params': [...], 'error': {...}}]
+        self.entries = entries or {}
+        self._index = {(method, _params_key(e['params'])): e
+                       for method, recorded in self.entries.items() for e in recorded}
+
+    @classmethod
+    def load(cls, path: str) -> 'Recording':
+        try:
+            with open(path) as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls()
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def lookup(self, method: str, params: Any) -> Optional[Dict[str, Any]]:
+        entry = self._index.get((method, _params_key(params)))
+        if entry is None and self.entries.get(method):
+            entry = self.entries[method][0]
+        return entry
+
+    def add(self, method: str, params: Any, response: Dict[str, Any]) -> bool:
+        key = (method, _params_key(params))
+        if key in self._index:
+            return False
+        entry = {'params': params}
+        entry.update({k: response[k] for k in ('result', 'error') if k in response})
+        self.entries.setdefault(method, []).append(entry)
+        self._index[key] = entry
+        return True
+
+
+class _Replayer:
+    def __init__(self, recording: Recording, latency: float, jitter: float):
+        self.recording = recording
+        self.latency = latency
+        self.jitter = jitter
+
+    async def handle(self, websocket):
+        try:
+            async for message in websocket:
+                # Answer concurrently, like the real server, so pipelined requests don't queue behind each other
+                asyncio.create_task(self._respond(websocket, json.loads(message)))
+        except ConnectionClosed:
+            # EulithWeb3.terminate() drops the socket without a close frame
+            pass
+
+    async def _respond(self, websocket, request: Dict[str, Any]):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        entry = self.recording.lookup(request.get('method'), request.get('params', []))
+        if entry is None:
+            response['error'] = {'code': -32601, 'message': f'{request.get("method")} is not in the recording'}
+        else:
+            response.update({k: entry[k] for k in ('result', 'error') if k in entry})
+        await websocket.send(json.dumps(response))
+
+
+class _Recorder:
+    def __init__(self, recording: Recording, path: str, upstream: str, token: str):
+        self.recording = recording
+        self.path = path
+        self.upstream = upstream
+        self.token = token
+
+    async def handle(self, websocket):
+        pending: Dict[Any, Dict[str, Any]] = {}
+        path = websocket.request.path if websocket.request else ''
+        query = path[path.find('?'):] if '?' in path else ''
+        headers = {'Authorization': f'Bearer {self.token}'}
+
+        async with connect(self.upstream + query, additional_headers=headers, max_size=None) as upstream:
+            async def forward_responses():
+                async for message in upstream:
+                    response = json.loads(message)
+                    request = pending.pop(response.get('id'), None)
+                    if request and self.recording.add(request['method'], request.get('params', []), response):
+                        self.recording.save(self.path)
+                    await websocket.send(message)
+
+            reader = asyncio.create_task(forward_responses())
+            try:
+                async for message in websocket:
+                    request = json.loads(message)
+                    pending[request.get('id')] = request
+                    await upstream.send(message)
+            finally:
+                reader.cancel()
+
+
+async def serve_forever(handler, host: str, port: int, ready=None):
+    """
+    Serve `handler.handle` for every websocket connection on host:port (0 picks a free port) until cancelled. The
+    bound port is sent down the `ready` pipe end when one is given, printed otherwise. ws_load.py runs its load
+    server through this too.
+    """
+    async with serve(handler.handle, host, port, max_size=None) as server:
+        bound_port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.send(bound_port)
+            ready.close()
+        else:
+            print(f'Listening on http://{host}:{bound_port}/v0', flush=True)
+        await asyncio.get_running_loop().create_future()
+
+
+def _run(recording_path: str, host: str, port: int, latency: float, jitter: float, upstream: Optional[str],
+         token: Optional[str], ready=None):
+    recording = Recording.load(recording_path)
+    if upstream:
+        handler = _Recorder(recording, recording_path, upstream, token or '')
+    else:
+        handler = _Replayer(recording, latency, jitter)
+    try:
+        asyncio.run(serve_forever(handler, host, port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class ReplayServer:
+    """
+    Runs the replay server in a child process, so its CPU time and allocations stay out of the measurements.
+
+        with ReplayServer(latency=0.02) as server:
+            ew3 = EulithWeb3(server.url, 'token', ...)
+    """
+
+    def __init__(self, recording_path: str = DEFAULT_RECORDING, latency: float = 0.0, jitter: float = 0.0,
+                 host: str = '127.0.0.1', port: int = 0):
+        self.recording_path = recording_path
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def url(self) -> str:
+        # EulithWeb3 turns http:// into ws://
+        return f'http://{self.host}:{self.port}/v0'
+
+    def start(self) -> 'ReplayServer':
+        parent, child = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_run, args=(self.recording_path, self.host, self.port, self.latency, self.jitter, None, None, child),
+            daemon=True)
+        self._process.start()
+        child.close()
+        if not parent.poll(10):
+            self.stop()
+            raise RuntimeError('replay server did not start')
+        self.port = parent.recv()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+            self._process = None
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+parser = argparse.ArgumentParser(
+    prog='Eulith replay server',
+    description='Serve recorded Eulith JSON-RPC responses locally, or record them from the real endpoint.')
+
+parser.add_argument('--recording', default=DEFAULT_RECORDING, help='recording file to replay from or record to')
+parser.add_argument('--host', default='127.0.0.1')
+parser.add_argument('--port', type=int, default=8546)
+parser.add_argument('--latency-ms', type=float, default=0.0, help='delay before every response')
+parser.add_argument('--jitter-ms', type=float, default=0.0, help='extra uniformly random delay, up to this much')
+parser.add_argument('--record', action='store_true', help='proxy to --upstream and record what it answers')
+parser.add_argument('--upstream', default='wss://eth-main.eulithrpc.com/v0')
+parser.add_argument('--token', default=os.environ.get('EULITH_TOKEN'), help='Eulith token used when recording')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.record and not args.token:
+        parser.error('recording needs --token or EULITH_TOKEN')
+    _run(args.recording, args.host, args.port, args.latency_ms / 1000, args.jitter_ms / 1000,
+         args.upstream if args.record else None, args.token)
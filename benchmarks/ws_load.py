@@ -0,0 +1,404 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.websocket import EulithWebsocketRequestHandler, SubscribeRequest
+
+sys.path.insert(0, os.getcwd())
+from benchmarks.replay_server import serve_forever
+from utils.pending_tx_filter import PendingTxFilter, UNISWAP_V2_ROUTER_FUNCTIONS, UNISWAP_V3_ROUTER_FUNCTIONS, \
+    QUICKSWAP_V2_ROUTER, UNISWAP_V3_SWAP_ROUTER, UNISWAP_V3_SWAP_ROUTER_02
+from utils.price_stream import PriceAggregator
+
+"""
+Load and soak harness for websocket stream handlers.
+
+A local server (in a child process) answers eth_subscribe / eulith_subscribe like the Eulith endpoint and then
+pushes synthetic pending transactions or uni_prices ticks at a controlled rate, optionally in bursts. The handlers
+from the streaming examples (PendingTxFilter, PriceAggregator) run behind a probe that stamps every message with its
+end-to-end lag: server send to handler return.
+
+Each step reports offered and handled rate, p50/p99 lag, the backlog (messages the server has sent that the handler
+hasn't returned from yet, wherever they wait: socket, the provider's dispatch queue or the handler itself, plus the
+handler's own queue), messages that never made it through, and RSS. The backlog is counted from the two ends, so it
+doesn't depend on the provider's internals. `search` doubles the rate until a step fails, then bisects down to the highest rate that
+holds; `soak` runs one rate for a long time and fits RSS growth.
+
+    python benchmarks/ws_load.py search --handler pending
+    python benchmarks/ws_load.py soak --handler prices --rate 2000 --duration 3600
+"""
+
+POOL_ADDRESS = '0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640'
+POOL_SUBSCRIPTION_ID = '0xa11ce'
+PENDING_SUBSCRIPTION_ID = '0xb0b'
+
+
+# --- server side ---
+
+def _pending_bodies(count: int, match_ratio: float) -> List[str]:
+    exact_input_single = next(fn for fn in UNISWAP_V3_ROUTER_FUNCTIONS if fn.name == 'exactInputSingle'
+                              and len(fn.arg_types[0].split(',')) == 7)
+    bodies = []
+    for _ in range(count):
+        if random.random() < match_ratio:
+            to = UNISWAP_V3_SWAP_ROUTER_02
+            params = ('0x' + os.urandom(20).hex(), '0x' + os.urandom(20).hex(), 500, '0x' + os.urandom(20).hex(),
+                      random.randrange(10 ** 18), 0, 0)
+            data = exact_input_single.encode(params)
+        else:
+            to = '0x' + os.urandom(20).hex()
+            data = '0x' + os.urandom(4 + 32 * random.randrange(0, 6)).hex()
+        body = {'hash': '0x' + os.urandom(32).hex(), 'from': '0x' + os.urandom(20).hex(), 'to': to, 'input': data,
+                'value': hex(random.randrange(10 ** 17)), 'gas': hex(200000), 'nonce': hex(random.randrange(1000)),
+                'maxFeePerGas': hex(40 * 10 ** 9), 'maxPriorityFeePerGas': hex(2 * 10 ** 9), 'type': '0x2'}
+        bodies.append(json.dumps(body)[1:-1])
+    return bodies
+
+
+def _price_bodies(count: int) -> List[str]:
+    price, bodies = 0.00038, []
+    for _ in range(count):
+        price *= 1 + random.gauss(0, 0.0005)
+        bodies.append(f'"price":{price!r},"volume":{random.uniform(0.1, 50):.4f}')
+    return bodies
+
+
+class _LoadServer:
+    def __init__(self, rate, burst, sent, match_ratio: float):
+        self.rate = rate      # shared: messages per second per subscription
+        self.burst = burst    # shared: messages sent back to back
+        self.sent = sent      # shared: total messages sent
+        self.pending_bodies = _pending_bodies(512, match_ratio)
+        self.price_bodies = _price_bodies(512)
+
+    async def handle(self, websocket):
+        emitters = []
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                method = request.get('method')
+                if method in ('eth_subscribe', 'eulith_subscribe'):
+                    sub_id = PENDING_SUBSCRIPTION_ID if method == 'eth_subscribe' else POOL_SUBSCRIPTION_ID
+                    await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': sub_id}))
+                    emitters.append(asyncio.create_task(self._emit(websocket, sub_id)))
+                elif method in ('eth_unsubscribe', 'eulith_unsubscribe'):
+                    await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request['id'], 'result': True}))
+                else:
+                    await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'),
+                                                     'error': {'code': -32601, 'message': f'{method} not served'}}))
+        finally:
+            for emitter in emitters:
+                emitter.cancel()
+
+    def _message(self, sub_id: str, seq: int, now: float) -> str:
+        if sub_id == PENDING_SUBSCRIPTION_ID:
+            body = self.pending_bodies[seq % len(self.pending_bodies)]
+            result = f'{{"load_seq":{seq},"load_ts":{now!r},{body}}}'
+        else:
+            body = self.price_bodies[seq % len(self.price_bodies)]
+            result = f'{{"load_seq":{seq},"load_ts":{now!r},"data":{{"block_number":{seq // 100},{body}}}}}'
+        return f'{{"jsonrpc":"2.0","method":"eth_subscription","params":{{"subscription":"{sub_id}",' \
+               f'"result":{result}}}}}'
+
+    async def _emit(self, websocket, sub_id: str):
+        seq, rate, start, due_base = 0, 0.0, time.monotonic(), 0
+        while True:
+            if self.rate.value != rate:
+                # Restart the schedule on every rate change so a step doesn't inherit the last one's debt
+                rate, start, due_base = self.rate.value, time.monotonic(), seq
+            if rate <= 0:
+                await asyncio.sleep(0.05)
+                continue
+
+            burst = max(1, self.burst.value)
+            due = int((time.monotonic() - start) * rate) + due_base - seq
+            if due >= burst:
+                now = time.time()
+                for _ in range(due - due % burst):
+                    await websocket.send(self._message(sub_id, seq, now))
+                    seq += 1
+                with self.sent.get_lock():
+                    self.sent.value += due - due % burst
+            await asyncio.sleep(max(burst / rate, 0.001))
+
+
+def _run_server(host: str, rate, burst, sent, match_ratio: float, ready):
+    try:
+        asyncio.run(serve_forever(_LoadServer(rate, burst, sent, match_ratio), host, 0, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class LoadServer:
+    def __init__(self, match_ratio: float = 0.05, host: str = '127.0.0.1'):
+        self.host = host
+        self.port = 0
+        self.match_ratio = match_ratio
+        self._rate = multiprocessing.Value('d', 0.0, lock=False)
+        self._burst = multiprocessing.Value('i', 1, lock=False)
+        self._sent = multiprocessing.Value('Q', 0)
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/v0'
+
+    @property
+    def sent(self) -> int:
+        return self._sent.value
+
+    def set_rate(self, rate: float, burst: int = 1):
+        self._burst.value = burst
+        self._rate.value = rate
+
+    def start(self) -> 'LoadServer':
+        parent, child = multiprocessing.Pipe(duplex=False)
+        self._process = multiprocessing.Process(
+            target=_run_server, args=(self.host, self._rate, self._burst, self._sent, self.match_ratio, child),
+            daemon=True)
+        self._process.start()
+        child.close()
+        if not parent.poll(10):
+            self.stop()
+            raise RuntimeError('load server did not start')
+        self.port = parent.recv()
+        return self
+
+    def stop(self):
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join(5)
+            self._process = None
+
+    def __enter__(self) -> 'LoadServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+# --- client side ---
+
+class _Probe(EulithWebsocketRequestHandler):
+    """
+    Wraps a handler and records each message's lag from the server's send to the wrapped handler returning.
+    """
+
+    def __init__(self, inner: EulithWebsocketRequestHandler):
+        self.inner = inner
+        self.handled = 0
+        self.errors = 0
+        self.lags: List[float] = []
+        self._lock = threading.Lock()
+
+    def handle_result(self, message: Dict[Any, Any]):
+        self.inner.handle_result(message)
+        sent_at = message.get('params', {}).get('result', {}).get('load_ts')
+        lag = time.time() - sent_at if sent_at is not None else None
+        # The provider calls this from several worker threads at once
+        with self._lock:
+            if lag is not None:
+                self.lags.append(lag)
+            self.handled += 1
+
+    def handle_error(self, message: Dict[Any, Any]):
+        self.errors += 1
+        self.inner.handle_error(message)
+
+    def take_lags(self) -> np.ndarray:
+        with self._lock:
+            lags, self.lags = self.lags, []
+        return np.array(lags)
+
+
+def rss_mib() -> float:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+
+
+@dataclass
+class StepResult:
+    target_rate: float
+    offered_rate: float
+    handled_rate: float
+    p50_lag_ms: float
+    p99_lag_ms: float
+    max_backlog: int
+    unhandled: int
+    handler_dropped: int
+    rss_mib: float
+
+    def healthy(self, lag_budget_ms: float) -> bool:
+        return (self.handled_rate >= 0.95 * self.offered_rate and self.p99_lag_ms <= lag_budget_ms
+                and self.unhandled == 0 and self.handler_dropped == 0)
+
+    def __str__(self):
+        return (f'target {self.target_rate:>9.0f}/s  offered {self.offered_rate:>9.0f}/s  '
+                f'handled {self.handled_rate:>9.0f}/s  lag p50 {self.p50_lag_ms:>8.1f}ms p99 {self.p99_lag_ms:>8.1f}ms  '
+                f'backlog {self.max_backlog:>7}  unhandled {self.unhandled:>6}  dropped {self.handler_dropped:>6}  '
+                f'rss {self.rss_mib:.1f}MiB')
+
+
+class LoadHarness:
+    def __init__(self, ew3: EulithWeb3, server: LoadServer, handler: str):
+        self.ew3 = ew3
+        self.server = server
+
+        if handler == 'pending':
+            self.inner = PendingTxFilter(
+                lambda calls: None, functions=UNISWAP_V2_ROUTER_FUNCTIONS + UNISWAP_V3_ROUTER_FUNCTIONS,
+                addresses=[QUICKSWAP_V2_ROUTER, UNISWAP_V3_SWAP_ROUTER, UNISWAP_V3_SWAP_ROUTER_02]).start()
+            request = SubscribeRequest(args=['newPendingTransactions'])
+        else:
+            self.inner = PriceAggregator()
+            request = SubscribeRequest(subscription_type='uni_prices', args={'pool_address': POOL_ADDRESS})
+
+        self.probe = _Probe(self.inner)
+        self.ew3.eulith_service.subscribe(request, self.probe)
+
+    def backlog(self) -> int:
+        # Sent but not yet handled (the server counts a burst once it's written, so this can briefly dip below 0),
+        # plus whatever the handler queued for itself
+        in_flight = max(0, self.server.sent - self.probe.handled)
+        handler_backlog = getattr(self.inner, 'backlog', None)
+        return in_flight + (handler_backlog() if handler_backlog is not None else 0)
+
+    def handler_dropped(self) -> int:
+        metrics = getattr(self.inner, 'metrics', None)
+        return metrics.dropped if metrics is not None else 0
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.probe.handled >= self.server.sent and self.backlog() == 0:
+                return True
+            time.sleep(0.05)
+        return False
+
+    def step(self, rate: float, seconds: float, burst: int = 1) -> StepResult:
+        self.drain()
+        self.probe.take_lags()
+        sent_start, handled_start, dropped_start = self.server.sent, self.probe.handled, self.handler_dropped()
+
+        self.server.set_rate(rate, burst)
+        start = time.monotonic()
+        max_backlog = 0
+        while time.monotonic() - start < seconds:
+            max_backlog = max(max_backlog, self.backlog())
+            time.sleep(0.05)
+        elapsed = time.monotonic() - start
+        offered = self.server.sent - sent_start
+        handled = self.probe.handled - handled_start
+        self.server.set_rate(0)
+
+        # Whatever is still queued after a grace period counts as lost for a live stream
+        self.drain(timeout=2.0)
+        lags = self.probe.take_lags() * 1000
+        unhandled = max(0, (self.server.sent - sent_start) - (self.probe.handled - handled_start))
+        return StepResult(target_rate=rate, offered_rate=offered / elapsed, handled_rate=handled / elapsed,
+                          p50_lag_ms=float(np.percentile(lags, 50)) if len(lags) else 0.0,
+                          p99_lag_ms=float(np.percentile(lags, 99)) if len(lags) else 0.0,
+                          max_backlog=max_backlog, unhandled=unhandled,
+                          handler_dropped=self.handler_dropped() - dropped_start, rss_mib=rss_mib())
+
+    def search(self, start_rate: float, seconds: float, lag_budget_ms: float, burst: int, refine: int,
+               max_rate: float) -> Optional[float]:
+        good, bad, rate = None, None, start_rate
+        while rate <= max_rate:
+            result = self.step(rate, seconds, burst)
+            print(result, flush=True)
+            if result.offered_rate < 0.9 * rate:
+                print('The generator could not reach the target rate; the handler is faster than this harness')
+                return good
+            if not result.healthy(lag_budget_ms):
+                bad = rate
+                break
+            good, rate = rate, rate * 2
+
+        if bad is None:
+            return good
+        low, high = good or 0.0, bad
+        for _ in range(refine):
+            rate = (low + high) / 2
+            result = self.step(rate, seconds, burst)
+            print(result, flush=True)
+            if result.healthy(lag_budget_ms):
+                low = rate
+            else:
+                high = rate
+        return low or None
+
+    def soak(self, rate: float, duration: float, sample_interval: float, burst: int):
+        self.drain()
+        self.probe.take_lags()
+        samples = []
+        start = time.monotonic()
+        sent_start, handled_start = self.server.sent, self.probe.handled
+        self.server.set_rate(rate, burst)
+        try:
+            while time.monotonic() - start < duration:
+                time.sleep(sample_interval)
+                elapsed = time.monotonic() - start
+                lags = self.probe.take_lags() * 1000
+                samples.append((elapsed, rss_mib()))
+                print(f'{elapsed:>8.0f}s  rss {samples[-1][1]:.1f}MiB  backlog {self.backlog():>7}  '
+                      f'lag p99 {np.percentile(lags, 99) if len(lags) else 0.0:.1f}ms  '
+                      f'unhandled {max(0, self.server.sent - sent_start - (self.probe.handled - handled_start))}',
+                      flush=True)
+        finally:
+            self.server.set_rate(0)
+
+        if len(samples) >= 2:
+            times, rss = np.array(samples).T
+            slope = np.polyfit(times, rss, 1)[0] * 3600
+            print(f'\nRSS {rss[0]:.1f} -> {rss[-1]:.1f}MiB, trend {slope:+.2f}MiB/hour over {times[-1]:.0f}s')
+
+
+parser = argparse.ArgumentParser(
+    prog='Websocket stream load harness',
+    description='Push synthetic subscription traffic at the streaming handlers and measure how they keep up.')
+
+parser.add_argument('mode', choices=['search', 'soak', 'step'])
+parser.add_argument('--handler', choices=['pending', 'prices'], default='pending')
+parser.add_argument('--rate', type=float, default=1000.0, help='messages/s; the starting rate for search')
+parser.add_argument('--burst', type=int, default=1, help='send messages in back-to-back bursts of this size')
+parser.add_argument('--seconds', type=float, default=5.0, help='length of each step')
+parser.add_argument('--lag-budget-ms', type=float, default=250.0, help='p99 lag above this fails a step')
+parser.add_argument('--refine', type=int, default=3, help='bisection steps after the first failing rate')
+parser.add_argument('--max-rate', type=float, default=1_000_000.0)
+parser.add_argument('--match-ratio', type=float, default=0.05, help='share of pending txs that hit the router filter')
+parser.add_argument('--duration', type=float, default=3600.0, help='soak length in seconds')
+parser.add_argument('--sample-interval', type=float, default=10.0)
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    with LoadServer(args.match_ratio) as server:
+        with EulithWeb3(server.url, 'offline') as ew3:
+            harness = LoadHarness(ew3, server, args.handler)
+            try:
+                if args.mode == 'step':
+                    print(harness.step(args.rate, args.seconds, args.burst))
+                elif args.mode == 'search':
+                    saturation = harness.search(args.rate, args.seconds, args.lag_budget_ms, args.burst, args.refine,
+                                                args.max_rate)
+                    if saturation:
+                        print(f'\n{args.handler}: sustains about {saturation:.0f} messages/s '
+                              f'(p99 lag under {args.lag_budget_ms:.0f}ms, nothing lost)')
+                    else:
+                        print(f'\n{args.handler}: did not hold even {args.rate:.0f} messages/s')
+                else:
+                    harness.soak(args.rate, args.duration, args.sample_interval, args.burst)
+            finally:
+                if isinstance(harness.inner, PendingTxFilter):
+                    harness.inner.stop()
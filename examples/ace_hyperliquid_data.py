@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 
 from eulith_web3.eulith_web3 import EulithWeb3
 from eulith_web3.hyperliquid.rpc import HyperliquidGetDataRequest, HyperliquidDataType
@@ -7,18 +8,48 @@ from eulith_web3.signing import LocalSigner, construct_signing_middleware
 
 sys.path.insert(0, os.getcwd())
 from utils.banner import print_banner
+from utils.hyperliquid_cache import HyperliquidCache
 from utils.settings import *
 
+WATCH_SYMBOLS = ['BTC', 'ETH', 'SOL']
+
 wallet = LocalSigner(PRIVATE_KEY)
 
 with EulithWeb3("https://poly-main.eulithrpc.com/v0", EULITH_TOKEN, construct_signing_middleware(wallet)) as ew3:
     print_banner()
 
+    account_address = '0xACEE62283c41aEBD7B4E79B2A0031b07b07763f3'  # your Hyperliquid account address
+    ace_address = '0xfc11e697f23e5cbbed3c59ac249955da57e57672'  # your ACE address
+
     data_request = HyperliquidGetDataRequest(
-        account_address='0xACEE62283c41aEBD7B4E79B2A0031b07b07763f3',  # your Hyperliquid account address
+        account_address=account_address,
         data_type=HyperliquidDataType.MID_PRICES,
-        ace_address=ew3.to_checksum_address('0xfc11e697f23e5cbbed3c59ac249955da57e57672')  # your ACE address
+        ace_address=ew3.to_checksum_address(ace_address)
     )
 
     data = ew3.hyperliquid.get_data(data_request)
     print(data)
+
+    # Keep the data fresh instead: mid prices every second, open orders every 5s, at most 2 requests/s between
+    # them. Subscribers only hear about symbols whose value changed since the last poll.
+    cache = HyperliquidCache(ew3, account_address, ace_address, requests_per_second=2.0, burst=4)
+    cache.add_feed(HyperliquidDataType.MID_PRICES, interval=1.0)
+    cache.add_feed(HyperliquidDataType.OPEN_ORDERS, interval=5.0, keep_history=False)
+
+    def on_mids(data_type, changes):
+        print(', '.join(f'{symbol} {price}' for symbol, price in changes.items()))
+
+    cache.subscribe(on_mids, HyperliquidDataType.MID_PRICES, symbols=WATCH_SYMBOLS)
+
+    print(f'\nWatching {", ".join(WATCH_SYMBOLS)} mid prices for 10s...')
+    with cache:
+        time.sleep(10)
+
+    for symbol in WATCH_SYMBOLS:
+        history = cache.history(symbol)
+        if history:
+            prices = history['value']
+            print(f'{symbol}: {len(prices)} changes, last {prices[-1]}, range {prices.min()} - {prices.max()}')
+
+    for data_type, stats in cache.stats().items():
+        print(f'{data_type}: {stats}')
@@ -6,7 +6,10 @@ from eulith_web3.signing import construct_signing_middleware, LocalSigner
 
 sys.path.insert(0, os.getcwd())
 from utils.settings import PRIVATE_KEY, EULITH_TOKEN
+from utils.atomic_bundle import AtomicBundle
 from utils.banner import print_banner
+from utils.preflight import Preflight
+from utils.receipt_watcher import ReceiptWatcher
 
 
 """
@@ -27,9 +30,6 @@ if __name__ == '__main__':
         print("Creating execution contract if not exist...")
         ew3.v0.ensure_toolkit_contract(wallet.address)
 
-        print("Starting atomic transaction\n")
-        ew3.v0.start_atomic_transaction(wallet.address)
-
         t1_send_amount_in_eth = 0.0001  # amount sending to first wallet in eth
         t2_send_amount_in_eth = 0.0001  # amount sending to second wallet in eth
         eth_needed = t1_send_amount_in_eth + t2_send_amount_in_eth
@@ -47,13 +47,13 @@ if __name__ == '__main__':
               f'transaction 2 wallet address {t2_wallet_address}')
 
         try:
-            ew3.eth.send_transaction({'from': wallet.address,
-                                      'to': t1_wallet_address,
-                                      'value': hex(int(t1_send_amount_in_eth * 1e18))})  # 1e18 converts value to wei
-            ew3.eth.send_transaction({'from': wallet.address,
-                                      'to': t2_wallet_address,
-                                      'value': hex(int(t2_send_amount_in_eth * 1e18))})
-            atomic_tx = ew3.v0.commit_atomic_transaction()
+            # Both legs are built locally and committed together in a single request
+            bundle = AtomicBundle(ew3, wallet.address)
+            bundle.transfer(t1_wallet_address, int(t1_send_amount_in_eth * 1e18))  # 1e18 converts value to wei
+            bundle.transfer(t2_wallet_address, int(t2_send_amount_in_eth * 1e18))
+            atomic_tx = bundle.commit()
+            # Catch a revert (and size the gas limit) before anything is signed
+            Preflight(ew3).prepare(atomic_tx)
         except Exception as e:
             print("Error: Failed to execute transactions or commit atomic transaction:", str(e))
             exit(1)
@@ -62,7 +62,8 @@ if __name__ == '__main__':
 
         try:
             tx_hash = ew3.eth.send_transaction(atomic_tx)
-            receipt = ew3.eth.wait_for_transaction_receipt(tx_hash)
+            with ReceiptWatcher(ew3) as receipts:
+                receipt = receipts.wait(tx_hash)
             print(f"\nTransaction hash: {receipt['transactionHash'].hex()}")
         except web3.exceptions.TimeExhausted:
             print("Error: Transaction not found in the chain after 120 seconds. Try the atomic transaction again.")
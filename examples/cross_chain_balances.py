@@ -0,0 +1,43 @@
+import os
+import sys
+
+from eulith_web3.erc20 import TokenSymbol
+from eulith_web3.signing import LocalSigner
+
+sys.path.insert(0, os.getcwd())
+from utils.balances import snapshot_balances
+from utils.banner import print_banner
+from utils.chains import ChainManager
+from utils.rpc_metrics import RpcMetrics
+from utils.settings import PRIVATE_KEY, EULITH_TOKEN
+
+
+def wallet_balances(ew3, address):
+    usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
+    # Native and USDC balances come from one call, read at the same block
+    balances = snapshot_balances(ew3, [None, usdc], [address], labels=['native', 'USDC'])
+    return balances.get('native', address), balances.get('USDC', address), ew3.eth.gas_price / 1e9
+
+
+if __name__ == '__main__':
+    print_banner()
+
+    wallet = LocalSigner(PRIVATE_KEY)
+    # Set EULITH_RPC_METRICS=1 to print per-chain, per-method RPC latencies at the end
+    rpc_metrics = RpcMetrics.from_env()
+
+    # One connection per chain, all signing with the same wallet; eth, arb and poly are queried at the same time
+    with ChainManager(EULITH_TOKEN, wallet, on_connect=lambda chain, ew3: rpc_metrics.install(ew3)) as chains:
+        balances = chains.fan_out(wallet_balances, wallet.address)
+
+        for chain in chains.names:
+            result = balances.results[chain]
+            if not result.ok:
+                print(f'{chain}: failed, {result.error}')
+                continue
+            native, usdc, gas_gwei = result.value
+            print(f'{chain}: {native:.6f} native, {usdc:.2f} USDC, gas {gas_gwei:.2f} gwei ({result.latency:.2f}s)')
+
+        print(f'\nRead {len(balances.results)} chains in {balances.elapsed:.2f}s')
+
+    rpc_metrics.report()
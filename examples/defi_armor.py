@@ -1,19 +1,20 @@
 import os
 import sys
 
-import boto3
 from eth_typing import ChecksumAddress
-from eulith_web3.exceptions import EulithRpcException
 
 from eulith_web3.erc20 import EulithERC20, TokenSymbol, EulithWETH
 from eulith_web3.eulith_web3 import EulithWeb3
-from eulith_web3.kms import KmsSigner
 from eulith_web3.signer import Signer
 from eulith_web3.signing import LocalSigner, construct_signing_middleware
 from eulith_web3.contract_bindings.safe.i_safe import ISafe
 
 sys.path.insert(0, os.getcwd())
 from utils.banner import print_banner
+from utils.gas import GasPricer, Urgency
+from utils.kms import KmsSignerFactory
+from utils.preflight import Preflight
+from utils.signatures import collect_signatures
 from utils.settings import EULITH_TOKEN
 
 EULITH_URL = "https://poly-main.eulithrpc.com/v0"
@@ -23,12 +24,14 @@ AWS_CREDENTIALS_PROFILE_NAME = "default"
 def defi_armor():
     print_banner()
 
-    # Retrieve our keys from AWS.
-    session = boto3.Session(profile_name=AWS_CREDENTIALS_PROFILE_NAME)
-    wallet = get_kms_key(session, "ARMOR_AUTH_ADDRESS")
-    owner1 = get_kms_key(session, "ARMOR_OWNER1")
-    owner2 = get_kms_key(session, "ARMOR_OWNER2")
-    owner3 = get_kms_key(session, "ARMOR_OWNER3")
+    # Retrieve our keys from AWS. All four share one KMS client and are resolved concurrently; after the first run
+    # their addresses come from a local cache and no KMS calls are made until something needs signing.
+    signers = KmsSignerFactory.shared(profile_name=AWS_CREDENTIALS_PROFILE_NAME)
+    keys = signers.prefetch(["ARMOR_AUTH_ADDRESS", "ARMOR_OWNER1", "ARMOR_OWNER2", "ARMOR_OWNER3"])
+    wallet = keys["ARMOR_AUTH_ADDRESS"]
+    owner1 = keys["ARMOR_OWNER1"]
+    owner2 = keys["ARMOR_OWNER2"]
+    owner3 = keys["ARMOR_OWNER3"]
     safe_owners = [owner1, owner2, owner3]
 
     print()
@@ -67,7 +70,8 @@ def defi_armor():
 
         print()
         print(f"/*** setting up whitelist for {owner1.address} ***\\")
-        wl = create_new_whitelist(ew3, ew3.to_checksum_address(wallet.address), [owner1.address], safe_owners)
+        wl = create_new_whitelist(ew3, ew3.to_checksum_address(wallet.address), [owner1.address], safe_owners,
+                                  read_threshold)
         print(f'==> whitelist contents: {wl}')
 
         # Run two transactions to demonstrate the application of the DeFiArmor policy.
@@ -87,8 +91,10 @@ def defi_armor():
 
         tx_params = ew3.v0.commit_atomic_transaction()
         tx_params["from"] = wallet.address
+        Preflight(ew3).prepare(tx_params)
 
-        tx = ew3.eth.send_transaction(increase_gas_price_by_factor(tx_params, 10))
+        # Price off recent fee history rather than multiplying the node's suggestion by 10
+        tx = ew3.eth.send_transaction(GasPricer(ew3).apply(tx_params, Urgency.NEXT_BLOCK))
 
         print(f"==> got transaction hash for good transaction ({tx.hex()})\n")
 
@@ -132,24 +138,20 @@ def deploy_new_armor(ew3, wallet, safe_owners):
     print(f"==> armor address: {armor_address}")
     print(f"==> safe address:  {safe_address}")
 
-    owner_addresses = []
-    count = 0
+    owner_addresses = [safe_owner.address for safe_owner in safe_owners]
     threshold = 2
 
     safe = ISafe(ew3, ew3.to_checksum_address(safe_address))
     if not safe.is_module_enabled(ew3.to_checksum_address(armor_address)):
         print()
         print("/*** enabling armor on safe ***\\")
-        for safe_owner in safe_owners:
-            owner_addresses.append(safe_owner.address)
-            if count < threshold:
-                print(f"==> submitting module signature for {safe_owner.address}")
-                try:
-                    status = ew3.v0.submit_enable_module_signature(wallet.address, safe_owner)
-                    assert status
-                except EulithRpcException:
-                    continue
-            count += 1
+        # Ask `threshold` owners at a time, in order; the next owner is only asked when one of them fails
+        report = collect_signatures(lambda owner: ew3.v0.submit_enable_module_signature(wallet.address, owner),
+                                    safe_owners, threshold)
+        print(f"==> module signatures: {report}")
+        if not report.met:
+            print("==> not enough owners signed to enable armor, aborting")
+            exit(1)
 
         print(f"==> setting threshold to {threshold}")
         print(f"==> setting owners to {', '.join(owner_addresses)}")
@@ -167,7 +169,8 @@ def deploy_new_armor(ew3, wallet, safe_owners):
     return armor_address, safe_address
 
 
-def create_new_whitelist(ew3: EulithWeb3, auth_address: ChecksumAddress, addresses: [str], owners: [Signer]):
+def create_new_whitelist(ew3: EulithWeb3, auth_address: ChecksumAddress, addresses: [str], owners: [Signer],
+                         threshold: int = None):
     current_wl = ew3.v0.get_current_client_whitelist(auth_address)
     current_wl_addresses = set(current_wl.get('active', {}).get('sorted_addresses', []))
 
@@ -182,33 +185,16 @@ def create_new_whitelist(ew3: EulithWeb3, auth_address: ChecksumAddress, address
     else:
         list_id = draft_wl.get('list_id', 0)
 
-    for o in owners:
-        try:
-            status = ew3.v0.submit_draft_client_whitelist_signature(list_id, o)
-            assert status
-        except EulithRpcException:
-            continue
+    report = collect_signatures(lambda owner: ew3.v0.submit_draft_client_whitelist_signature(list_id, owner),
+                                owners, threshold)
+    print(f'==> whitelist signatures: {report}')
+    if not report.met:
+        print('==> not enough owners signed the draft whitelist, aborting')
+        exit(1)
 
     return ew3.v0.get_current_client_whitelist(auth_address).get('active', {}).get('sorted_addresses', [])
 
 
-def increase_gas_price_by_factor(data, factor):
-    gas_keys = ['maxPriorityFeePerGas', 'maxFeePerGas']
-
-    for key in gas_keys:
-        int_value = int(data[key], 16)
-        doubled_value = int_value * factor
-        data[key] = hex(doubled_value)
-
-    return data
-
-
-def get_kms_key(session, key_name: str) -> KmsSigner:
-    formatted_key_name = f"alias/{key_name}"
-    client = session.client("kms")
-    return KmsSigner(client, formatted_key_name)
-
-
 if __name__ == "__main__":
     print(
         "WARNING: This example requires substantial funds to execute (in the area of 0.3 ETH depending on gas price).\n"
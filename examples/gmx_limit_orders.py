@@ -1,9 +1,13 @@
 from eulith_web3.erc20 import TokenSymbol
 from eulith_web3.eulith_web3 import EulithWeb3
-from eulith_web3.gmx import GMXClient
+from eulith_web3.gmx.gmx import GMXClient
 from eulith_web3.signing import LocalSigner, construct_signing_middleware
 
 from utils.banner import print_banner
+from utils.gmx_ladder import LadderLevel, OrderCache, OrderLadder
+from utils.portfolio import PortfolioTracker
+from utils.preflight import Preflight
+from utils.receipt_watcher import ReceiptWatcher
 from utils.settings import PRIVATE_KEY, EULITH_TOKEN
 
 if __name__ == '__main__':
@@ -21,30 +25,47 @@ if __name__ == '__main__':
 
         weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
 
-        # You can query for your existing positions easily
-        # Note that the lists in this method are linked respectively. In other words, if you pass:
-        # [weth, wbtc], [weth, wbtc], [True, False]
-        # You're asking for (WETH/WETH/LONG), (WETH/WBTC/SHORT) positions
-        positions = gc.get_positions(ew3.to_checksum_address(wallet.address), [weth], [weth], [True])
-
-        if len(positions) > 0:
-            # Here are some of the fields available on these position objects
-            # There are many others. Have a look at the class underlying to see all available fields
-            exposure = positions[0].position_size_denom_usd
-            collateral = positions[0].collateral_size_denom_usd
-
-        # Creates a buy limit order
-        # (position_token, pay_token, true_for_long, amount_in, size_delta_usd, limit_price_usd, approve_erc)
-        # Creates a buy order for $5k USD worth of ETH, paying 1 ETH at $1,500 limit price
-        buy_limit_order = gc.create_increase_order(weth, weth, True, 1.0, 5000, 1500, True)
-        print(ih.get('transactionHash').hex())
-
-        # Creates a sell limit order
-        # (position_token, collateral_token, size_delta_usd, collateral_delta_usd, true_for_long, limit_price_usd)
-        # Creates a sell order for $5k USD worth of ETH, unwinding $2k USD worth of collateral at $2,000 limit price
-        h = gc.create_decrease_order(weth, weth, 5000, 2000, True, 2000)
-        print(h.get('transactionHash').hex())
-
-        # NOTE: The frontend won't let you submit both of these orders at the same time, but the contracts
+        # Orders placed atomically belong to msg.sender inside the atomic transaction, and so do the positions they
+        # open, their refunds and what decreases pay out. Placing them from a Safe keeps those under your control
+        # (the ladder refuses the toolkit contract, where they would be stranded). The Safe pays for the orders, so
+        # fund it with the WETH and the execution fees first. See defi_armor.py for deploying one.
+        armor_address, safe_address = ew3.v0.get_armor_and_safe_addresses(wallet.address)
+
+        # The tracker reads the WETH balances and the Safe's (collateral WETH / index WETH / LONG) position once,
+        # then on every block re-reads only what that block's Transfer and GMX position events touched.
+        # Reads from the tracker don't make RPC calls, so a strategy loop can check them as often as it likes.
+        with PortfolioTracker(ew3, [weth], [wallet.address, safe_address], gmx_account=safe_address,
+                              gmx_positions=[(weth, weth, True)]) as portfolio:
+            position = portfolio.position(weth.address, weth.address, True)
+            if position:
+                # Here are some of the fields available on these position objects
+                # There are many others. Have a look at the class underlying to see all available fields
+                exposure = position.position_size_denom_usd
+                collateral = position.collateral_size_denom_usd
+                print(f'WETH long: ${exposure:.2f} exposure, ${collateral:.2f} collateral, '
+                      f'{portfolio.snapshot.leverage(weth.address, weth.address, True):.2f}x leverage')
+            print(f'Safe WETH balance: {portfolio.balance(weth.symbol(), safe_address)}')
+
+        # A ladder of 10 buy limit orders for $5k USD worth of ETH in total, paying 1 WETH, between $1,500 and
+        # $1,590, and 5 sell limit orders unwinding that $5k and $2k USD worth of collateral between $2,000 and
+        # $2,200. Every order, the GMX plugin approval and a single WETH approval go out as one atomic transaction,
+        # rather than one transaction (and approval) per order.
+        ladder = OrderLadder(ew3, wallet.address, safe_address, gc)
+        ladder.increase(weth, weth, True, LadderLevel.spread(1500, 1590, 10, 5000, total_amount_in=1.0))
+        ladder.decrease(weth, weth, True, LadderLevel.spread(2000, 2200, 5, 5000, total_collateral_delta_usd=2000))
+        ladder_tx = ladder.commit()
+        Preflight(ew3).prepare(ladder_tx)
+
+        # The cache follows the OrderBook's events, so checking it in a loop costs no RPC calls
+        with OrderCache(ew3, safe_address, gc) as orders, ReceiptWatcher(ew3) as receipts:
+            receipt = receipts.wait(ew3.eth.send_transaction(ladder_tx))
+            print(f'Ladder of {len(ladder)} orders placed: {receipt["transactionHash"].hex()}')
+            # The receipt can arrive ahead of the order logs; one read catches up with anything not yet seen
+            orders.sync()
+            for order in orders.open_orders():
+                side = 'buy' if order.increase else 'sell'
+                print(f'  {side} #{order.index}: ${order.size_delta_usd:.2f} at ${order.trigger_price_usd:.2f}')
+
+        # NOTE: The frontend won't let you submit buy and sell orders at the same time, but the contracts
         # don't mind. In other words, you can have a sell limit order pending at the same time as a buy limit order
         # of course, the sell won't execute unless the buy executes.
@@ -1,12 +1,11 @@
 import os
 import sys
 
-import boto3
 from botocore import exceptions
-from eulith_web3.kms import KmsSigner
 
 sys.path.insert(0, os.getcwd())
 from utils.banner import print_banner
+from utils.kms import KmsSignerFactory
 
 """
 NOTE: in order to run.sh this example, you must have a correctly configured KMS key with AWS credentials in your ~/.aws
@@ -23,13 +22,11 @@ if __name__ == '__main__':
     if key_name == '<THE_NAME_OF_YOUR_KEY_GOES_HERE>':
         key_name = input('Enter the name of your KMS key: ')
 
-    formatted_key_name = f'alias/{key_name}'
-
-    session = boto3.Session(profile_name=aws_credentials_profile_name)
-    client = session.client('kms')
+    # The factory remembers the key's address on disk, so later runs don't need to call KMS to build the signer
+    signers = KmsSignerFactory.shared(profile_name=aws_credentials_profile_name)
 
     try:
-        kms_signer = KmsSigner(client, formatted_key_name)
+        kms_signer = signers.signer(key_name)
     except exceptions.NoCredentialsError:
         print(f'Was not able to locate aws credentials for profile '
               f'{aws_credentials_profile_name} in ~/.aws/credentials\n')
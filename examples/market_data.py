@@ -1,6 +1,5 @@
 import os
 import sys
-import statistics
 
 from eulith_web3.eulith_web3 import *
 from eulith_web3.signing import construct_signing_middleware, LocalSigner
@@ -11,6 +10,10 @@ from eulith_web3.swap import EulithLiquiditySource
 sys.path.insert(0, os.getcwd())
 from utils.settings import PRIVATE_KEY, EULITH_TOKEN
 from utils.banner import print_banner
+from utils.quotes import fan_out_quotes
+from utils.quote_matrix import QuoteMatrix
+from utils.rpc_cache import RpcCache
+from utils.rpc_metrics import RpcMetrics
 
 
 if __name__ == '__main__':
@@ -18,6 +21,8 @@ if __name__ == '__main__':
 
     wallet = LocalSigner(PRIVATE_KEY)
     with EulithWeb3("https://eth-main.eulithrpc.com/v0", EULITH_TOKEN, construct_signing_middleware(wallet)) as ew3:
+        # Set EULITH_RPC_METRICS=1 to print per-method RPC latencies at the end
+        rpc_metrics = RpcMetrics.from_env().install(ew3)
 
         print("\n\nRetrieving live market data...")
 
@@ -33,27 +38,42 @@ if __name__ == '__main__':
                   EulithLiquiditySource.BALANCER_V1]
 
         token_symbols = [TokenSymbol.WETH, TokenSymbol.USDT, TokenSymbol.LINK, TokenSymbol.MATIC, TokenSymbol.STETH]
-        tokens = [ew3.v0.get_erc_token(t) for t in token_symbols]
+        # Set EULITH_RPC_CACHE=1 to serve the token lookups from disk after the first run
+        rpc_cache = RpcCache.from_env()
+        tokens = [rpc_cache.get_erc_token(ew3, t) for t in token_symbols]
 
         sell_amount = 10
         slippage_tolerance = 0.01
-        sell_token = ew3.v0.get_erc_token(TokenSymbol.USDC)
-
-        market_data = []
-
-        for token in tokens:
-            for dex in venues:
-                swap_params = EulithSwapRequest(
-                    sell_token=sell_token,
-                    buy_token=token,
-                    sell_amount=sell_amount,
-                    liquidity_source=dex,
-                    slippage_tolerance=slippage_tolerance)
-
-                try:
-                    price, txs = ew3.v0.get_swap_quote(swap_params)
-                    print(f"Price for {token.symbol} on {dex}: {price:.4f} USDC")
-                except EulithRpcException as e:
-                    continue
-        else:
+        sell_token = rpc_cache.get_erc_token(ew3, TokenSymbol.USDC)
+
+        # Every token x venue quote is requested at once. Venues that error or miss their deadline are dropped.
+        market_data = fan_out_quotes(ew3, sell_token, tokens, venues, sell_amount, slippage_tolerance,
+                                     max_workers=16, quote_timeout=5.0, sweep_timeout=15.0)
+
+        # One vectorized pass gives best price, median, spread and outliers for every token at once.
+        # On the next sweep, matrix.update() refreshes single cells in place before calling analyze() again.
+        matrix = QuoteMatrix.from_grid(market_data)
+        analytics = matrix.analyze()
+
+        for i, symbol in enumerate(matrix.tokens):
+            for quote in market_data.for_token(symbol):
+                print(f"Price for {symbol} on {quote.venue}: {quote.price:.4f} USDC ({quote.latency:.2f}s)")
+
+            if analytics.best_venue[i] < 0:
+                continue
+
+            print(f"Best price for {symbol}: {analytics.best_price[i]:.4f} USDC on {matrix.venues[analytics.best_venue[i]]}")
+            print(f"Median price for {symbol}: {analytics.median[i]:.4f} USDC, "
+                  f"spread {analytics.spread_bps[i]:.1f} bps")
+            outliers = matrix.outlier_venues(analytics, symbol)
+            if outliers:
+                print(f"Outlier venues for {symbol}: {', '.join(str(v) for v in outliers)}")
+            print()
+
+        if len(market_data) == 0:
             print("No valid prices obtained")
+
+        print(f"Swept {len(market_data)} quotes in {market_data.elapsed:.2f}s "
+              f"({len(market_data.failures)} venues dropped)")
+
+        rpc_metrics.report()
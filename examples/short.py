@@ -7,29 +7,45 @@ from eulith_web3.requests import EulithShortOnRequest
 from eulith_web3.signing import LocalSigner, construct_signing_middleware
 
 sys.path.insert(0, os.getcwd())
+from utils.balances import snapshot_balances
 from utils.banner import print_banner
+from utils.gas import GasPricer
+from utils.nonce_manager import NonceManager
+from utils.preflight import Preflight
+from utils.receipt_watcher import ReceiptWatcher
 from utils.settings import *
+from utils.rpc_cache import RpcCache
 
 if __name__ == '__main__':
     print_banner()
 
     wallet = LocalSigner(PRIVATE_KEY)
     with EulithWeb3('https://eth-main.eulithrpc.com/v0', EULITH_TOKEN, construct_signing_middleware(wallet)) as ew3:
-        toolkit_address = ew3.v0.ensure_toolkit_contract(wallet.address)
+        # Set EULITH_RPC_CACHE=1 to serve these lookups from disk after the first run
+        rpc_cache = RpcCache.from_env()
+        toolkit_address = rpc_cache.ensure_toolkit_contract(ew3, wallet.address)
 
-        usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
-        weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
+        usdc = rpc_cache.get_erc_token(ew3, TokenSymbol.USDC)
+        weth = rpc_cache.get_erc_token(ew3, TokenSymbol.WETH)
 
         collateral_amount = 5
 
-        toolkit_balance = usdc.balance_of_float(toolkit_address)
+        # Both transactions below get their nonces locally, so the short doesn't wait on the funding transfer
+        nonces = NonceManager(ew3, wallet.address, fill_fees=GasPricer(ew3).apply)
+
+        # The wallet's and the toolkit's USDC come from one call, read at the same block
+        balances = snapshot_balances(ew3, [usdc], [wallet.address, toolkit_address], labels=['USDC'])
+        toolkit_balance = balances.get('USDC', toolkit_address)
         if toolkit_balance < collateral_amount * 1.05:
+            if balances.get('USDC', wallet.address) < collateral_amount * 1.05:
+                print(f'Please send at least {collateral_amount * 1.05} USDC to {wallet.address} to fund the short')
+                exit(1)
             # NOTE: moving funds to the toolkit contract is NOT necessary when using a Gnosis Safe, and therefore
             # is our recommendation for production trading
             print('Funding the toolkit contract to prepare for the short...')
             transfer_collateral_to_contract = usdc.transfer_float(toolkit_address, collateral_amount * 1.05,
                                                                   {'gas': 100000, 'from': wallet.address})
-            ew3.eth.send_transaction(transfer_collateral_to_contract)
+            nonces.send(transfer_collateral_to_contract)
 
         short_on_params = EulithShortOnRequest(
             collateral_token=usdc,
@@ -43,8 +59,10 @@ if __name__ == '__main__':
 
         # Example tx: https://etherscan.io/tx/0x836cc827e417c066c17bf92032fab0507172a9ac4ca030059bbe9d584804c222
         tx = ew3.v0.commit_atomic_transaction()
-        tx['gas'] = 1000000
-        tx_hash = ew3.eth.send_transaction(tx)
+        # Simulate against the pending block so a just-sent funding transfer counts; raises instead of reverting
+        Preflight(ew3).prepare(tx, 'pending')
+        tx_hash = nonces.send(tx)
 
-        r = ew3.eth.wait_for_transaction_receipt(tx_hash)
+        with ReceiptWatcher(ew3) as receipts:
+            r = receipts.wait(tx_hash)
         print(f'Short tx hash: {r["transactionHash"].hex()}')
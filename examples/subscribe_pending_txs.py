@@ -1,47 +1,43 @@
 import os
 import sys
-import time
-from typing import Dict
+from typing import List
 
 from eulith_web3.eulith_web3 import EulithWeb3
-from eulith_web3.websocket import EulithWebsocketRequestHandler
 
 sys.path.insert(0, os.getcwd())
+from utils.async_runtime import AsyncSubscriptionRuntime
 from utils.banner import print_banner
+from utils.pending_tx_filter import PendingTxFilter, DecodedCall, UNISWAP_V2_ROUTER_FUNCTIONS, \
+    UNISWAP_V3_ROUTER_FUNCTIONS, QUICKSWAP_V2_ROUTER, UNISWAP_V3_SWAP_ROUTER, UNISWAP_V3_SWAP_ROUTER_02
 from utils.settings import EULITH_TOKEN
 
 
-class MyCustomStreamHandler(EulithWebsocketRequestHandler):
-    def __init__(self, ew3: EulithWeb3):
-        self.ew3 = ew3
-
-    def handle_result(self, message: Dict):
-        result = message.get('params', {}).get('result', {})
-        tx_from = result.get('from')
-        tx_to = result.get('to')
-        tx_data = result.get('input')
-        tx_value = result.get('value')
-
-        print(f'##### Pending Tx ######')
-        print(f'from: {tx_from}')
-        print(f'to: {tx_to}')
-        print(f'data: {tx_data}')
-        print(f'value: {tx_value}\n')
-
-
-    def handle_error(self, message: Dict):
-        print(f'received an error {message}')
+def print_swaps(calls: List[DecodedCall]):
+    for call in calls:
+        print(f'##### Pending {call.function} ######')
+        print(f'hash: {call.tx_hash}')
+        print(f'from: {call.tx_from}')
+        print(f'router: {call.tx_to}')
+        print(f'value: {call.value}')
+        print(f'args: {call.args}\n')
 
 
 if __name__ == '__main__':
     print_banner()
 
     with EulithWeb3('https://poly-main.eulithrpc.com/v0', EULITH_TOKEN) as ew3:
-        pending_tx_handler = MyCustomStreamHandler(ew3)
-
-        ew3.v0.subscribe_pending_transactions(pending_tx_handler)
-
-        while True:
-            # Just want to keep the main thread alive to allow the subscription thread to run
-            # You can CRTL-c to exit
-            time.sleep(1)
+        # Only swaps sent straight to the big routers get decoded; everything else is dropped after two set lookups
+        pending_tx_handler = PendingTxFilter(
+            print_swaps,
+            functions=UNISWAP_V2_ROUTER_FUNCTIONS + UNISWAP_V3_ROUTER_FUNCTIONS,
+            addresses=[QUICKSWAP_V2_ROUTER, UNISWAP_V3_SWAP_ROUTER, UNISWAP_V3_SWAP_ROUTER_02]).start()
+
+        # The filter's set lookups run on the websocket threads, so only matches reach the loop, and decoding stays on
+        # the filter's worker thread; the loop only hands matches over and runs the metrics printout.
+        # You can CRTL-c to exit
+        runtime = AsyncSubscriptionRuntime(ew3)
+        runtime.subscribe_pending_transactions(pending_tx_handler)
+        runtime.every(10.0, lambda: print(f'filter: {pending_tx_handler.metrics}\n'))
+        runtime.run_forever()
+
+        pending_tx_handler.stop()
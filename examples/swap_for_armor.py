@@ -8,6 +8,8 @@ sys.path.insert(0, os.getcwd())
 from utils.banner import print_banner
 from utils.settings import *
 from utils.common import check_wallet_balance
+from utils.preflight import Preflight, PreflightFailed
+from utils.rpc_cache import RpcCache
 
 if __name__ == '__main__':
     """
@@ -27,8 +29,10 @@ if __name__ == '__main__':
 
         print('Starting swap example...\n')
 
-        weth = ew3.eulith_get_erc_token(TokenSymbol.WETH)
-        usdc = ew3.eulith_get_erc_token(TokenSymbol.USDC)
+        # Set EULITH_RPC_CACHE=1 to serve these lookups from disk after the first run
+        rpc_cache = RpcCache.from_env()
+        weth = rpc_cache.get_erc_token(ew3, TokenSymbol.WETH)
+        usdc = rpc_cache.get_erc_token(ew3, TokenSymbol.USDC)
 
         amount = 2
 
@@ -37,7 +41,7 @@ if __name__ == '__main__':
             buy_token=weth,
             sell_amount=amount)
 
-        armor, safe = ew3.v0.get_armor_and_safe_addresses(wallet.address)
+        armor, safe = rpc_cache.get_armor_and_safe_addresses(ew3, wallet.address)
 
         ew3.v0.start_atomic_transaction(wallet.address, gnosis=safe)
 
@@ -46,6 +50,12 @@ if __name__ == '__main__':
         print(f'Swapping at price: {round(price, 5)} USDC per WETH')
 
         final_tx = ew3.v0.commit_atomic_transaction()
+        try:
+            Preflight(ew3).prepare(final_tx)
+        except PreflightFailed as e:
+            print(f'Not sending the swap: {e}')
+            exit(1)
+
         rec = ew3.eth.send_transaction(final_tx)
 
         print(f"\nSwap tx hash: {rec.hex()}")
@@ -6,27 +6,38 @@ from eulith_web3.eulith_web3 import EulithWeb3
 from eulith_web3.signing import LocalSigner, construct_signing_middleware
 
 sys.path.insert(0, os.getcwd())
+from utils.atomic_bundle import AtomicBundle
+from utils.balances import snapshot_balances
 from utils.banner import print_banner
+from utils.gas import GasPricer
+from utils.nonce_manager import NonceManager
+from utils.receipt_watcher import ReceiptWatcher
 from utils.settings import *
+from utils.rpc_cache import RpcCache
 
 if __name__ == '__main__':
     print_banner()
 
     wallet = LocalSigner(PRIVATE_KEY)
     with EulithWeb3("https://eth-main.eulithrpc.com/v0", EULITH_TOKEN, construct_signing_middleware(wallet)) as ew3:
-        wallet_balance = ew3.eth.get_balance(wallet.address) / 10 ** 18
-        if wallet_balance < 0.008:
-            print(f'Insufficient wallet balance to run the example. '
-                  f'Please send at least 0.01 ETH to {wallet.address} to continue')
-            exit(1)
-
-        toolkit_contract_address = ew3.v0.ensure_toolkit_contract(wallet.address)
+        # Set EULITH_RPC_CACHE=1 to serve these lookups from disk after the first run
+        rpc_cache = RpcCache.from_env()
+        toolkit_contract_address = rpc_cache.ensure_toolkit_contract(ew3, wallet.address)
         print(f'Toolkit contract wallet address: {toolkit_contract_address}\n')
 
-        weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
+        weth = rpc_cache.get_erc_token(ew3, TokenSymbol.WETH)
         withdraw_amount = 0.001
 
-        weth_toolkit_balance = weth.balance_of_float(toolkit_contract_address)
+        # Both balances come from one call, read at the same block
+        balances = snapshot_balances(ew3, [None, weth], [wallet.address, toolkit_contract_address],
+                                     labels=['ETH', 'WETH'])
+
+        if balances.get('ETH', wallet.address) < 0.008:
+            print(f'Insufficient wallet balance to run the example. '
+                  f'Please send at least 0.01 ETH to {wallet.address} to continue')
+            exit(1)
+
+        weth_toolkit_balance = balances.get('WETH', toolkit_contract_address)
         print(f'Toolkit contract WETH balance: {weth_toolkit_balance}')
 
         if weth_toolkit_balance < withdraw_amount:
@@ -36,17 +47,24 @@ if __name__ == '__main__':
 
         # Going to approve our wallet inside an atomic tx so that our wallet is free to call transfer_from
         # on the toolkit contract. Within an atomic tx, msg.sender is the toolkit contract (NOT your wallet)
-        ew3.v0.start_atomic_transaction(wallet.address)
+        atomic_tx = AtomicBundle(ew3, wallet.address) \
+            .erc20_approve(weth.address, wallet.address, weth.float_to_int(withdraw_amount)) \
+            .commit()
 
-        approval_tx = weth.approve_float(wallet.address, withdraw_amount)
-        ew3.eth.send_transaction(approval_tx)
-
-        atomic_tx = ew3.v0.commit_atomic_transaction()
-        tx_hash = ew3.eth.send_transaction(atomic_tx)
+        # Nonces are assigned locally, so the withdraw can go out right behind the approval instead of waiting a
+        # block for its receipt. The withdraw carries an explicit gas limit because it can't be estimated until the
+        # approval is mined.
+        nonces = NonceManager(ew3, wallet.address, fill_fees=GasPricer(ew3).apply)
+        tx_hash = nonces.send(atomic_tx)
         print(f'Approve wallet from the toolkit contract tx: {tx_hash.hex()}')
-        ew3.eth.wait_for_transaction_receipt(tx_hash)
 
         withdraw_weth_from_toolkit_tx = weth.transfer_from_float(
             toolkit_contract_address, wallet.address, withdraw_amount, {'from': wallet.address, 'gas': 100000})
-        tx_hash = ew3.eth.send_transaction(withdraw_weth_from_toolkit_tx)
-        print(f'Withdraw tx: {tx_hash.hex()}')
+        withdraw_tx_hash = nonces.send(withdraw_weth_from_toolkit_tx)
+        print(f'Withdraw tx: {withdraw_tx_hash.hex()}')
+
+        # Both receipts come back from the same per-block batch
+        with ReceiptWatcher(ew3) as receipts:
+            approval_receipt, withdraw_receipt = receipts.wait_all([tx_hash, withdraw_tx_hash])
+        print(f'Approval mined in block {approval_receipt["blockNumber"]}, '
+              f'withdraw mined in block {withdraw_receipt["blockNumber"]}')
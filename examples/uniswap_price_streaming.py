@@ -1,34 +1,24 @@
+import math
 import os
 import sys
-import threading
-import time
 from typing import Dict
 
 from eulith_web3.erc20 import TokenSymbol
 from eulith_web3.eulith_web3 import EulithWeb3
-from eulith_web3.uniswap import EulithUniswapPoolLookupRequest, UniswapPoolFee
-from eulith_web3.websocket import EulithWebsocketRequestHandler
+from eulith_web3.uniswap import UniswapPoolFee
 
 sys.path.insert(0, os.getcwd())
+from utils.async_runtime import AsyncSubscriptionRuntime
 from utils.banner import print_banner
+from utils.pool_subscriptions import PoolSubscriptionManager
+from utils.price_stream import PriceAggregator
 from utils.settings import *
+from utils.uniswap_pools import PoolRegistry
 
 
-class MyCustomStreamHandler(EulithWebsocketRequestHandler):
-    def __init__(self, ew3):
-        self.ew3 = ew3
-
-    def handle_result(self, message: Dict):
-        result = message.get('params', {}).get('result', {})
-        if type(result) == dict:
-            data = result.get('data', None)
-            if data:
-                price = data.get('price', None)
-                block_number = data.get('block_number')
-
-                print(f'Received price {1 / price} USDC/WETH at block {block_number}')
-
+class MyCustomStreamHandler(PriceAggregator):
     def handle_error(self, message: Dict):
+        super().handle_error(message)
         print(f'received an error {message}')
 
 
@@ -37,21 +27,38 @@ if __name__ == '__main__':
 
     with EulithWeb3('https://eth-main.eulithrpc.com/v0', EULITH_TOKEN) as ew3:
         weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
-        usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
+        quote_tokens = [ew3.v0.get_erc_token(symbol) for symbol in
+                        (TokenSymbol.USDC, TokenSymbol.USDT, TokenSymbol.WBTC, TokenSymbol.LINK)]
 
-        pool_lookup_usdc_weth = EulithUniswapPoolLookupRequest(
-            token_a=weth,
-            token_b=usdc,
-            fee=UniswapPoolFee.FiveBips
-        )
+        # One event loop hosts the subscriptions and the periodic printout; CTRL-c unsubscribes and exits cleanly
+        runtime = AsyncSubscriptionRuntime(ew3)
+        # Every pool shares the one websocket connection, so watching more of them doesn't add connections or threads
+        subscriptions = PoolSubscriptionManager(runtime)
 
-        weth_usdc_pool = ew3.v0.get_univ3_pool(pool_lookup_usdc_weth)
+        # Pool addresses are derived locally from the factory, so this doesn't cost a round trip
+        pools = PoolRegistry(ew3)
+        labels = {}
+        for token in quote_tokens:
+            for fee in (UniswapPoolFee.FiveBips, UniswapPoolFee.ThirtyBips):
+                pool = pools.get_pool(weth, token, fee)
+                # Pools quote token1 per token0; invert when WETH is token1 so every row reads as <token>/WETH
+                invert = weth.address.lower() > token.address.lower()
+                subscriptions.add_pool(pool, MyCustomStreamHandler(invert=invert))
+                labels[pool.address.lower()] = f'{token.symbol()}/WETH {fee.value / 10000:.2f}%'
 
-        handler = MyCustomStreamHandler(ew3)
+        def print_stats():
+            # Reading the aggregated stats never blocks the subscriptions
+            for address, label in labels.items():
+                stats = subscriptions.handler(address).stats
+                if stats is None:
+                    continue
 
-        subscribe_thread = threading.Thread(target=weth_usdc_pool.subscribe_prices, args=(handler,), daemon=True)
-        subscribe_thread.start()
+                # The VWAP is NaN when the feed carries no volume
+                vwap = '' if math.isnan(stats.vwap) else f'VWAP {stats.vwap:.6g} | '
+                print(f'{label:<18} {stats.price:.6g} at block {stats.block_number} | '
+                      f'block OHLC {stats.bar_open:.6g}/{stats.bar_high:.6g}/{stats.bar_low:.6g}/{stats.bar_close:.6g} | '
+                      f'EWMA {stats.ewma:.6g} | {vwap}vol {stats.volatility * 1e4:.2f} bps | {stats.ticks} ticks')
+            print()
 
-        while True:
-            # Just want to keep the program alive to show the subscription prices coming in
-            time.sleep(1)
+        runtime.every(1.0, print_stats)
+        runtime.run_forever()
@@ -4,11 +4,13 @@ import sys
 from eulith_web3.erc20 import TokenSymbol
 from eulith_web3.eulith_web3 import EulithWeb3
 from eulith_web3.signing import LocalSigner, construct_signing_middleware
-from eulith_web3.uniswap import UniswapPoolFee, EulithUniswapPoolLookupRequest
+from eulith_web3.uniswap import UniswapPoolFee
 
 sys.path.insert(0, os.getcwd())
 from utils.banner import print_banner
 from utils.settings import *
+from utils.uniswap_pools import PoolRegistry
+from utils.univ3_sim import fetch_snapshot, simulate_ladder
 
 if __name__ == '__main__':
     print_banner()
@@ -21,25 +23,31 @@ if __name__ == '__main__':
 
         pool_fee = UniswapPoolFee.FiveBips
 
-        target_pool = ew3.v0.get_univ3_pool(EulithUniswapPoolLookupRequest(
-            fee=pool_fee,
-            token_a=weth,
-            token_b=usdc
-        ))
+        # Pool addresses are derived locally from the factory, so this doesn't cost a round trip
+        target_pool = PoolRegistry(ew3).get_pool(weth, usdc, pool_fee)
+
+        # Snapshot the pool once; every size below is then simulated locally instead of costing a get_quote call
+        snapshot = fetch_snapshot(ew3, target_pool)
+        sell_token_is_zero = weth.address == snapshot.token0
 
         # The volume of the transaction you're trying to front run
         pending_tx_volume = 1.5
-        price_1, fee_1, request_details_pending = target_pool.get_quote(sell_token=weth, amount=pending_tx_volume)
-
-        # The sqrt limit price AFTER the pending tx confirms
-        after_pending_sqrt_limit = request_details_pending.get('sqrt_limit_price')
-        print(f'After PENDING tx confirms sqrt limit: {after_pending_sqrt_limit}')
-
         your_target_volume = 10
+
         # Your transaction ahead of the pending tx
         total_volume = your_target_volume + pending_tx_volume
-        price_2, fee_2, request_details_target = target_pool.get_quote(sell_token=weth, amount=total_volume)
+        after_pending, after_both = simulate_ladder(
+            snapshot, sell_token_is_zero, [weth.float_to_int(pending_tx_volume), weth.float_to_int(total_volume)])
+
+        # The sqrt limit price AFTER the pending tx confirms
+        print(f'After PENDING tx confirms sqrt limit: {after_pending.sqrt_limit_price}')
 
         # The sqrt limit price AFTER your transaction confirms AND the pending tx confirms
-        after_both_sqrt_limit = request_details_target.get('sqrt_limit_price')
-        print(f'After BOTH txs confirms sqrt limit:   {after_both_sqrt_limit}')
+        print(f'After BOTH txs confirms sqrt limit:   {after_both.sqrt_limit_price}')
+
+        # Sizing a trade is cheap enough to sweep a whole ladder of candidate volumes at once
+        ladder_volumes = [pending_tx_volume + v for v in (1, 2, 5, 10, 20, 50)]
+        ladder = simulate_ladder(snapshot, sell_token_is_zero, [weth.float_to_int(v) for v in ladder_volumes])
+        for volume, result in zip(ladder_volumes, ladder):
+            print(f'{volume:>6} WETH -> {usdc.int_to_float(result.amount_out):.2f} USDC, '
+                  f'sqrt limit {result.sqrt_limit_price}')
@@ -12,11 +12,19 @@ function show_help() {
   echo "  -m               |  Getting DEX market data: prices, spread, gas fees, etc"
   echo "  -p               |  Stream prices from Uniswap pool"
   echo "  -d               |  Defi Armor"
+  echo "  -n               |  Wallet balances and gas prices on eth, arb and poly at once"
+  echo "  -b               |  Benchmark client operations against recorded responses (offline)"
+  echo "  -R               |  Start the warm runner; most other options then run on it instead of starting cold"
   echo -e "\nIf you would like to examine the code for the examples, have a look at the files in the examples folder.\n"
 }
 
+# Runs on the warm runner (-R) when one is listening, directly otherwise
+function run_example() {
+  python utils/runner.py run "$@"
+}
+
 function run_simple_transfer() {
-  python examples/simple_transfer.py "$1"
+  run_example examples/simple_transfer.py "$1"
 }
 
 if [ $# -eq 0 ]; then
@@ -26,35 +34,41 @@ fi
 
 source venv/bin/activate
 
-while getopts "h?ekst:cuampdw" opt; do
+while getopts "h?ekst:cuampdwxbnR" opt; do
   case "$opt" in
     h|\?)
       show_help
       exit 0
       ;;
-    e) python examples/erc20_handling.py
+    e) run_example examples/erc20_handling.py
       ;;
     k) python examples/kms_signer.py
       ;;
-    s) python examples/swap_for_armor.py
+    s) run_example examples/swap_for_armor.py
       ;;
-    w) python examples/swap_for_wallet.py
+    w) run_example examples/swap_for_wallet.py
       ;;
     t) run_simple_transfer $OPTARG
       ;;
-    c) python examples/transfer_from_toolkit.py
+    c) run_example examples/transfer_from_toolkit.py
       ;;
-    u) python examples/uniswap_sqrtlimit_quote.py
+    u) run_example examples/uniswap_sqrtlimit_quote.py
       ;;
-    a) python examples/atomic_transactions.py
+    a) run_example examples/atomic_transactions.py
       ;;
-    m) python examples/market_data.py
+    m) run_example examples/market_data.py
       ;;
     p) python examples/uniswap_price_streaming.py
       ;;
     d) python examples/defi_armor.py
       ;;
-    x) python examples/short.py
+    x) run_example examples/short.py
+      ;;
+    n) run_example examples/cross_chain_balances.py
+      ;;
+    b) python benchmarks/bench.py
+      ;;
+    R) python utils/runner.py serve
       ;;
   esac
 done
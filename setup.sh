@@ -10,6 +10,6 @@ python3 -m venv venv
 source venv/bin/activate
 echo "START installing dependencies..."
 pip install --upgrade pip > /dev/null 2>&1
-pip install eulith-web3 > /dev/null 2>&1
+pip install eulith-web3 numpy > /dev/null 2>&1
 echo "DONE installing dependencies"
 python utils/setup.py "$1"
\ No newline at end of file
@@ -0,0 +1,30 @@
+import os
+import sys
+
+from eulith_web3.erc20 import TokenSymbol
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.signing import LocalSigner, construct_signing_middleware
+from eulith_web3.uniswap import UniswapPoolFee
+
+sys.path.insert(0, os.getcwd())
+from utils.settings import *
+from utils.uniswap_pools import PoolRegistry
+from utils.univ3_sim import record_fixture
+
+"""
+Record tests/fixtures/univ3_recorded_eth_main_weth_usdc.json: a snapshot of the WETH/USDC 5 bps pool and the sqrt limit
+prices `get_quote` returns for selling a ladder of WETH sizes, all from one block. Run from the repo root:
+
+    python tests/record_univ3_fixture.py
+"""
+
+if __name__ == '__main__':
+    wallet = LocalSigner(PRIVATE_KEY)
+    with EulithWeb3("https://eth-main.eulithrpc.com/v0", EULITH_TOKEN, construct_signing_middleware(wallet)) as ew3:
+        weth = ew3.v0.get_erc_token(TokenSymbol.WETH)
+        usdc = ew3.v0.get_erc_token(TokenSymbol.USDC)
+        pool = PoolRegistry(ew3).get_pool(weth, usdc, UniswapPoolFee.FiveBips)
+
+        path = os.path.join('tests', 'fixtures', 'univ3_recorded_eth_main_weth_usdc.json')
+        fixture = record_fixture(ew3, pool, weth, [0.5, 1.5, 5, 11.5, 25, 50, 100], path)
+        print(f'recorded {len(fixture["quotes"])} quotes at {fixture["source"]} to {path}')
@@ -0,0 +1,97 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.gas import GWEI, FeeHistory, GasPricer, Urgency, compute_fees
+
+"""
+Fee pricing against fee histories in tests/fixtures/fee_history_<chain>.json, stored as the node's `eth_feeHistory`
+response (see tests/record_fee_histories.py). Each holds 5 blocks; the next block's base fee is the last entry of
+`baseFeePerGas`.
+"""
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def _raw(chain: str) -> dict:
+    with open(os.path.join(FIXTURES, f'fee_history_{chain}.json')) as f:
+        return json.load(f)
+
+
+def _history(chain: str) -> FeeHistory:
+    return FeeHistory.from_rpc(_raw(chain))
+
+
+@pytest.mark.parametrize('urgency, max_fee, tip', [
+    # Next base fee 24 gwei; the tip is the median of the urgency's reward percentile over the 5 blocks
+    (Urgency.NEXT_BLOCK, 24 * GWEI * 2 + 2 * GWEI, 2 * GWEI),
+    (Urgency.FAST, 36 * GWEI + GWEI // 10, GWEI // 10),
+    (Urgency.ECONOMICAL, 27 * GWEI + GWEI // 20, GWEI // 20),
+])
+def test_mainnet_tiers(urgency, max_fee, tip):
+    history = _history('eth')
+    quote = compute_fees(history, urgency, chain_id=1)
+    assert (quote.max_fee_per_gas, quote.max_priority_fee_per_gas) == (max_fee, tip)
+    assert quote.base_fee == 24 * GWEI
+    assert quote.block_number == history.newest_block + 1
+
+
+@pytest.mark.parametrize('urgency', list(Urgency))
+def test_arbitrum_pays_no_tip(urgency):
+    quote = compute_fees(_history('arb'), urgency, chain_id=42161)
+    assert quote.max_priority_fee_per_gas == 0
+    assert quote.max_fee_per_gas == int(10 ** 7 * urgency.headroom)
+
+
+@pytest.mark.parametrize('urgency, tip', [
+    (Urgency.NEXT_BLOCK, 55 * GWEI),
+    (Urgency.FAST, 32 * GWEI),
+    # The 10th percentile's median is 27 gwei, below Polygon's 30 gwei minimum
+    (Urgency.ECONOMICAL, 30 * GWEI),
+])
+def test_polygon_priority_fee_floor(urgency, tip):
+    quote = compute_fees(_history('poly'), urgency, chain_id=137)
+    assert quote.max_priority_fee_per_gas == tip
+    assert quote.max_fee_per_gas == int(95 * GWEI * urgency.headroom) + tip
+
+
+def test_save_load_round_trip(tmp_path):
+    history = _history('eth')
+    path = str(tmp_path / 'history.json')
+    history.save(path)
+    assert FeeHistory.load(path) == history
+
+
+class _Eth:
+    def __init__(self, raw: dict):
+        self.raw = raw
+        self.block_number = int(raw['oldestBlock'], 16) + len(raw['gasUsedRatio']) - 1
+        self.calls = 0
+
+    def fee_history(self, block_count, newest_block, percentiles):
+        self.calls += 1
+        return self.raw
+
+
+def test_apply_fills_committed_tx():
+    eth = _Eth(_raw('eth'))
+    pricer = GasPricer(SimpleNamespace(chain_id=1, eth=eth))
+    # The shape commit_atomic_transaction hands back: a legacy gas price the pricer has to replace
+    tx = {'from': '0x' + '11' * 20, 'to': '0x' + '22' * 20, 'data': '0x12345678', 'gas': 500000,
+          'gasPrice': 30 * GWEI}
+
+    assert pricer.apply(tx, Urgency.FAST) is tx
+    assert 'gasPrice' not in tx
+    assert tx['maxFeePerGas'] == hex(36 * GWEI + GWEI // 10)
+    assert tx['maxPriorityFeePerGas'] == hex(GWEI // 10)
+
+    # Same head: the history is reused
+    pricer.apply(dict(tx), Urgency.NEXT_BLOCK)
+    assert eth.calls == 1
+    eth.block_number += 1
+    pricer.apply(dict(tx))
+    assert eth.calls == 2
@@ -0,0 +1,103 @@
+import json
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+from eth_keys import keys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.kms import KmsSignerFactory
+
+"""
+KmsSignerFactory against a stub KMS client: secp256k1 keys held locally, answering get_public_key and sign in the
+formats KMS uses (DER SubjectPublicKeyInfo and DER ECDSA signatures), with a delay per call so concurrency shows.
+"""
+
+# DER SubjectPublicKeyInfo header for an uncompressed secp256k1 point, as KMS returns for ECC_SECG_P256K1 keys
+_SPKI_PREFIX = bytes.fromhex('3056301006072a8648ce3d020106052b8104000a034200')
+
+
+class StubKms:
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.meta = SimpleNamespace(region_name='us-east-1')
+        self.keys = {}
+        self.calls = {'get_public_key': 0, 'sign': 0}
+        self.max_concurrent = 0
+        self._running = 0
+        self._lock = threading.Lock()
+
+    def add_key(self, key_id: str) -> str:
+        self.keys[key_id] = keys.PrivateKey(os.urandom(32))
+        return self.keys[key_id].public_key.to_checksum_address()
+
+    def _call(self, name: str):
+        with self._lock:
+            self.calls[name] += 1
+            self._running += 1
+            self.max_concurrent = max(self.max_concurrent, self._running)
+        time.sleep(self.latency)
+        with self._lock:
+            self._running -= 1
+
+    def get_public_key(self, KeyId):
+        self._call('get_public_key')
+        return {'KeyId': KeyId, 'PublicKey': _SPKI_PREFIX + b'\x04' + self.keys[KeyId].public_key.to_bytes()}
+
+    def sign(self, KeyId, Message, MessageType, SigningAlgorithm):
+        self._call('sign')
+        signature = self.keys[KeyId].sign_msg_hash(Message)
+        return {'KeyId': KeyId, 'Signature': encode_dss_signature(signature.r, signature.s)}
+
+
+def test_prefetch_resolves_keys_concurrently(tmp_path):
+    client = StubKms(latency=0.2)
+    addresses = {name: client.add_key(f'alias/{name}') for name in ('owner1', 'owner2', 'owner3', 'owner4')}
+    factory = KmsSignerFactory(client=client, cache_path=str(tmp_path / 'addresses.json'))
+
+    start = time.monotonic()
+    signers = factory.prefetch(addresses, max_workers=4)
+    elapsed = time.monotonic() - start
+
+    assert {name: s.address for name, s in signers.items()} == addresses
+    assert client.calls['get_public_key'] == 4
+    assert client.max_concurrent == 4
+    assert elapsed < 0.6  # four sequential lookups would take 0.8s
+
+
+def test_address_cache_round_trip(tmp_path):
+    client = StubKms()
+    address = client.add_key('alias/auth')
+    path = str(tmp_path / 'addresses.json')
+
+    first = KmsSignerFactory(client=client, cache_path=path).signer('auth')
+    assert first.address == address
+    with open(path) as f:
+        assert json.load(f) == {'default/us-east-1/alias/auth': address}
+
+    # A new factory (a new process) reads the address from disk and builds the signer without calling KMS
+    second = KmsSignerFactory(client=client, cache_path=path).signer('auth')
+    assert second.address == address
+    assert client.calls['get_public_key'] == 1
+
+    message_hash = b'\x07' * 32
+    signature = second.sign_msg_hash(message_hash)
+    assert signature.recover_public_key_from_msg_hash(message_hash).to_checksum_address() == address
+    assert client.calls['sign'] == 1
+
+
+def test_signers_share_the_client(tmp_path):
+    client = StubKms()
+    for name in ('a', 'b', 'c'):
+        client.add_key(f'alias/{name}')
+    factory = KmsSignerFactory(client=client, cache_path=None)
+
+    signers = [factory.signer(name) for name in ('a', 'b', 'c')]
+    assert all(s.client is client for s in signers)
+    # Asking again, by alias or by its full form, returns the same signer
+    assert factory.signer('a') is signers[0]
+    assert factory.signer('alias/b') is signers[1]
+    assert client.calls['get_public_key'] == 3
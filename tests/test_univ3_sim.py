@@ -0,0 +1,95 @@
+import glob
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.univ3_sim import (MAX_SQRT_RATIO, MAX_TICK, MIN_SQRT_RATIO, MIN_TICK, PoolSnapshot, compute_swap_step,
+                             get_sqrt_ratio_at_tick, get_tick_at_sqrt_ratio, simulate_ladder, simulate_swap)
+
+"""
+Checks the simulator against the Uniswap v3-core reference values, recorded pools and regression snapshots.
+
+Both kinds of fixture hold a PoolSnapshot and the `sqrt_limit_price` expected for a ladder of exact-input sizes.
+In tests/fixtures/univ3_recorded_*.json those are what the pool's `get_quote` returned at the snapshot's block (see
+`record_fixture` and tests/record_univ3_fixture.py), so they check the simulator against the pool. In
+tests/fixtures/univ3_regression_*.json the pool is made up and the expected values are the simulator's own earlier
+output: they only catch changes in behaviour, not errors that were there from the start.
+"""
+
+_FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RECORDED = sorted(glob.glob(os.path.join(_FIXTURE_DIR, 'univ3_recorded_*.json')))
+REGRESSION = sorted(glob.glob(os.path.join(_FIXTURE_DIR, 'univ3_regression_*.json')))
+
+
+def _load(path: str):
+    with open(path) as f:
+        fixture = json.load(f)
+    return fixture, PoolSnapshot.from_dict(fixture['snapshot'])
+
+
+def test_tick_math_bounds():
+    assert get_sqrt_ratio_at_tick(MIN_TICK) == MIN_SQRT_RATIO
+    assert get_sqrt_ratio_at_tick(MAX_TICK) == MAX_SQRT_RATIO
+    assert get_sqrt_ratio_at_tick(0) == 1 << 96
+    assert get_tick_at_sqrt_ratio(MIN_SQRT_RATIO) == MIN_TICK
+    assert get_tick_at_sqrt_ratio(MAX_SQRT_RATIO - 1) == MAX_TICK - 1
+
+
+@pytest.mark.parametrize('tick', [-887000, -200000, -60, -1, 1, 60, 201234, 887000])
+def test_tick_at_sqrt_ratio_inverts(tick):
+    assert get_tick_at_sqrt_ratio(get_sqrt_ratio_at_tick(tick)) == tick
+    assert get_tick_at_sqrt_ratio(get_sqrt_ratio_at_tick(tick) - 1) == tick - 1
+
+
+# SwapMath.spec.ts in Uniswap/v3-core: exact input, one for zero, price 1 -> 1.01 and 1 -> 10
+@pytest.mark.parametrize('target, expected', [
+    (79623317895830914510639640423, (79623317895830914510639640423, 9975124224178055, 9925619580021728,
+                                     5988667735148)),
+    (250541448375047931186413801569, (None, 999400000000000000, 666399946655997866, 600000000000000)),
+])
+def test_compute_swap_step_reference(target, expected):
+    sqrt_next, amount_in, amount_out, fee = compute_swap_step(1 << 96, target, 2 * 10 ** 18, 10 ** 18, 600)
+    assert (amount_in, amount_out, fee) == expected[1:]
+    assert amount_in + fee <= 10 ** 18
+    if expected[0] is not None:
+        assert sqrt_next == expected[0]
+    else:
+        assert 1 << 96 < sqrt_next < target
+
+
+def _check_quotes(path: str):
+    fixture, snapshot = _load(path)
+    for quote in fixture['quotes']:
+        result = simulate_swap(snapshot, fixture['zero_for_one'], int(quote['amount_in']))
+        assert result.sqrt_limit_price == quote['sqrt_limit_price'], quote['amount']
+        assert result.amount_in == int(quote['amount_in'])
+
+
+# Skipped (empty parameter set) until a recorded fixture is committed
+@pytest.mark.parametrize('path', RECORDED, ids=os.path.basename)
+def test_simulate_swap_matches_get_quote(path):
+    _check_quotes(path)
+
+
+@pytest.mark.parametrize('path', REGRESSION, ids=os.path.basename)
+def test_simulate_swap_matches_regression_snapshot(path):
+    _check_quotes(path)
+
+
+@pytest.mark.parametrize('path', RECORDED + REGRESSION, ids=os.path.basename)
+def test_ladder_matches_simulate_swap(path):
+    fixture, snapshot = _load(path)
+    amounts = [int(quote['amount_in']) for quote in fixture['quotes']]
+    # Out of order, with a repeat, so resuming from the recorded boundaries is exercised in every position
+    amounts = amounts[::-1] + amounts[:1]
+    ladder = simulate_ladder(snapshot, fixture['zero_for_one'], amounts)
+    assert ladder == [simulate_swap(snapshot, fixture['zero_for_one'], amount) for amount in amounts]
+
+
+def test_swap_past_snapshot_raises():
+    fixture, snapshot = _load(REGRESSION[0])
+    with pytest.raises(ValueError):
+        simulate_swap(snapshot, fixture['zero_for_one'], 10 ** 30)
@@ -0,0 +1,252 @@
+import asyncio
+import inspect
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Union
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.uniswap import EulithUniswapV3Pool
+from eulith_web3.websocket import EulithWebsocketRequestHandler, SubscribeRequest, SubscriptionHandle
+
+"""
+Host pool price and pending transaction subscriptions, plus periodic tasks, on a single asyncio event loop.
+
+The Eulith websocket provider already multiplexes every subscription over one connection with a fixed set of
+threads, so there is no need for a thread per feed. Each subscription gets a thin bridge handler that hops the
+message onto the event loop with `call_soon_threadsafe`; from there on every handler runs on the loop thread, one
+message at a time. Handlers can be plain `EulithWebsocketRequestHandler`s or define `async def handle_result`.
+
+A handler with an `accepts(message) -> bool` pre-filter (e.g. PendingTxFilter) has it called on the provider thread,
+so a feed like the whole mempool is mostly rejected there and only matches are scheduled onto the loop. Accepted
+messages go to `handle_accepted` if the handler defines it, so they aren't filtered twice, and to `handle_result`
+otherwise.
+
+A handler or periodic callback that raises (or whose coroutine raises) is reported and the runtime carries on: the
+periodic task runs again on its next tick and the subscription keeps delivering.
+
+SIGINT and SIGTERM stop the loop gracefully: periodic tasks and in-flight handlers are cancelled and every
+subscription is unsubscribed before `run()` returns.
+"""
+
+Callback = Callable[[], Union[None, Awaitable[None]]]
+
+
+def _name(callback: Callable) -> str:
+    return getattr(callback, '__qualname__', None) or repr(callback)
+
+
+class AsyncStreamHandler:
+    """
+    Handler interface for coroutine callbacks. Both methods run on the event loop.
+    """
+
+    async def handle_result(self, message: Dict[Any, Any]):
+        pass
+
+    async def handle_error(self, message: Dict[Any, Any]):
+        print(f'received an error {message}')
+
+
+StreamHandler = Union[EulithWebsocketRequestHandler, AsyncStreamHandler]
+
+
+class _LoopBridge(EulithWebsocketRequestHandler):
+    def __init__(self, runtime: 'AsyncSubscriptionRuntime', handler: StreamHandler):
+        self.runtime = runtime
+        self.handler = handler
+        self.accepts = getattr(handler, 'accepts', None)
+        accepted = getattr(handler, 'handle_accepted', None) if self.accepts else None
+        self.on_result = accepted or handler.handle_result
+        self.active = True
+
+    # Both of these run on the provider's worker threads and do nothing but filter and schedule onto the loop
+
+    def handle_result(self, message: Dict[Any, Any]):
+        if self.active and (self.accepts is None or self.accepts(message)):
+            self.runtime.call_soon(self._dispatch, self.on_result, message)
+
+    def handle_error(self, message: Dict[Any, Any]):
+        if self.active:
+            self.runtime.call_soon(self._dispatch, self.handler.handle_error, message)
+
+    def _dispatch(self, callback: Callable, message: Dict[Any, Any]):
+        if self.active:
+            self.runtime.run_callback(callback, message)
+
+
+@dataclass
+class Subscription:
+    request: SubscribeRequest
+    handler: StreamHandler
+    bridge: Optional[_LoopBridge] = None
+    handle: Optional[SubscriptionHandle] = None
+
+
+@dataclass
+class _Periodic:
+    interval: float
+    callback: Callback
+    task: Optional[asyncio.Task] = None
+
+
+class AsyncSubscriptionRuntime:
+    def __init__(self, ew3: EulithWeb3, unsubscribe_timeout: float = 5.0):
+        self.ew3 = ew3
+        self.unsubscribe_timeout = unsubscribe_timeout
+        self.subscriptions: List[Subscription] = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self._periodic: List[_Periodic] = []
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping: Optional[asyncio.Event] = None
+
+    def subscribe(self, request: SubscribeRequest, handler: StreamHandler) -> Subscription:
+        """
+        Register a subscription. Before `run()` it is queued; once the loop is running it starts right away.
+        """
+        sub = Subscription(request, handler)
+        self.subscriptions.append(sub)
+        if self.loop is not None:
+            self._start_subscription(sub)
+        return sub
+
+    def subscribe_prices(self, pool: EulithUniswapV3Pool, handler: StreamHandler) -> Subscription:
+        return self.subscribe(SubscribeRequest(subscription_type='uni_prices', args={'pool_address': pool.address}),
+                              handler)
+
+    def subscribe_pending_transactions(self, handler: StreamHandler) -> Subscription:
+        # Same request as `ew3.v0.subscribe_pending_transactions`, which doesn't hand back the subscription handle
+        return self.subscribe(SubscribeRequest(args=['newPendingTransactions']), handler)
+
+    def every(self, interval: float, callback: Callback):
+        """
+        Run `callback` (a plain function or a coroutine function) every `interval` seconds on the loop.
+        """
+        periodic = _Periodic(interval, callback)
+        self._periodic.append(periodic)
+        if self.loop is not None:
+            periodic.task = self.loop.create_task(self._run_periodic(periodic))
+
+    async def unsubscribe(self, sub: Subscription):
+        if sub.bridge:
+            sub.bridge.active = False
+        if sub in self.subscriptions:
+            self.subscriptions.remove(sub)
+
+        # The subscription id arrives asynchronously; without one there is nothing to send, and the inactive
+        # bridge already discards anything that still comes in.
+        if sub.handle is None or not sub.handle.sub_details.subscription_id:
+            return
+
+        # `unsubscribe` blocks on the server's acknowledgement with no timeout of its own, so it gets a daemon thread
+        # rather than the loop's default executor: if the acknowledgement never comes, the thread is abandoned
+        # instead of holding up `asyncio.run`'s executor shutdown at exit.
+        done = self.loop.create_future()
+
+        def unsubscribe():
+            try:
+                sub.handle.unsubscribe()
+            except ValueError:
+                pass
+            finally:
+                self.call_soon(done.set_result, None)
+
+        threading.Thread(target=unsubscribe, name='unsubscribe', daemon=True).start()
+        try:
+            await asyncio.wait_for(asyncio.shield(done), self.unsubscribe_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def call_soon(self, callback: Callable, *args):
+        """
+        Thread-safe: schedule `callback(*args)` on the loop.
+        """
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:
+            pass  # the loop has already closed during shutdown
+
+    def run_callback(self, callback: Callable, *args):
+        try:
+            result = callback(*args)
+        except Exception as e:
+            print(f'handler {_name(callback)} failed: {type(e).__name__}: {e}')
+            return
+        if inspect.isawaitable(result):
+            task = self.loop.create_task(result)
+            self._tasks.add(task)
+            task.add_done_callback(self._handler_done)
+
+    def _handler_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        # Retrieve the exception, or a failing async handler would go unreported until garbage collection at best
+        if not task.cancelled() and task.exception() is not None:
+            e = task.exception()
+            print(f'handler {task.get_coro().__qualname__} failed: {type(e).__name__}: {e}')
+
+    def stop(self):
+        """
+        Thread-safe: ask `run()` to shut down.
+        """
+        if self.loop is not None and self._stopping is not None:
+            self.loop.call_soon_threadsafe(self._stopping.set)
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.add_signal_handler(sig, self._stopping.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # not on the main thread, or not supported by this platform's loop
+
+        for sub in self.subscriptions:
+            self._start_subscription(sub)
+        for periodic in self._periodic:
+            periodic.task = self.loop.create_task(self._run_periodic(periodic))
+
+        try:
+            await self._stopping.wait()
+        finally:
+            await self._shutdown()
+
+    def run_forever(self):
+        asyncio.run(self.run())
+
+    def _start_subscription(self, sub: Subscription):
+        sub.bridge = _LoopBridge(self, sub.handler)
+        sub.handle = self.ew3.eulith_service.subscribe(sub.request, sub.bridge)
+
+    async def _run_periodic(self, periodic: _Periodic):
+        next_run = time.monotonic()
+        while not self._stopping.is_set():
+            try:
+                result = periodic.callback()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                # One failing run mustn't end the task; try again on the next tick
+                print(f'periodic {_name(periodic.callback)} failed: {type(e).__name__}: {e}')
+
+            # Schedule against a fixed grid so slow callbacks don't make the period drift
+            next_run += periodic.interval
+            await asyncio.sleep(max(0.0, next_run - time.monotonic()))
+
+    async def _shutdown(self):
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                self.loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        # A cancellation that lands while `wait_for` is finishing can be swallowed, so keep cancelling until done
+        tasks = {p.task for p in self._periodic if p.task} | self._tasks
+        while tasks:
+            for task in tasks:
+                task.cancel()
+            _, tasks = await asyncio.wait(tasks, timeout=0.1)
+
+        await asyncio.gather(*(self.unsubscribe(sub) for sub in list(self.subscriptions)), return_exceptions=True)
@@ -0,0 +1,162 @@
+import warnings
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from eth_abi import encode
+from eulith_web3.atomic import CommitRequest
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from eulith_web3.swap import EulithSwapRequest
+from web3.types import TxParams
+
+from utils.pending_tx_filter import ERC20_FUNCTIONS
+
+"""
+Build an atomic transaction locally and commit it in one request.
+
+Inside `start_atomic_transaction` every leg is its own `send_transaction` round trip, followed by one more for the
+commit. `AtomicBundle` encodes transfers and ERC20 calldata on the client and hands all legs to
+`ew3.v0.bundle_and_commit` at once, so building a bundle costs one round trip whatever the number of legs. Only
+swaps need the server (for the quote), one request per swap.
+
+For trades repeated with different amounts, a `BundleTemplate` keeps the legs with `Param` placeholders and only
+re-encodes the arguments on each `render`.
+
+`eulith_tx_bundle` always executes from the toolkit contract. A bundle given a `safe_address` is committed through
+`start_atomic_transaction(..., gnosis=safe_address)` instead, one `send_transaction` per leg, so the Safe is
+msg.sender and keeps whatever the legs return.
+"""
+
+ERC20_TRANSFER, ERC20_APPROVE = ERC20_FUNCTIONS[:2]
+
+
+@dataclass(frozen=True)
+class Param:
+    """
+    Placeholder for a value supplied when a BundleTemplate is rendered.
+    """
+    name: str
+
+
+def _resolve(value: Any, params: Dict[str, Any]) -> Any:
+    return params[value.name] if isinstance(value, Param) else value
+
+
+@dataclass(frozen=True)
+class _TemplateLeg:
+    to: Union[str, Param]
+    value: Union[int, Param]
+    selector: Optional[str] = None
+    arg_types: Tuple[str, ...] = ()
+    args: Tuple[Any, ...] = ()
+    data: str = '0x'
+
+    def render(self, sender: str, params: Dict[str, Any]) -> Dict[str, str]:
+        data = self.data
+        if self.selector:
+            args = [_resolve(a, params) for a in self.args]
+            data = self.selector + encode(self.arg_types, args).hex()
+        return {'from': sender, 'to': _resolve(self.to, params), 'value': hex(_resolve(self.value, params)),
+                'data': data}
+
+
+class AtomicBundle:
+    def __init__(self, ew3: EulithWeb3, auth_address: str, safe_address: Optional[str] = None):
+        self.ew3 = ew3
+        self.auth_address = auth_address
+        self.safe_address = safe_address
+        self.legs: List[Dict[str, Any]] = []
+
+    def __len__(self):
+        return len(self.legs)
+
+    def call(self, to: str, data: str = '0x', value: int = 0) -> 'AtomicBundle':
+        self.legs.append({'from': self.auth_address, 'to': to, 'value': hex(value), 'data': data})
+        return self
+
+    def transfer(self, to: str, value: int) -> 'AtomicBundle':
+        """
+        Send `value` wei of the native token.
+        """
+        return self.call(to, value=value)
+
+    def erc20_transfer(self, token: str, to: str, amount: int) -> 'AtomicBundle':
+        return self.call(token, ERC20_TRANSFER.encode(to, amount))
+
+    def erc20_approve(self, token: str, spender: str, amount: int) -> 'AtomicBundle':
+        return self.call(token, ERC20_APPROVE.encode(spender, amount))
+
+    def extend(self, txs: List[TxParams]) -> 'AtomicBundle':
+        for tx in txs:
+            self.legs.append({'from': self.auth_address, **tx})
+        return self
+
+    def swap(self, request: EulithSwapRequest) -> float:
+        """
+        Quote `request` and add its transactions as legs. Returns the quoted price.
+        """
+        with warnings.catch_warnings():
+            # The warning is about swaps executing outside an atomic transaction; these legs go into one
+            warnings.simplefilter('ignore', DeprecationWarning)
+            price, txs = self.ew3.v0.get_swap_quote(request)
+        self.extend(txs)
+        return price
+
+    def commit(self, commit_options: Optional[CommitRequest] = None) -> TxParams:
+        """
+        Submit every leg and return the committed transaction, ready to sign and send.
+        """
+        if self.safe_address:
+            if commit_options:
+                raise ValueError('commit_options are only supported for toolkit bundles')
+            with self.ew3.v0.start_atomic_transaction(self.auth_address, gnosis=self.safe_address):
+                for leg in self.legs:
+                    self.ew3.eth.send_transaction(leg)
+                return self.ew3.v0.commit_atomic_transaction()
+
+        tx = self.ew3.v0.bundle_and_commit(self.auth_address, self.legs, commit_options)
+        if 'message' in tx:
+            # Same failure shape as commit_atomic_transaction, e.g. an armor policy rejection
+            raise EulithRpcException(tx)
+        return tx
+
+
+class BundleTemplate:
+    """
+    Legs of a repeat trade with `Param` placeholders, e.g.
+
+        template = BundleTemplate().erc20_transfer(usdc.address, Param('to'), Param('amount'))
+        tx = template.render(ew3, wallet.address, to=dest, amount=10 ** 6).commit()
+    """
+
+    def __init__(self):
+        self._legs: List[_TemplateLeg] = []
+
+    def __len__(self):
+        return len(self._legs)
+
+    def call(self, to: Union[str, Param], data: str = '0x', value: Union[int, Param] = 0) -> 'BundleTemplate':
+        self._legs.append(_TemplateLeg(to=to, value=value, data=data))
+        return self
+
+    def transfer(self, to: Union[str, Param], value: Union[int, Param]) -> 'BundleTemplate':
+        return self.call(to, value=value)
+
+    def erc20_transfer(self, token: Union[str, Param], to: Union[str, Param],
+                       amount: Union[int, Param]) -> 'BundleTemplate':
+        return self._erc20(ERC20_TRANSFER, token, to, amount)
+
+    def erc20_approve(self, token: Union[str, Param], spender: Union[str, Param],
+                      amount: Union[int, Param]) -> 'BundleTemplate':
+        return self._erc20(ERC20_APPROVE, token, spender, amount)
+
+    def render(self, ew3: EulithWeb3, auth_address: str, **params: Any) -> AtomicBundle:
+        bundle = AtomicBundle(ew3, auth_address)
+        bundle.legs = [leg.render(auth_address, params) for leg in self._legs]
+        return bundle
+
+    def _erc20(self, function, token, *args) -> 'BundleTemplate':
+        # Selector hashed once here rather than on every render
+        self._legs.append(_TemplateLeg(to=token, value=0, selector=function.selector,
+                                       arg_types=function.arg_types, args=args))
+        return self
@@ -0,0 +1,141 @@
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Union
+
+import numpy as np
+from eth_abi import decode, encode
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+
+from utils.rpc_batch import batch_request
+
+"""
+Read a tokens x holders balance matrix in one round trip, with every balance taken at the same block.
+
+By default all the balanceOf / native balance reads, plus the block number, are packed into a single Multicall3
+`aggregate3` eth_call. Where Multicall3 isn't deployed (or the call fails) the reads are pipelined over the
+websocket instead, pinned to an explicit block number so they still agree with each other.
+
+Pass None as a token for the chain's native currency.
+"""
+
+# Same address on every chain it has been deployed to
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+_BALANCE_OF = function_signature_to_4byte_selector('balanceOf(address)')
+_GET_ETH_BALANCE = function_signature_to_4byte_selector('getEthBalance(address)')
+_GET_BLOCK_NUMBER = function_signature_to_4byte_selector('getBlockNumber()')
+_AGGREGATE3 = function_signature_to_4byte_selector('aggregate3((address,bool,bytes)[])')
+
+Token = Optional[EulithERC20]
+
+
+@dataclass
+class BalanceSnapshot:
+    block_number: int
+    tokens: List[str]
+    holders: List[str]
+    raw: List[List[int]]    # tokens x holders, base units; uint256 doesn't fit in a numpy integer dtype
+    amounts: np.ndarray     # tokens x holders, scaled by each token's decimals; NaN where the read failed
+
+    def get(self, token: str, holder: str) -> float:
+        return float(self.amounts[self.tokens.index(token), self._holder_index(holder)])
+
+    def raw_balance(self, token: str, holder: str) -> int:
+        return self.raw[self.tokens.index(token)][self._holder_index(holder)]
+
+    def totals(self) -> np.ndarray:
+        return np.nansum(self.amounts, axis=1)
+
+    def _holder_index(self, holder: str) -> int:
+        return [h.lower() for h in self.holders].index(holder.lower())
+
+
+def _read_call(token: Token, holder: str) -> bytes:
+    if token is None:
+        return _GET_ETH_BALANCE + encode(['address'], [holder])
+    return _BALANCE_OF + encode(['address'], [holder])
+
+
+def _block_param(block_identifier: Union[str, int]) -> str:
+    return hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+
+
+def _via_multicall(ew3: EulithWeb3, tokens: Sequence[Token], holders: Sequence[str], block_identifier):
+    calls = [(MULTICALL3_ADDRESS, False, _GET_BLOCK_NUMBER)]
+    for token in tokens:
+        target = MULTICALL3_ADDRESS if token is None else token.address
+        calls.extend((target, True, _read_call(token, h)) for h in holders)
+
+    data = '0x' + (_AGGREGATE3 + encode(['(address,bool,bytes)[]'], [calls])).hex()
+    call = {'to': MULTICALL3_ADDRESS, 'data': data}
+    result, = batch_request(ew3, [('eth_call', [call, _block_param(block_identifier)])])
+    (returned,) = decode(['(bool,bytes)[]'], bytes.fromhex(result[2:]))
+
+    block_number = decode(['uint256'], returned[0][1])[0]
+    values = [decode(['uint256'], ret)[0] if ok and len(ret) >= 32 else None for ok, ret in returned[1:]]
+    return block_number, values
+
+
+def _via_batch(ew3: EulithWeb3, tokens: Sequence[Token], holders: Sequence[str], block_identifier):
+    if not isinstance(block_identifier, int):
+        # Resolve tags like 'latest' once, so every read below sees the same block
+        block, = batch_request(ew3, [('eth_getBlockByNumber', [block_identifier, False])])
+        block_identifier = int(block['number'], 16)
+    block_hex = _block_param(block_identifier)
+
+    calls = []
+    for token in tokens:
+        for holder in holders:
+            if token is None:
+                calls.append(('eth_getBalance', [holder, block_hex]))
+            else:
+                data = '0x' + _read_call(token, holder).hex()
+                calls.append(('eth_call', [{'to': token.address, 'data': data}, block_hex]))
+
+    values = []
+    for result in batch_request(ew3, calls, raise_errors=False):
+        if isinstance(result, Exception) or not result or result == '0x':
+            values.append(None)
+        else:
+            values.append(int(result, 16))
+    return block_identifier, values
+
+
+def snapshot_balances(ew3: EulithWeb3, tokens: Sequence[Token], holders: Sequence[str],
+                      block_identifier: Union[str, int] = 'latest', use_multicall: bool = True,
+                      labels: Optional[Sequence[str]] = None) -> BalanceSnapshot:
+    """
+    Balances of every holder in every token. A read that fails (e.g. a token that isn't deployed on this chain)
+    comes back as raw 0 / NaN instead of failing the whole snapshot.
+
+    :param labels: Names for the token rows. Defaults to each token's symbol, which costs an RPC per token that
+                   doesn't already know its symbol.
+    """
+    holders = [ew3.to_checksum_address(h) for h in holders]
+
+    values = None
+    if use_multicall:
+        try:
+            block_number, values = _via_multicall(ew3, tokens, holders, block_identifier)
+        except (EulithRpcException, DecodingError):
+            # Most likely no Multicall3 on this chain (an eth_call to an empty account returns '0x')
+            values = None
+    if values is None:
+        block_number, values = _via_batch(ew3, tokens, holders, block_identifier)
+
+    if labels is None:
+        labels = ['ETH' if t is None else t.symbol() for t in tokens]
+    scales = [18 if t is None else t.decimals() for t in tokens]
+
+    raw, amounts = [], np.full((len(tokens), len(holders)), np.nan)
+    for i, scale in enumerate(scales):
+        row = values[i * len(holders):(i + 1) * len(holders)]
+        raw.append([v or 0 for v in row])
+        for j, v in enumerate(row):
+            if v is not None:
+                amounts[i, j] = v / 10 ** scale
+
+    return BalanceSnapshot(block_number=block_number, tokens=list(labels), holders=holders, raw=raw, amounts=amounts)
@@ -0,0 +1,195 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.signer import Signer
+from eulith_web3.signing import construct_signing_middleware
+
+"""
+One long-lived EulithWeb3 connection per chain, sharing a single signing middleware, with calls fanned out to
+several chains at once.
+
+Every Eulith endpoint is a websocket that multiplexes any number of in-flight requests, so a chain needs one
+connection, not a pool of them; what gets tuned per chain is how many calls run against it concurrently
+(`pool_size`, the chain's worker threads) and, optionally, how many threads dispatch its subscription messages.
+Connections are opened lazily on each chain's own workers, so the first `fan_out` over eth, arb and poly does the
+three TLS handshakes in parallel rather than one after another, and later calls reuse the open sockets.
+
+    with ChainManager(EULITH_TOKEN, wallet) as chains:
+        gas = chains.fan_out(lambda ew3: ew3.eth.gas_price)
+        for chain, result in gas.results.items():
+            print(chain, result.value if result.ok else result.error)
+"""
+
+CHAIN_URLS = {
+    'eth-main': 'https://eth-main.eulithrpc.com/v0',
+    'arb-main': 'https://arb-main.eulithrpc.com/v0',
+    'poly-main': 'https://poly-main.eulithrpc.com/v0',
+}
+
+
+@dataclass
+class ChainResult:
+    chain: str
+    value: Any = None
+    error: Optional[str] = None
+    latency: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class FanOutResult:
+    results: Dict[str, ChainResult] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def values(self) -> Dict[str, Any]:
+        return {chain: r.value for chain, r in self.results.items() if r.ok}
+
+    @property
+    def failures(self) -> Dict[str, str]:
+        return {chain: r.error for chain, r in self.results.items() if not r.ok}
+
+
+class _Chain:
+    def __init__(self, name: str, url: str, pool_size: int):
+        self.name = name
+        self.url = url
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix=f'chain-{name}')
+        self.lock = threading.Lock()
+        self.ew3: Optional[EulithWeb3] = None
+
+
+class ChainManager:
+    def __init__(self, eulith_token: str, signer: Optional[Signer] = None, chains: Optional[Dict[str, str]] = None,
+                 pool_size: Union[int, Dict[str, int]] = 8, subscription_workers: Optional[int] = None,
+                 on_connect: Optional[Callable[[str, EulithWeb3], None]] = None):
+        """
+        :param chains: chain name -> Eulith URL; defaults to CHAIN_URLS
+        :param pool_size: concurrent calls per chain, or a dict of them by chain name (missing chains get 8)
+        :param subscription_workers: threads dispatching subscription messages per connection; the provider's
+            default (10) if None
+        :param on_connect: called with every new connection, e.g. to install RpcMetrics on it
+        """
+        self.eulith_token = eulith_token
+        # The middleware factory builds its per-Web3 state when each connection adds it, so one can be shared
+        self.signing_middleware = construct_signing_middleware(signer) if signer else None
+        self.subscription_workers = subscription_workers
+        self.on_connect = on_connect
+
+        urls = chains if chains is not None else CHAIN_URLS
+        sizes = pool_size if isinstance(pool_size, dict) else {}
+        default_size = pool_size if isinstance(pool_size, int) else 8
+        self._chains = {name: _Chain(name, url, sizes.get(name, default_size)) for name, url in urls.items()}
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._chains)
+
+    def _chain(self, name: str) -> _Chain:
+        try:
+            return self._chains[name]
+        except KeyError:
+            raise KeyError(f'unknown chain {name}, expected one of {", ".join(self._chains)}') from None
+
+    def _connect(self, chain: _Chain) -> EulithWeb3:
+        with chain.lock:
+            if chain.ew3 is not None and not chain.ew3.eulith_service.eulith_provider.shutdown_event.is_set():
+                return chain.ew3
+
+            if chain.ew3 is not None:
+                chain.ew3.terminate()
+                chain.ew3 = None
+
+            ew3 = EulithWeb3(chain.url, self.eulith_token, self.signing_middleware)
+            provider = ew3.eulith_service.eulith_provider
+            # EulithWeb3 swallows connection failures (chain_id ends up 0); the provider has shut down by then
+            if provider.shutdown_event.is_set():
+                ew3.terminate()
+                raise ConnectionError(f'could not connect to {chain.url}')
+
+            if self.subscription_workers:
+                provider.thread_pool.shutdown(wait=False)
+                provider.thread_pool = ThreadPoolExecutor(max_workers=self.subscription_workers,
+                                                          thread_name_prefix='eulith_ws_worker')
+            if self.on_connect:
+                self.on_connect(chain.name, ew3)
+
+            chain.ew3 = ew3
+            return ew3
+
+    def __getitem__(self, name: str) -> EulithWeb3:
+        return self._connect(self._chain(name))
+
+    def connect(self, names: Optional[Iterable[str]] = None, timeout: float = 30.0) -> Dict[str, str]:
+        """
+        Open the connections up front, all at once. Returns the chains that failed, with the reason.
+        """
+        return self.fan_out(lambda ew3: None, names=names, timeout=timeout).failures
+
+    def submit(self, name: str, fn: Callable[..., Any], *args: Any):
+        """
+        Run `fn(ew3, *args)` on the chain's workers; returns a Future.
+        """
+        chain = self._chain(name)
+        return chain.executor.submit(lambda: fn(self._connect(chain), *args))
+
+    def fan_out(self, fn: Callable[..., Any], *args: Any, names: Optional[Iterable[str]] = None,
+                timeout: float = 15.0) -> FanOutResult:
+        """
+        Run `fn(ew3, *args)` on every chain (or just `names`) concurrently and collect what each returned.
+
+        A chain that raises, or hasn't answered within `timeout` seconds, is recorded as failed; the others
+        aren't held up by it.
+        """
+        result = FanOutResult()
+        start = time.monotonic()
+        deadline = start + timeout
+
+        def timed(ew3: EulithWeb3):
+            call_start = time.monotonic()
+            value = fn(ew3, *args)
+            return value, time.monotonic() - call_start
+
+        pending = {self.submit(name, timed): name for name in (names if names is not None else self._chains)}
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    value, latency = future.result()
+                except Exception as e:
+                    result.results[name] = ChainResult(name, error=f'{type(e).__name__}: {e}')
+                    continue
+                result.results[name] = ChainResult(name, value=value, latency=latency)
+
+        for future, name in pending.items():
+            # Still on the wire; it finishes on the chain's workers and the result is dropped
+            future.cancel()
+            result.results[name] = ChainResult(name, error=f'timed out after {timeout}s')
+
+        result.elapsed = time.monotonic() - start
+        return result
+
+    def close(self):
+        for chain in self._chains.values():
+            chain.executor.shutdown(wait=False, cancel_futures=True)
+            with chain.lock:
+                if chain.ew3 is not None:
+                    chain.ew3.terminate()
+                    chain.ew3 = None
+
+    def __enter__(self) -> 'ChainManager':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,8 +1,20 @@
+from typing import Sequence
+
 from eulith_web3.eulith_web3 import EulithWeb3
 
+from utils.balances import BalanceSnapshot, Token, snapshot_balances
+
 
-def check_wallet_balance(ew3: EulithWeb3, min_balance: float):
-    if ew3.eth.get_balance(ew3.wallet_address) / 10 ** 18 < min_balance:
+def check_wallet_balance(ew3: EulithWeb3, min_balance: float, tokens: Sequence[Token] = (),
+                         holders: Sequence[str] = ()) -> BalanceSnapshot:
+    """
+    Exit unless the wallet holds at least `min_balance` ETH. Balances of `tokens` for the wallet and `holders` are
+    read in the same call, at the same block, and returned with the wallet's ETH balance (labelled 'ETH').
+    """
+    balances = snapshot_balances(ew3, [None, *tokens], [ew3.wallet_address, *holders])
+    # A failed read is NaN, which mustn't pass for enough balance
+    if not balances.get('ETH', ew3.wallet_address) >= min_balance:
         print("Your wallet doesn't have enough balance to complete this example")
         print(f"Please deposit at least {min_balance} ETH")
         exit(1)
+    return balances
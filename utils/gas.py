@@ -0,0 +1,146 @@
+import json
+import threading
+from dataclasses import dataclass, asdict
+from enum import Enum
+from statistics import median
+from typing import Any, Dict, List, Optional
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from web3.types import TxParams
+
+"""
+EIP-1559 fee pricing from `eth_feeHistory`, instead of fixed multipliers on whatever the node suggested.
+
+One fee history call (the last `block_count` blocks at the 10th/50th/90th reward percentiles) is shared by every
+transaction priced within the same block; the cached history is keyed on the head block number, so the next block
+always brings a fresh one. `compute_fees` is a pure function of a FeeHistory, so a recorded history
+(`FeeHistory.load`) reproduces the exact fees offline.
+
+Per urgency tier the priority fee is the median over recent blocks of the matching reward percentile, and the max
+fee adds headroom on top of the next block's base fee so the transaction survives a few full blocks in a row (base
+fee can rise 12.5% per block).
+"""
+
+GWEI = 10 ** 9
+REWARD_PERCENTILES = [10, 50, 90]
+
+
+class Urgency(Enum):
+    # value: (reward percentile, base fee headroom)
+    NEXT_BLOCK = (90, 2.0)
+    FAST = (50, 1.5)
+    ECONOMICAL = (10, 1.125)
+
+    @property
+    def percentile(self) -> int:
+        return self.value[0]
+
+    @property
+    def headroom(self) -> float:
+        return self.value[1]
+
+
+ARBITRUM_CHAIN_ID = 42161
+POLYGON_CHAIN_ID = 137
+POLYGON_MIN_PRIORITY_FEE = 30 * GWEI
+
+
+@dataclass
+class FeeHistory:
+    oldest_block: int
+    base_fees: List[int]        # one per block plus the next block's, as returned by the node
+    rewards: List[List[int]]    # per block, one per REWARD_PERCENTILES entry
+    gas_used_ratio: List[float]
+
+    @property
+    def newest_block(self) -> int:
+        return self.oldest_block + len(self.gas_used_ratio) - 1
+
+    @property
+    def next_base_fee(self) -> int:
+        return self.base_fees[-1]
+
+    @classmethod
+    def from_rpc(cls, raw: Dict[str, Any]) -> 'FeeHistory':
+        def num(x):
+            return int(x, 16) if isinstance(x, str) else int(x)
+
+        return cls(oldest_block=num(raw['oldestBlock']),
+                   base_fees=[num(b) for b in raw['baseFeePerGas']],
+                   rewards=[[num(r) for r in block] for block in raw.get('reward') or []],
+                   gas_used_ratio=[float(g) for g in raw['gasUsedRatio']])
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(asdict(self), f)
+
+    @classmethod
+    def load(cls, path: str) -> 'FeeHistory':
+        with open(path) as f:
+            return cls(**json.load(f))
+
+
+@dataclass
+class FeeQuote:
+    max_fee_per_gas: int
+    max_priority_fee_per_gas: int
+    base_fee: int
+    block_number: int
+    urgency: Urgency
+
+
+def compute_fees(history: FeeHistory, urgency: Urgency, chain_id: int = 1) -> FeeQuote:
+    column = REWARD_PERCENTILES.index(urgency.percentile)
+    rewards = [block[column] for block in history.rewards if block]
+    tip = int(median(rewards)) if rewards else 0
+
+    if chain_id == ARBITRUM_CHAIN_ID:
+        # The sequencer orders first come first served; a priority fee buys nothing
+        tip = 0
+    elif chain_id == POLYGON_CHAIN_ID:
+        tip = max(tip, POLYGON_MIN_PRIORITY_FEE)
+
+    base_fee = history.next_base_fee
+    return FeeQuote(max_fee_per_gas=int(base_fee * urgency.headroom) + tip, max_priority_fee_per_gas=tip,
+                    base_fee=base_fee, block_number=history.newest_block + 1, urgency=urgency)
+
+
+class GasPricer:
+    def __init__(self, ew3: EulithWeb3, block_count: int = 20):
+        self.ew3 = ew3
+        self.block_count = block_count
+        self.chain_id = ew3.chain_id
+
+        self._lock = threading.Lock()
+        self._history: Optional[FeeHistory] = None
+
+    def history(self) -> FeeHistory:
+        """
+        Fee history up to the current head. It is kept until the head moves, so everything priced within one block
+        shares a single `eth_feeHistory` call and nothing is priced off a block that has already been superseded,
+        however fast or slow the chain's blocks are.
+        """
+        head = self.ew3.eth.block_number
+        with self._lock:
+            if self._history is None or self._history.newest_block != head:
+                raw = self.ew3.eth.fee_history(self.block_count, head, REWARD_PERCENTILES)
+                self._history = FeeHistory.from_rpc(raw)
+            return self._history
+
+    def invalidate(self):
+        with self._lock:
+            self._history = None
+
+    def quote(self, urgency: Urgency = Urgency.FAST) -> FeeQuote:
+        return compute_fees(self.history(), urgency, self.chain_id)
+
+    def apply(self, tx: TxParams, urgency: Urgency = Urgency.FAST) -> TxParams:
+        """
+        Set EIP-1559 fee fields on `tx` (e.g. the output of `commit_atomic_transaction`) in place and return it.
+        Also works as NonceManager's `fill_fees` hook.
+        """
+        quote = self.quote(urgency)
+        tx.pop('gasPrice', None)
+        tx['maxFeePerGas'] = hex(quote.max_fee_per_gas)
+        tx['maxPriorityFeePerGas'] = hex(quote.max_priority_fee_per_gas)
+        return tx
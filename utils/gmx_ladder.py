@@ -0,0 +1,432 @@
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from eth_abi import decode
+from eth_utils import event_signature_to_log_topic
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException, EulithUnsafeRequestException, guard_non_safe_atomic
+from eulith_web3.gmx.gmx import GMXClient
+from eulith_web3.websocket import EulithWebsocketRequestHandler, SubscribeRequest, SubscriptionHandle
+from web3.types import TxParams
+
+from utils.atomic_bundle import AtomicBundle
+from utils.pending_tx_filter import FunctionAbi
+from utils.rpc_batch import batch_request
+
+"""
+GMX v1 limit-order ladders placed in a single atomic transaction, and a local cache of open orders kept current from
+the OrderBook's events.
+
+`GMXClient.v1.create_increase_order` / `create_decrease_order` send one transaction per order, each checking the
+plugin approval, reading the execution fee and, for increases, sending its own ERC20 approval and waiting for it.
+An `OrderLadder` collects any number of levels, reads the execution fee and plugin approval once (one batch), and
+commits the plugin approval if needed, one ERC20 approval per pay token for the ladder's total and every order as
+legs of one `AtomicBundle`: a 20-level ladder is one transaction and one receipt.
+
+Inside an atomic transaction msg.sender owns the orders, their refunds, the positions they open and what decreases
+pay out. GmxV1Client refuses to place orders from the toolkit contract, where those would be stranded, and so does
+the ladder: `account` must be a Safe (checked on-chain in the same batch as the fee), which also pays the execution
+fees, sent as each order's value.
+
+`OrderCache` reads the account's most recent orders once, then follows CreateX/UpdateX/CancelX/ExecuteX OrderBook
+logs over a `logs` subscription instead of polling.
+"""
+
+PRICE_PRECISION = 10 ** 30
+
+CREATE_INCREASE_ORDER = FunctionAbi(
+    'createIncreaseOrder',
+    ('_path', '_amountIn', '_indexToken', '_minOut', '_sizeDelta', '_collateralToken', '_isLong', '_triggerPrice',
+     '_triggerAboveThreshold', '_executionFee', '_shouldWrap'),
+    ('address[]', 'uint256', 'address', 'uint256', 'uint256', 'address', 'bool', 'uint256', 'bool', 'uint256', 'bool'))
+CREATE_DECREASE_ORDER = FunctionAbi(
+    'createDecreaseOrder',
+    ('_indexToken', '_sizeDelta', '_collateralToken', '_collateralDelta', '_isLong', '_triggerPrice',
+     '_triggerAboveThreshold'),
+    ('address', 'uint256', 'address', 'uint256', 'bool', 'uint256', 'bool'))
+APPROVE_PLUGIN = FunctionAbi('approvePlugin', ('_plugin',), ('address',))
+
+_MIN_EXECUTION_FEE = FunctionAbi('minExecutionFee', (), ())
+_APPROVED_PLUGINS = FunctionAbi('approvedPlugins', ('account', 'plugin'), ('address', 'address'))
+_INCREASE_ORDERS_INDEX = FunctionAbi('increaseOrdersIndex', ('account',), ('address',))
+_DECREASE_ORDERS_INDEX = FunctionAbi('decreaseOrdersIndex', ('account',), ('address',))
+_GET_INCREASE_ORDER = FunctionAbi('getIncreaseOrder', ('_account', '_orderIndex'), ('address', 'uint256'))
+_GET_DECREASE_ORDER = FunctionAbi('getDecreaseOrder', ('_account', '_orderIndex'), ('address', 'uint256'))
+
+_GET_THRESHOLD = FunctionAbi('getThreshold', (), ())
+
+_ZERO_ADDRESS = '0x' + '00' * 20
+
+
+def _usd(value: float) -> int:
+    # Through Decimal so e.g. 1500.1 doesn't pick up float noise at 30 decimals
+    return int(Decimal(str(value)) * PRICE_PRECISION)
+
+
+@dataclass(frozen=True)
+class LadderLevel:
+    price_usd: float
+    size_delta_usd: float
+    amount_in: float = 0.0              # increase orders: pay token put up at this level
+    collateral_delta_usd: float = 0.0   # decrease orders: collateral taken out at this level
+
+    @classmethod
+    def spread(cls, low_price_usd: float, high_price_usd: float, n: int, total_size_usd: float,
+               total_amount_in: float = 0.0, total_collateral_delta_usd: float = 0.0) -> List['LadderLevel']:
+        """
+        `n` evenly spaced prices from low to high, splitting the totals equally between them.
+        """
+        step = (high_price_usd - low_price_usd) / (n - 1) if n > 1 else 0.0
+        return [cls(low_price_usd + i * step, total_size_usd / n, total_amount_in / n, total_collateral_delta_usd / n)
+                for i in range(n)]
+
+
+@dataclass
+class _LadderLeg:
+    increase: bool
+    index_token: EulithERC20
+    token: EulithERC20          # pay token for increases, collateral token for decreases
+    collateral_token: EulithERC20
+    is_long: bool
+    level: LadderLevel
+
+
+class OrderLadder:
+    def __init__(self, ew3: EulithWeb3, auth_address: str, account: str, gmx: Optional[GMXClient] = None):
+        """
+        :param auth_address: The wallet authorizing the atomic transaction.
+        :param account: The Safe that places, and owns, the orders.
+        """
+        self.ew3 = ew3
+        self.auth_address = auth_address
+        self.account = ew3.to_checksum_address(account)
+        self.gmx = (gmx or GMXClient(ew3)).v1
+        self._legs: List[_LadderLeg] = []
+
+    def __len__(self):
+        return len(self._legs)
+
+    def increase(self, index_token: EulithERC20, pay_token: EulithERC20, is_long: bool,
+                 levels: Sequence[LadderLevel], collateral_token: Optional[EulithERC20] = None) -> 'OrderLadder':
+        """
+        Increase (buy limit) orders; a long fills at or below each price, a short at or above.
+
+        Longs are collateralized in the index token unless `collateral_token` says otherwise; GMX only takes
+        stablecoin collateral for shorts, so shorts must name one.
+        """
+        if collateral_token is None:
+            if not is_long:
+                raise ValueError('short orders need a stablecoin collateral_token')
+            collateral_token = index_token
+        self._legs.extend(_LadderLeg(True, index_token, pay_token, collateral_token, is_long, level)
+                          for level in levels)
+        return self
+
+    def decrease(self, index_token: EulithERC20, collateral_token: EulithERC20, is_long: bool,
+                 levels: Sequence[LadderLevel]) -> 'OrderLadder':
+        """
+        Decrease (sell limit / take profit) orders; a long fills at or above each price, a short at or below.
+        """
+        self._legs.extend(_LadderLeg(False, index_token, collateral_token, collateral_token, is_long, level)
+                          for level in levels)
+        return self
+
+    def bundle(self) -> AtomicBundle:
+        """
+        The ladder as bundle legs, for adding more legs before committing.
+
+        Raises EulithUnsafeRequestException if `account` isn't a Safe, or if called inside an atomic transaction
+        that doesn't go through one.
+        """
+        guard_non_safe_atomic(self.ew3)
+
+        orderbook = self.ew3.to_checksum_address(self.gmx.get_address('orderbook'))
+        router = self.ew3.to_checksum_address(self.gmx.get_address('router'))
+
+        fee_result, approved_result, threshold_result = batch_request(self.ew3, [
+            ('eth_call', [{'to': orderbook, 'data': _MIN_EXECUTION_FEE.encode()}, 'latest']),
+            ('eth_call', [{'to': router, 'data': _APPROVED_PLUGINS.encode(self.account, orderbook)}, 'latest']),
+            ('eth_call', [{'to': self.account, 'data': _GET_THRESHOLD.encode()}, 'latest']),
+        ], raise_errors=False)
+        for result in (fee_result, approved_result):
+            if isinstance(result, EulithRpcException):
+                raise result
+        # The toolkit contract has no getThreshold, so the call reverts or comes back empty
+        if isinstance(threshold_result, EulithRpcException) or int(threshold_result[2:] or '0', 16) == 0:
+            raise EulithUnsafeRequestException(
+                f'{self.account} is not a Safe; orders placed from it would leave positions, refunds and payouts '
+                f'stranded there')
+
+        min_execution_fee = int(fee_result, 16)
+        plugin_approved = int(approved_result, 16) != 0
+
+        bundle = AtomicBundle(self.ew3, self.auth_address, self.account)
+        if not plugin_approved:
+            bundle.call(router, APPROVE_PLUGIN.encode(orderbook))
+
+        # One approval per pay token, covering every level that pays with it
+        totals: Dict[str, Tuple[EulithERC20, int]] = {}
+        for leg in self._legs:
+            if leg.increase:
+                token, total = totals.get(leg.token.address, (leg.token, 0))
+                totals[leg.token.address] = (token, total + token.float_to_int(leg.level.amount_in))
+        for address, (token, total) in totals.items():
+            bundle.erc20_approve(address, router, total)
+
+        for leg in self._legs:
+            level, index_token = leg.level, leg.index_token.address
+            if leg.increase:
+                data = CREATE_INCREASE_ORDER.encode(
+                    [leg.token.address], leg.token.float_to_int(level.amount_in), index_token, 0,
+                    _usd(level.size_delta_usd), leg.collateral_token.address, leg.is_long, _usd(level.price_usd),
+                    not leg.is_long, min_execution_fee, False)
+                bundle.call(orderbook, data, min_execution_fee)
+            else:
+                data = CREATE_DECREASE_ORDER.encode(
+                    index_token, _usd(level.size_delta_usd), leg.token.address, _usd(level.collateral_delta_usd),
+                    leg.is_long, _usd(level.price_usd), leg.is_long)
+                # The OrderBook wants strictly more than the minimum for decrease orders
+                bundle.call(orderbook, data, min_execution_fee + 1)
+        return bundle
+
+    def commit(self) -> TxParams:
+        """
+        Commit the whole ladder as one atomic transaction through the Safe and return it, ready to sign and send.
+        """
+        return self.bundle().commit()
+
+
+@dataclass
+class GmxOrder:
+    increase: bool
+    index: int
+    account: str
+    collateral_token: str
+    index_token: str
+    is_long: bool
+    size_delta_usd: float
+    trigger_price_usd: float
+    trigger_above_threshold: bool
+    purchase_token: Optional[str] = None    # increase orders
+    purchase_amount: int = 0                # increase orders, in the purchase token's base units
+    collateral_delta_usd: float = 0.0       # decrease orders
+    execution_fee: int = 0
+    execution_price_usd: Optional[float] = None
+
+    @property
+    def key(self) -> Tuple[bool, int]:
+        return self.increase, self.index
+
+
+def _addr(value: str) -> str:
+    return value.lower()
+
+
+_INCREASE_FIELDS = ('uint256', 'address', 'uint256', 'address', 'address', 'uint256', 'bool', 'uint256', 'bool',
+                    'uint256')
+_DECREASE_FIELDS = ('uint256', 'address', 'uint256', 'address', 'uint256', 'bool', 'uint256', 'bool', 'uint256')
+
+# Non-indexed fields of each OrderBook event; `account` comes first and is the only indexed one
+_ORDER_EVENT_FIELDS = [
+    (True, 'create', _INCREASE_FIELDS),
+    (True, 'cancel', _INCREASE_FIELDS),
+    (True, 'execute', _INCREASE_FIELDS + ('uint256',)),
+    (True, 'update', ('uint256', 'address', 'address', 'bool', 'uint256', 'uint256', 'bool')),
+    (False, 'create', _DECREASE_FIELDS),
+    (False, 'cancel', _DECREASE_FIELDS),
+    (False, 'execute', _DECREASE_FIELDS + ('uint256',)),
+    (False, 'update', _DECREASE_FIELDS[:-1]),
+]
+
+
+def _event_topic(increase: bool, action: str, types: Tuple[str, ...]) -> str:
+    name = f'{action.capitalize()}{"Increase" if increase else "Decrease"}Order'
+    return '0x' + event_signature_to_log_topic(f'{name}({",".join(("address",) + types)})').hex()
+
+
+# topic -> (increase, action, non-indexed field types)
+_ORDER_EVENTS = {_event_topic(*event): event for event in _ORDER_EVENT_FIELDS}
+
+
+def _order_from_event(increase: bool, action: str, account: str, fields: tuple) -> GmxOrder:
+    index = fields[0]
+    if increase and action == 'update':
+        collateral, index_token, is_long, size, price, above = fields[1:]
+        return GmxOrder(True, index, account, _addr(collateral), _addr(index_token), is_long,
+                        size / PRICE_PRECISION, price / PRICE_PRECISION, above)
+    if increase:
+        purchase, amount, collateral, index_token, size, is_long, price, above, fee = fields[1:10]
+        order = GmxOrder(True, index, account, _addr(collateral), _addr(index_token), is_long, size / PRICE_PRECISION,
+                         price / PRICE_PRECISION, above, _addr(purchase), amount, execution_fee=fee)
+    elif action == 'update':
+        collateral, collateral_delta, index_token, size, is_long, price, above = fields[1:]
+        return GmxOrder(False, index, account, _addr(collateral), _addr(index_token), is_long,
+                        size / PRICE_PRECISION, price / PRICE_PRECISION, above,
+                        collateral_delta_usd=collateral_delta / PRICE_PRECISION)
+    else:
+        collateral, collateral_delta, index_token, size, is_long, price, above, fee = fields[1:9]
+        order = GmxOrder(False, index, account, _addr(collateral), _addr(index_token), is_long,
+                         size / PRICE_PRECISION, price / PRICE_PRECISION, above,
+                         collateral_delta_usd=collateral_delta / PRICE_PRECISION, execution_fee=fee)
+    if action == 'execute':
+        order.execution_price_usd = fields[-1] / PRICE_PRECISION
+    return order
+
+
+class _LogHandler(EulithWebsocketRequestHandler):
+    def __init__(self, cache: 'OrderCache'):
+        self.cache = cache
+
+    def handle_result(self, message: Dict[Any, Any]):
+        log = message.get('params', {}).get('result')
+        if isinstance(log, dict):
+            self.cache.apply_log(log)
+
+    def handle_error(self, message: Dict[Any, Any]):
+        print(f'GMX order log subscription error: {message}')
+
+
+class OrderCache:
+    def __init__(self, ew3: EulithWeb3, account: str, gmx: Optional[GMXClient] = None, lookback: int = 100,
+                 on_executed: Optional[Callable[[GmxOrder], None]] = None):
+        """
+        :param account: The toolkit contract or Safe whose orders are cached.
+        :param lookback: How many of the account's most recent increase and decrease orders `sync()` reads.
+        :param on_executed: Called with each order as it executes, on the provider's worker threads.
+        """
+        self.ew3 = ew3
+        self.account = ew3.to_checksum_address(account)
+        self.gmx = (gmx or GMXClient(ew3)).v1
+        self.lookback = lookback
+        self.on_executed = on_executed
+        self.executed: List[GmxOrder] = []
+
+        self._orders: Dict[Tuple[bool, int], GmxOrder] = {}
+        # Orders seen cancelled or executed, so a Create processed after them (handlers run concurrently) is ignored
+        self._closed: Set[Tuple[bool, int]] = set()
+        self._lock = threading.Lock()
+        self._orderbook: Optional[str] = None
+        self._logs: Optional[SubscriptionHandle] = None
+
+    @property
+    def orderbook(self) -> str:
+        if self._orderbook is None:
+            self._orderbook = self.ew3.to_checksum_address(self.gmx.get_address('orderbook'))
+        return self._orderbook
+
+    def open_orders(self, increase: Optional[bool] = None) -> List[GmxOrder]:
+        with self._lock:
+            orders = [o for o in self._orders.values() if increase is None or o.increase == increase]
+        return sorted(orders, key=lambda o: (not o.increase, o.index))
+
+    def get(self, increase: bool, index: int) -> Optional[GmxOrder]:
+        return self._orders.get((increase, index))
+
+    def __len__(self):
+        return len(self._orders)
+
+    def start(self) -> 'OrderCache':
+        # Subscribe first, so nothing that happens while sync() reads is missed
+        log_filter = {'address': self.orderbook, 'topics': [list(_ORDER_EVENTS), '0x' + '0' * 24 +
+                                                            self.account[2:].lower()]}
+        self._logs = self.ew3.eulith_service.subscribe(SubscribeRequest(args=['logs', log_filter]),
+                                                       _LogHandler(self))
+        self.sync()
+        return self
+
+    def stop(self):
+        if self._logs and self._logs.sub_details.subscription_id:
+            try:
+                self._logs.unsubscribe()
+            except (ValueError, EulithRpcException):
+                pass
+        self._logs = None
+
+    def __enter__(self) -> 'OrderCache':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def sync(self):
+        """
+        Read the account's `lookback` most recent orders of each kind from the OrderBook, in two batches.
+        """
+        increase_count, decrease_count = [int(r, 16) for r in batch_request(self.ew3, [
+            ('eth_call', [{'to': self.orderbook, 'data': f.encode(self.account)}, 'latest'])
+            for f in (_INCREASE_ORDERS_INDEX, _DECREASE_ORDERS_INDEX)])]
+
+        keys = [(True, i) for i in range(max(0, increase_count - self.lookback), increase_count)]
+        keys += [(False, i) for i in range(max(0, decrease_count - self.lookback), decrease_count)]
+        calls = [('eth_call', [{'to': self.orderbook,
+                                'data': (_GET_INCREASE_ORDER if inc else _GET_DECREASE_ORDER).encode(self.account, i)},
+                               'latest']) for inc, i in keys]
+
+        orders = {}
+        for (increase, index), result in zip(keys, batch_request(self.ew3, calls, raise_errors=False)):
+            if isinstance(result, Exception) or not result or result == '0x':
+                continue
+            order = self._order_from_getter(increase, index, bytes.fromhex(result[2:]))
+            if order is not None:
+                orders[order.key] = order
+
+        with self._lock:
+            # Keep anything the subscription added since; drop what's gone from the contract
+            for key in keys:
+                if key not in orders:
+                    self._orders.pop(key, None)
+            for key, order in orders.items():
+                if key not in self._closed:
+                    self._orders.setdefault(key, order)
+
+    def _order_from_getter(self, increase: bool, index: int, data: bytes) -> Optional[GmxOrder]:
+        if increase:
+            purchase, amount, collateral, index_token, size, is_long, price, above, fee = decode(
+                ['address', 'uint256', 'address', 'address', 'uint256', 'bool', 'uint256', 'bool', 'uint256'], data)
+            fields = (index, purchase, amount, collateral, index_token, size, is_long, price, above, fee)
+        else:
+            collateral, collateral_delta, index_token, size, is_long, price, above, fee = decode(
+                ['address', 'uint256', 'address', 'uint256', 'bool', 'uint256', 'bool', 'uint256'], data)
+            fields = (index, collateral, collateral_delta, index_token, size, is_long, price, above, fee)
+        if _addr(index_token) == _ZERO_ADDRESS:
+            return None  # cancelled or executed; the contract deletes the struct
+        return _order_from_event(increase, 'create', self.account, fields)
+
+    def apply_log(self, log: Dict[str, Any]):
+        topics = log.get('topics') or []
+        event = _ORDER_EVENTS.get(topics[0]) if topics else None
+        if event is None or len(topics) < 2 or ('0x' + topics[1][-40:]).lower() != self.account.lower():
+            return
+        if log.get('removed'):
+            # Reorged out; the contract has the truth
+            self.sync()
+            return
+
+        increase, action, types = event
+        fields = decode(list(types), bytes.fromhex(log['data'][2:]))
+        order = _order_from_event(increase, action, self.account, fields)
+
+        with self._lock:
+            if action in ('cancel', 'execute'):
+                self._closed.add(order.key)
+                self._orders.pop(order.key, None)
+            elif order.key in self._closed:
+                return
+            elif action == 'update' and order.key in self._orders:
+                current = self._orders[order.key]
+                current.size_delta_usd = order.size_delta_usd
+                current.trigger_price_usd = order.trigger_price_usd
+                current.trigger_above_threshold = order.trigger_above_threshold
+                if not increase:
+                    current.collateral_delta_usd = order.collateral_delta_usd
+            elif action in ('create', 'update'):
+                self._orders[order.key] = order
+
+            if action == 'execute':
+                self.executed.append(order)
+
+        if action == 'execute' and self.on_executed:
+            self.on_executed(order)
@@ -0,0 +1,297 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from eulith_web3.hyperliquid.rpc import HyperliquidDataType, HyperliquidGetDataRequest
+
+from utils.price_stream import RingBuffer
+
+"""
+Poll Hyperliquid data through Eulith on a schedule, within a request budget, and hand subscribers only what changed.
+
+Each `HyperliquidDataType` is a feed with its own interval. Feeds share one token bucket (`requests_per_second`,
+`burst`), so adding feeds can't push the process past its budget: a feed that's due while the bucket is empty waits
+for the next token instead of firing. The earliest-due feed goes first.
+
+Every payload is flattened to symbol -> value (MID_PRICES gives "BTC" -> "43000.5"; ASSET_CONTEXTS pairs each
+asset's context with its name from the universe; lists of records are keyed by their most specific id: fills by
+`tid` (or `hash`), orders by `oid`, and only then per-coin records by `coin` or `name`) and
+compared with the previous one on the raw values, so unchanged symbols are neither parsed nor dispatched.
+Subscribers get {symbol: value} for the symbols that changed (None for symbols that went away). The numeric fields
+of every change are appended to a per-symbol, per-feed ring buffer with a `polled_at` column, so `history()` returns
+columns rather than a list of dicts.
+"""
+
+Callback = Callable[[HyperliquidDataType, Dict[str, Any]], None]
+
+# Most specific first: several fills share an oid, several orders share a coin
+_RECORD_KEYS = ('tid', 'oid', 'hash', 'coin', 'name')
+
+
+def _flatten(payload: Any) -> Dict[str, Any]:
+    if isinstance(payload, dict):
+        # A single wrapper key around the actual data, e.g. {'mid_prices': {...}}
+        if len(payload) == 1:
+            inner = next(iter(payload.values()))
+            if isinstance(inner, (dict, list)):
+                return _flatten(inner)
+        return payload
+
+    if isinstance(payload, list):
+        # [meta, contexts], as in Hyperliquid's metaAndAssetCtxs: contexts line up with meta['universe']
+        if len(payload) == 2 and isinstance(payload[0], dict) and 'universe' in payload[0] \
+                and isinstance(payload[1], list):
+            return {asset.get('name', str(i)): ctx for i, (asset, ctx) in
+                    enumerate(zip(payload[0]['universe'], payload[1]))}
+
+        flat = {}
+        for i, item in enumerate(payload):
+            key = next((str(item[k]) for k in _RECORD_KEYS if isinstance(item, dict) and k in item), str(i))
+            flat[key] = item
+        return flat
+
+    return {'value': payload}
+
+
+def _numeric_fields(value: Any) -> Dict[str, float]:
+    if isinstance(value, dict):
+        fields = {}
+        for name, v in value.items():
+            number = _number(v)
+            if number is not None:
+                fields[name] = number
+        return fields
+    number = _number(value)
+    return {} if number is None else {'value': number}
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+class RateBudget:
+    """
+    Token bucket: `rate` requests per second on average, up to `burst` at once.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """
+        Take a token if one is available and return 0, otherwise return how many seconds until one is.
+        """
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+
+@dataclass
+class FeedStats:
+    polls: int = 0
+    errors: int = 0
+    throttled: int = 0          # times the feed was due but the budget was spent
+    changed: int = 0            # symbols dispatched
+    unchanged: int = 0          # symbols skipped because their raw value didn't change
+    last_poll_seconds: float = 0.0
+
+
+@dataclass
+class _Feed:
+    data_type: HyperliquidDataType
+    interval: float
+    keep_history: bool
+    next_due: float = 0.0
+    raw: Dict[str, Any] = field(default_factory=dict)
+    values: Dict[str, Any] = field(default_factory=dict)
+    history: Dict[str, RingBuffer] = field(default_factory=dict)
+    stats: FeedStats = field(default_factory=FeedStats)
+
+
+class HyperliquidCache:
+    def __init__(self, ew3: EulithWeb3, account_address: str, ace_address: str, requests_per_second: float = 2.0,
+                 burst: int = 4, history_size: int = 4096):
+        """
+        :param account_address: Your Hyperliquid account address.
+        :param ace_address: Your ACE address.
+        :param history_size: Changes kept per symbol and feed.
+        """
+        self.ew3 = ew3
+        self.account_address = account_address
+        self.ace_address = ew3.to_checksum_address(ace_address)
+        self.budget = RateBudget(requests_per_second, burst)
+        self.history_size = history_size
+
+        self._feeds: Dict[HyperliquidDataType, _Feed] = {}
+        self._subscribers: List[Tuple[Callback, Optional[HyperliquidDataType], Optional[frozenset]]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add_feed(self, data_type: HyperliquidDataType, interval: float, keep_history: bool = True) \
+            -> 'HyperliquidCache':
+        """
+        Poll `data_type` every `interval` seconds, budget permitting.
+        """
+        self._feeds[data_type] = _Feed(data_type, interval, keep_history)
+        return self
+
+    def subscribe(self, callback: Callback, data_type: Optional[HyperliquidDataType] = None,
+                  symbols: Optional[List[str]] = None) -> 'HyperliquidCache':
+        """
+        Call `callback(data_type, changes)` with each poll's changed symbols, optionally only for one feed and a set
+        of symbols. Runs on the polling thread, so keep it short.
+        """
+        self._subscribers.append((callback, data_type, frozenset(symbols) if symbols else None))
+        return self
+
+    def get(self, data_type: HyperliquidDataType, symbol: str) -> Any:
+        return self._feeds[data_type].values.get(symbol)
+
+    def values(self, data_type: HyperliquidDataType) -> Dict[str, Any]:
+        """
+        Latest value of every symbol. Parsed values are floats for numeric payloads, the raw records otherwise.
+        """
+        with self._lock:
+            return dict(self._feeds[data_type].values)
+
+    def history(self, symbol: str, data_type: HyperliquidDataType = HyperliquidDataType.MID_PRICES,
+                n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        The newest `n` changes of `symbol` (all retained by default), oldest first: a `polled_at` column plus one
+        column per numeric field (`value` for scalar payloads such as mid prices).
+        """
+        buffer = self._feeds[data_type].history.get(symbol)
+        return buffer.latest(n) if buffer is not None else {}
+
+    def stats(self) -> Dict[HyperliquidDataType, FeedStats]:
+        return {data_type: feed.stats for data_type, feed in self._feeds.items()}
+
+    def start(self) -> 'HyperliquidCache':
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='hyperliquid-cache', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'HyperliquidCache':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.poll_due())
+
+    def poll_due(self) -> float:
+        """
+        Poll every feed that's due, as far as the budget allows. Returns the seconds until the next one is.
+        """
+        while self._feeds:
+            feed = min(self._feeds.values(), key=lambda f: f.next_due)
+            now = time.monotonic()
+            if feed.next_due > now:
+                return feed.next_due - now
+
+            wait = self.budget.try_acquire()
+            if wait:
+                feed.stats.throttled += 1
+                return wait
+
+            feed.next_due = now + feed.interval
+            self._poll(feed)
+        return 1.0
+
+    def _poll(self, feed: _Feed):
+        start = time.monotonic()
+        try:
+            payload = self.ew3.hyperliquid.get_data(HyperliquidGetDataRequest(
+                account_address=self.account_address, data_type=feed.data_type, ace_address=self.ace_address))
+            self._apply(feed, payload, start)
+        except Exception as e:
+            # RPC failures, but also a payload shape the flattening doesn't expect; neither may stop the polling thread
+            feed.stats.errors += 1
+            if not isinstance(e, (EulithRpcException, TimeoutError, IOError)):
+                print(f'hyperliquid cache {feed.data_type} poll failed: {type(e).__name__}: {e}')
+
+    def _apply(self, feed: _Feed, payload: Any, start: float):
+        raw = _flatten(payload)
+        now = time.time()
+        changes: Dict[str, Any] = {}
+        unchanged = 0
+        for symbol, value in raw.items():
+            # Compare the raw values; only changed symbols get parsed
+            if symbol in feed.raw and feed.raw[symbol] == value:
+                unchanged += 1
+                continue
+            number = _number(value)
+            changes[symbol] = number if number is not None else value
+            if feed.keep_history:
+                self._record(feed, symbol, value, now)
+        for symbol in feed.raw.keys() - raw.keys():
+            changes[symbol] = None
+
+        with self._lock:
+            feed.raw = raw
+            for symbol, value in changes.items():
+                if value is None:
+                    feed.values.pop(symbol, None)
+                else:
+                    feed.values[symbol] = value
+
+        feed.stats.polls += 1
+        feed.stats.changed += len(changes)
+        feed.stats.unchanged += unchanged
+        feed.stats.last_poll_seconds = time.monotonic() - start
+
+        if changes:
+            self._dispatch(feed.data_type, changes)
+
+    def _record(self, feed: _Feed, symbol: str, value: Any, now: float):
+        fields = _numeric_fields(value)
+        if not fields:
+            return
+        buffer = feed.history.get(symbol)
+        if buffer is None:
+            # A record's own `time` field (fills have one) is kept as a column of its own
+            buffer = RingBuffer(self.history_size, **{'polled_at': np.float64, **{name: np.float64 for name in fields}})
+            feed.history[symbol] = buffer
+        # Columns are fixed by the first record; fields missing later are stored as NaN
+        buffer.append(**{**{name: fields.get(name, np.nan) for name in buffer.columns}, 'polled_at': now})
+
+    def _dispatch(self, data_type: HyperliquidDataType, changes: Dict[str, Any]):
+        for callback, wanted_type, symbols in self._subscribers:
+            if wanted_type is not None and wanted_type != data_type:
+                continue
+            selected = changes if symbols is None else {s: v for s, v in changes.items() if s in symbols}
+            if selected:
+                try:
+                    callback(data_type, selected)
+                except Exception as e:
+                    print(f'hyperliquid cache subscriber failed: {e}')
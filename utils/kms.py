@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from eth_keys.backends import NativeECCBackend
+from eth_keys.datatypes import PublicKey
+from eulith_web3.signer import Signer
+
+"""
+Build KMS signers quickly and cheaply.
+
+Every signer made by one factory shares a single boto3 KMS client (boto3 clients are thread-safe), sized so
+concurrent signing doesn't queue on its connection pool. `KmsSigner` normally calls get_public_key in its
+constructor just to learn its address; the factory reads each key's address once itself and remembers
+alias -> address on disk, so after the first run building a signer makes no KMS calls at all. `prefetch` resolves
+several keys at once on startup.
+
+Pass your own `client` to point the factory at a local stand-in such as moto (tests/test_kms.py uses a stub). boto3 is only imported when the
+factory has to build a client itself, and `eulith_web3.kms` (which pulls in botocore) only when the first signer is
+built, so importing this module is cheap for scripts that never sign with KMS.
+
+`KmsSignerFactory.shared()` returns one factory per profile and region for the whole process, so a long-lived
+process (see utils/runner.py) keeps its KMS client and signers between runs.
+"""
+
+DEFAULT_ADDRESS_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'eulith-examples', 'kms_addresses.json')
+
+
+@lru_cache(maxsize=None)
+def _signer_classes() -> Tuple[type, type]:
+    from eulith_web3.kms import KmsSigner
+
+    class CachedKmsSigner(KmsSigner):
+        """
+        A KmsSigner whose address is already known, so construction doesn't touch KMS. Signing is unchanged.
+        """
+
+        def __init__(self, kms_client: Any, key_id: str, address: str):
+            self.key_id = key_id
+            self.client = kms_client
+            self.backend = NativeECCBackend()
+            self.public_address = address
+
+    return KmsSigner, CachedKmsSigner
+
+
+def __getattr__(name: str) -> Any:
+    # `from utils.kms import KmsSigner, CachedKmsSigner` still works; it just pays for the import at that point
+    if name in ('KmsSigner', 'CachedKmsSigner'):
+        return _signer_classes()[name == 'CachedKmsSigner']
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class KmsSignerFactory:
+    _shared: Dict[Tuple[Optional[str], Optional[str]], 'KmsSignerFactory'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, client: Any = None, profile_name: Optional[str] = None, region_name: Optional[str] = None,
+                 max_pool_connections: int = 32, cache_path: Optional[str] = DEFAULT_ADDRESS_CACHE_PATH):
+        """
+        :param cache_path: Where to keep alias -> address mappings. None disables the disk cache.
+        """
+        if client is None:
+            import boto3
+            from botocore.config import Config
+
+            session = boto3.Session(profile_name=profile_name, region_name=region_name)
+            client = session.client('kms', config=Config(max_pool_connections=max_pool_connections))
+        self.client = client
+        self.profile_name = profile_name or 'default'
+        self.cache_path = cache_path
+
+        self._lock = threading.Lock()
+        self._signers: Dict[str, Signer] = {}
+        self._addresses: Dict[str, str] = self._load()
+
+    @classmethod
+    def shared(cls, profile_name: Optional[str] = None, region_name: Optional[str] = None) -> 'KmsSignerFactory':
+        with cls._shared_lock:
+            factory = cls._shared.get((profile_name, region_name))
+            if factory is None:
+                factory = cls._shared[(profile_name, region_name)] = cls(profile_name=profile_name,
+                                                                         region_name=region_name)
+            return factory
+
+    @staticmethod
+    def key_id(key_name: str) -> str:
+        # Bare names are treated as aliases; key ids, ARNs and 'alias/...' pass through untouched
+        if key_name.startswith(('alias/', 'arn:')) or len(key_name) == 36 and key_name.count('-') == 4:
+            return key_name
+        return f'alias/{key_name}'
+
+    def signer(self, key_name: str) -> Signer:
+        key_id = self.key_id(key_name)
+        with self._lock:
+            signer = self._signers.get(key_id)
+            address = self._addresses.get(self._cache_key(key_id))
+        if signer:
+            return signer
+
+        if not address:
+            address = self._fetch_address(key_id)
+            self._remember(key_id, address)
+        signer = _signer_classes()[1](self.client, key_id, address)
+
+        with self._lock:
+            return self._signers.setdefault(key_id, signer)
+
+    def prefetch(self, key_names: Iterable[str], max_workers: int = 8) -> Dict[str, Signer]:
+        """
+        Build signers for all `key_names` concurrently, keyed by the name they were requested with.
+        """
+        key_names = list(key_names)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kms') as executor:
+            return dict(zip(key_names, executor.map(self.signer, key_names)))
+
+    def forget(self, key_name: Optional[str] = None):
+        """
+        Drop a cached address (or all of them), e.g. after an alias is pointed at a different key.
+        """
+        with self._lock:
+            if key_name is None:
+                self._signers.clear()
+                self._addresses.clear()
+            else:
+                key_id = self.key_id(key_name)
+                self._signers.pop(key_id, None)
+                self._addresses.pop(self._cache_key(key_id), None)
+            self._save()
+
+    def _fetch_address(self, key_id: str) -> str:
+        # KMS returns DER SubjectPublicKeyInfo ending in the uncompressed point 04 || X || Y. KmsSigner's own ASN.1
+        # walk misreads it with asn1 3.x (it returns the algorithm OID), so the point is taken from the end directly
+        der = self.client.get_public_key(KeyId=key_id)['PublicKey']
+        return PublicKey(der[-64:]).to_checksum_address()
+
+    def _cache_key(self, key_id: str) -> str:
+        # Aliases are only unique within an account and region
+        return f'{self.profile_name}/{self.client.meta.region_name}/{key_id}'
+
+    def _remember(self, key_id: str, address: str):
+        with self._lock:
+            self._addresses[self._cache_key(key_id)] = address
+            self._save()
+
+    def _load(self) -> Dict[str, str]:
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._addresses, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
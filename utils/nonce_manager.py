@@ -0,0 +1,145 @@
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from hexbytes import HexBytes
+from web3.types import TxParams
+
+"""
+Assign nonces locally so one account can have many transactions in flight at once.
+
+The signing middleware only asks the node for a nonce when the transaction doesn't carry one, so giving every
+transaction its nonce up front lets a script fire off approve -> transfer_from -> ... back to back and wait for the
+receipts at the end, instead of one transaction per block.
+
+Transactions sent through the manager must carry an explicit 'gas' if they depend on earlier, still pending ones:
+gas estimation runs against the latest block and would fail. Don't use it inside an atomic transaction either;
+those calls only add to the bundle and are never signed, so send the committed bundle through the manager instead.
+"""
+
+# 'replacement transaction underpriced' means a different pending transaction already holds the nonce. 'already
+# known' is deliberately absent: that is the very same transaction, and sending it again under a new nonce would
+# execute it twice.
+NONCE_TOO_LOW = ('nonce too low', 'nonce is too low', 'replacement transaction underpriced')
+NONCE_TOO_HIGH = ('nonce too high', 'nonce is too high', 'nonce gap')
+
+# Nodes reject a replacement unless it raises the fees by at least 10% (geth) or 12.5% (some other clients)
+MIN_FEE_BUMP = 1.125
+
+
+@dataclass
+class PendingTx:
+    nonce: int
+    tx: TxParams
+    tx_hash: HexBytes
+
+
+class NonceManager:
+    def __init__(self, ew3: EulithWeb3, address: str, fill_fees: Optional[Callable[[TxParams], TxParams]] = None,
+                 max_retries: int = 3):
+        """
+        :param fill_fees: Optional hook that sets the fee fields on each transaction before it is signed.
+        """
+        self.ew3 = ew3
+        self.address = ew3.to_checksum_address(address)
+        self.fill_fees = fill_fees
+        self.max_retries = max_retries
+        self.pending: Dict[int, PendingTx] = {}
+
+        self._lock = threading.Lock()
+        self._next_nonce: Optional[int] = None
+
+    def sync(self) -> int:
+        """
+        Reset the local counter from the node's pending transaction count.
+        """
+        with self._lock:
+            return self._sync()
+
+    def _sync(self) -> int:
+        self._next_nonce = self.ew3.eth.get_transaction_count(self.address, 'pending')
+        return self._next_nonce
+
+    def send(self, tx: TxParams) -> HexBytes:
+        """
+        Assign the next nonce to `tx` and send it, resyncing and retrying if the node disagrees about the nonce.
+        Sends are serialized per account so the node receives nonces in order and a failed send never leaves a gap.
+        """
+        if self.ew3.is_atomic():
+            raise ValueError('NonceManager cannot be used inside an atomic transaction')
+
+        tx = dict(tx)
+        tx['from'] = self.address
+        if self.fill_fees:
+            tx = self.fill_fees(tx)
+
+        with self._lock:
+            for attempt in range(self.max_retries + 1):
+                if self._next_nonce is None:
+                    self._sync()
+
+                tx['nonce'] = self._next_nonce
+                try:
+                    tx_hash = self.ew3.eth.send_transaction(tx)
+                except (ValueError, EulithRpcException) as e:
+                    message = str(e).lower()
+                    if attempt == self.max_retries or not any(m in message for m in NONCE_TOO_LOW + NONCE_TOO_HIGH):
+                        raise
+                    # Something else used our nonce (too low) or an earlier transaction was dropped (too high);
+                    # either way the node's view is the one that counts.
+                    self._sync()
+                    continue
+
+                self.pending[tx['nonce']] = PendingTx(tx['nonce'], tx, tx_hash)
+                self._next_nonce += 1
+                return tx_hash
+
+    def replace(self, nonce: int, overrides: Optional[TxParams] = None, fee_bump: float = MIN_FEE_BUMP) -> HexBytes:
+        """
+        Resend the transaction at `nonce` with fees raised by `fee_bump` (and any `overrides` applied), e.g. to
+        speed up a stuck transaction.
+        """
+        with self._lock:
+            original = self.pending[nonce]
+            tx = dict(original.tx)
+            tx.update(overrides or {})
+            tx['nonce'] = nonce
+            self._bump_fees(tx, original, fee_bump)
+
+            tx_hash = self.ew3.eth.send_transaction(tx)
+            self.pending[nonce] = PendingTx(nonce, tx, tx_hash)
+            return tx_hash
+
+    def cancel(self, nonce: int, fee_bump: float = MIN_FEE_BUMP) -> HexBytes:
+        """
+        Replace the transaction at `nonce` with an empty self-transfer so it can't execute.
+        """
+        return self.replace(nonce, {'to': self.address, 'value': 0, 'data': b'', 'gas': 21000}, fee_bump)
+
+    def prune(self) -> int:
+        """
+        Forget transactions that have been mined. Returns the number still pending.
+        """
+        mined = self.ew3.eth.get_transaction_count(self.address, 'latest')
+        with self._lock:
+            for nonce in [n for n in self.pending if n < mined]:
+                del self.pending[nonce]
+            return len(self.pending)
+
+    def _bump_fees(self, tx: Dict, original: PendingTx, fee_bump: float):
+        fee_fields = ('maxFeePerGas', 'maxPriorityFeePerGas', 'gasPrice')
+        if not any(tx.get(f) for f in fee_fields):
+            # The middleware filled the fees in when it signed; read back what was actually sent
+            sent = self.ew3.eth.get_transaction(original.tx_hash)
+            for f in fee_fields:
+                if sent.get(f) is not None:
+                    tx[f] = sent[f]
+            if 'maxFeePerGas' in tx:
+                tx.pop('gasPrice', None)
+
+        for f in fee_fields:
+            if tx.get(f):
+                value = int(tx[f], 16) if isinstance(tx[f], str) else tx[f]
+                tx[f] = int(value * fee_bump) + 1
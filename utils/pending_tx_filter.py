@@ -0,0 +1,254 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from eth_abi import decode, encode
+from eth_abi.exceptions import DecodingError
+from eth_utils import function_signature_to_4byte_selector
+from eulith_web3.websocket import EulithWebsocketRequestHandler
+
+"""
+Pre-filter and batched calldata decoding for `subscribe_pending_transactions`.
+
+The subscription handler only does a set lookup on the `to` address and another on the 4-byte selector, so the
+overwhelming majority of mempool traffic is discarded after two dict probes. Matches go onto a bounded queue, and a
+single worker thread decodes them in batches against the registered function ABIs. When the worker falls behind the
+queue fills up and new matches are dropped (and counted) instead of stalling the websocket.
+"""
+
+
+@dataclass(frozen=True)
+class FunctionAbi:
+    name: str
+    arg_names: Tuple[str, ...]
+    arg_types: Tuple[str, ...]
+
+    @property
+    def signature(self) -> str:
+        return f'{self.name}({",".join(self.arg_types)})'
+
+    @property
+    def selector(self) -> str:
+        return '0x' + function_signature_to_4byte_selector(self.signature).hex()
+
+    def encode(self, *args: Any) -> str:
+        return self.selector + encode(self.arg_types, args).hex()
+
+
+_V3_EXACT_INPUT_SINGLE = '(address,address,uint24,address,uint256,uint256,uint256,uint160)'
+_V3_EXACT_OUTPUT_SINGLE = '(address,address,uint24,address,uint256,uint256,uint256,uint160)'
+_V3_EXACT_INPUT = '(bytes,address,uint256,uint256,uint256)'
+# SwapRouter02 dropped the deadline from the params structs
+_V3_02_EXACT_INPUT_SINGLE = '(address,address,uint24,address,uint256,uint256,uint160)'
+_V3_02_EXACT_INPUT = '(bytes,address,uint256,uint256)'
+
+ERC20_FUNCTIONS = [
+    FunctionAbi('transfer', ('to', 'amount'), ('address', 'uint256')),
+    FunctionAbi('approve', ('spender', 'amount'), ('address', 'uint256')),
+    FunctionAbi('transferFrom', ('from', 'to', 'amount'), ('address', 'address', 'uint256')),
+]
+
+UNISWAP_V2_ROUTER_FUNCTIONS = [
+    FunctionAbi('swapExactTokensForTokens', ('amountIn', 'amountOutMin', 'path', 'to', 'deadline'),
+                ('uint256', 'uint256', 'address[]', 'address', 'uint256')),
+    FunctionAbi('swapTokensForExactTokens', ('amountOut', 'amountInMax', 'path', 'to', 'deadline'),
+                ('uint256', 'uint256', 'address[]', 'address', 'uint256')),
+    FunctionAbi('swapExactETHForTokens', ('amountOutMin', 'path', 'to', 'deadline'),
+                ('uint256', 'address[]', 'address', 'uint256')),
+    FunctionAbi('swapTokensForExactETH', ('amountOut', 'amountInMax', 'path', 'to', 'deadline'),
+                ('uint256', 'uint256', 'address[]', 'address', 'uint256')),
+    FunctionAbi('swapExactTokensForETH', ('amountIn', 'amountOutMin', 'path', 'to', 'deadline'),
+                ('uint256', 'uint256', 'address[]', 'address', 'uint256')),
+    FunctionAbi('swapETHForExactTokens', ('amountOut', 'path', 'to', 'deadline'),
+                ('uint256', 'address[]', 'address', 'uint256')),
+]
+
+UNISWAP_V3_ROUTER_FUNCTIONS = [
+    FunctionAbi('exactInputSingle', ('params',), (_V3_EXACT_INPUT_SINGLE,)),
+    FunctionAbi('exactOutputSingle', ('params',), (_V3_EXACT_OUTPUT_SINGLE,)),
+    FunctionAbi('exactInput', ('params',), (_V3_EXACT_INPUT,)),
+    FunctionAbi('exactOutput', ('params',), (_V3_EXACT_INPUT,)),
+    FunctionAbi('exactInputSingle', ('params',), (_V3_02_EXACT_INPUT_SINGLE,)),
+    FunctionAbi('exactInput', ('params',), (_V3_02_EXACT_INPUT,)),
+]
+
+# Polygon mainnet
+QUICKSWAP_V2_ROUTER = '0xa5E0829CaCEd8fFDD4De3c43696c57F7D7A678ff'
+UNISWAP_V3_SWAP_ROUTER = '0xE592427A0AEce92De3Edee1F18E0157C05861564'
+UNISWAP_V3_SWAP_ROUTER_02 = '0x68b3465833fb72A70ecDF485E0e4C7bD8665Fc45'
+
+
+@dataclass
+class DecodedCall:
+    tx_hash: Optional[str]
+    tx_from: Optional[str]
+    tx_to: str
+    value: int
+    function: str
+    args: Dict[str, Any]
+
+
+@dataclass
+class FilterMetrics:
+    received: int = 0
+    matched: int = 0
+    decoded: int = 0
+    decode_errors: int = 0
+    callback_errors: int = 0
+    dropped: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def messages_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.received / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def match_rate(self) -> float:
+        return self.matched / self.received if self.received else 0.0
+
+    def __str__(self):
+        return (f'{self.messages_per_second:.1f} msgs/s, {self.received} received, {self.matched} matched '
+                f'({self.match_rate:.3%}), {self.decoded} decoded, {self.decode_errors} decode errors, '
+                f'{self.callback_errors} callback errors, {self.dropped} dropped')
+
+
+class PendingTxFilter(EulithWebsocketRequestHandler):
+    def __init__(self, on_decoded: Callable[[List[DecodedCall]], None], functions: Iterable[FunctionAbi],
+                 addresses: Optional[Iterable[str]] = None, max_queue: int = 10000, batch_size: int = 256,
+                 batch_interval: float = 0.05):
+        """
+        :param on_decoded: Called on the worker thread with each decoded batch.
+        :param functions: ABIs to decode. Their selectors double as the selector filter.
+        :param addresses: Only consider transactions sent to one of these. None accepts any target.
+        """
+        self.on_decoded = on_decoded
+        # Distinct ABIs can still collide on a 4-byte selector; when they do, the first one that decodes wins
+        self.functions: Dict[str, List[FunctionAbi]] = {}
+        for fn in functions:
+            self.functions.setdefault(fn.selector, []).append(fn)
+        self.addresses = {a.lower() for a in addresses} if addresses is not None else None
+
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.metrics = FilterMetrics()
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._metrics_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def start(self) -> 'PendingTxFilter':
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name='pending-tx-decoder', daemon=True)
+        self._worker.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._worker:
+            self._worker.join()
+            self._worker = None
+
+    def accepts(self, message: Dict[Any, Any]) -> bool:
+        """
+        The pre-filter: counts the message and says whether it is a watched call. AsyncSubscriptionRuntime runs it on
+        the provider thread, so only matches are scheduled onto the event loop.
+        """
+        result = message.get('params', {}).get('result')
+        if not isinstance(result, dict):
+            return False
+
+        with self._metrics_lock:
+            self.metrics.received += 1
+
+        to = result.get('to')
+        if to is None or (self.addresses is not None and to.lower() not in self.addresses):
+            return False
+        data = result.get('input') or ''
+        return data[:10] in self.functions
+
+    def handle_result(self, message: Dict[Any, Any]):
+        if self.accepts(message):
+            self.handle_accepted(message)
+
+    def handle_accepted(self, message: Dict[Any, Any]):
+        dropped = 0
+        try:
+            self._queue.put_nowait(message['params']['result'])
+        except queue.Full:
+            dropped = 1
+
+        with self._metrics_lock:
+            self.metrics.matched += 1
+            self.metrics.dropped += dropped
+
+    def handle_error(self, message: Dict[Any, Any]):
+        print(f'received an error {message}')
+
+    def backlog(self) -> int:
+        """
+        Matched transactions waiting for the decoder thread.
+        """
+        return self._queue.qsize()
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.batch_interval)]
+        except queue.Empty:
+            return []
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _decode(self, tx: Dict[str, Any]) -> Optional[DecodedCall]:
+        data = tx['input']
+        try:
+            payload = bytes.fromhex(data[10:])
+        except ValueError:
+            return None  # odd-length or non-hex calldata; counted as a decode error
+        for fn in self.functions[data[:10]]:
+            try:
+                values = decode(fn.arg_types, payload)
+            except (DecodingError, ValueError):
+                continue
+
+            value = tx.get('value') or 0
+            return DecodedCall(tx_hash=tx.get('hash'), tx_from=tx.get('from'), tx_to=tx['to'],
+                               value=int(value, 16) if isinstance(value, str) else value,
+                               function=fn.name, args=dict(zip(fn.arg_names, values)))
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            decoded = []
+            for tx in batch:
+                try:
+                    call = self._decode(tx)
+                except (ValueError, TypeError, KeyError):
+                    call = None  # malformed fields elsewhere in the transaction, e.g. a non-hex value
+                if call:
+                    decoded.append(call)
+
+            with self._metrics_lock:
+                self.metrics.decoded += len(decoded)
+                self.metrics.decode_errors += len(batch) - len(decoded)
+
+            if decoded:
+                try:
+                    self.on_decoded(decoded)
+                except Exception as e:
+                    # A failing callback mustn't take the worker down with it; later matches would be dropped unseen
+                    with self._metrics_lock:
+                        self.metrics.callback_errors += 1
+                    print(f'pending tx callback failed: {type(e).__name__}: {e}')
@@ -0,0 +1,81 @@
+from typing import Any, Dict, Union
+
+from eulith_web3.uniswap import EulithUniswapV3Pool
+from eulith_web3.websocket import EulithWebsocketRequestHandler
+
+from utils.async_runtime import AsyncSubscriptionRuntime, StreamHandler, Subscription
+
+"""
+Watch many Uniswap V3 pools at once over the provider's single websocket connection.
+
+Every `add_pool` is one more `uni_prices` subscription on the same connection: the provider routes messages by
+subscription id, so connection and thread counts stay flat however many pools are watched, and the per-pool cost is
+one small routing object. Pools can be added or removed while the runtime is running without reconnecting.
+
+The provider hands messages to its worker pool, so two updates for the same pool can reach the loop out of order.
+Each route remembers the newest block it has forwarded and drops anything older.
+"""
+
+
+class _PoolRoute(EulithWebsocketRequestHandler):
+    def __init__(self, pool: EulithUniswapV3Pool, handler: StreamHandler):
+        self.pool = pool
+        self.handler = handler
+        self.last_block = -1
+        self.messages = 0
+        self.stale = 0
+        self.subscription: Subscription = None
+
+    def handle_result(self, message: Dict[Any, Any]):
+        result = message.get('params', {}).get('result', {})
+        data = result.get('data') if isinstance(result, dict) else None
+        block_number = (data or {}).get('block_number')
+
+        if block_number is not None:
+            if block_number < self.last_block:
+                self.stale += 1
+                return
+            self.last_block = block_number
+
+        self.messages += 1
+        # Returning the handler's result lets the runtime schedule it when it's a coroutine
+        return self.handler.handle_result(message)
+
+    def handle_error(self, message: Dict[Any, Any]):
+        return self.handler.handle_error(message)
+
+
+class PoolSubscriptionManager:
+    def __init__(self, runtime: AsyncSubscriptionRuntime):
+        self.runtime = runtime
+        self.routes: Dict[str, _PoolRoute] = {}
+
+    def add_pool(self, pool: EulithUniswapV3Pool, handler: StreamHandler):
+        key = pool.address.lower()
+        if key in self.routes:
+            raise ValueError(f'already watching pool {pool.address}')
+
+        route = _PoolRoute(pool, handler)
+        route.subscription = self.runtime.subscribe_prices(pool, route)
+        self.routes[key] = route
+
+    async def remove_pool(self, pool: Union[EulithUniswapV3Pool, str]):
+        address = pool if isinstance(pool, str) else pool.address
+        route = self.routes.pop(address.lower(), None)
+        if route:
+            await self.runtime.unsubscribe(route.subscription)
+
+    def handler(self, pool: Union[EulithUniswapV3Pool, str]) -> StreamHandler:
+        address = pool if isinstance(pool, str) else pool.address
+        return self.routes[address.lower()].handler
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {key: {'messages': r.messages, 'stale': r.stale, 'last_block': r.last_block}
+                for key, r in self.routes.items()}
+
+    def __contains__(self, pool: Union[EulithUniswapV3Pool, str]) -> bool:
+        address = pool if isinstance(pool, str) else pool.address
+        return address.lower() in self.routes
+
+    def __len__(self):
+        return len(self.routes)
@@ -0,0 +1,338 @@
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from eth_abi import encode
+from eth_utils import event_signature_to_log_topic, function_signature_to_4byte_selector
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from eulith_web3.gmx.v1.v1 import GMXV1Position, GmxV1Client
+from eulith_web3.websocket import EulithWebsocketRequestHandler, SubscribeRequest, SubscriptionHandle
+
+from utils.balances import BalanceSnapshot, Token, snapshot_balances
+from utils.rpc_batch import batch_request
+
+"""
+One portfolio snapshot per block, covering ERC20 and native balances of a set of holders (wallet, toolkit contract,
+Safe) and their GMX v1 positions, kept current by re-reading only what changed.
+
+The first refresh reads everything: balances through `snapshot_balances`, positions through the Eulith GMX
+endpoint. After that, each new block costs one pipelined batch: the Transfer logs to or from a holder on a tracked
+token, the GMX Vault's position events for the tracked account, the native balances (which emit no events) and a
+check that the last block we saw is still canonical. Only the (token, holder) balances and positions those logs
+touch are fetched again. A reorg, or a gap wider than `max_log_range` blocks, falls back to a full refresh.
+
+Snapshots are immutable and replaced whole, so strategies can read `tracker.snapshot` (or `balance()` /
+`position()`) from any thread, as often as they like, without an RPC or a lock. `start()` refreshes on every
+newHeads notification from a background thread; `refresh()` does it on demand.
+
+GMX positions come from the Eulith server at its latest block rather than pinned to the snapshot's block.
+"""
+
+_TRANSFER = '0x' + event_signature_to_log_topic('Transfer(address,address,uint256)').hex()
+_BALANCE_OF = function_signature_to_4byte_selector('balanceOf(address)')
+
+# GMX v1 Vault events; none of their fields are indexed. Values are the data word holding is_long.
+_GMX_EVENTS = {
+    '0x' + event_signature_to_log_topic(
+        'IncreasePosition(bytes32,address,address,address,uint256,uint256,bool,uint256,uint256)').hex(): 6,
+    '0x' + event_signature_to_log_topic(
+        'DecreasePosition(bytes32,address,address,address,uint256,uint256,bool,uint256,uint256)').hex(): 6,
+    '0x' + event_signature_to_log_topic(
+        'LiquidatePosition(bytes32,address,address,address,bool,uint256,uint256,uint256,int256,uint256)').hex(): 4,
+}
+
+# (collateral token address, index token address, is_long), addresses lowercase
+PositionKey = Tuple[str, str, bool]
+
+
+def position_key(collateral_token: str, index_token: str, is_long: bool) -> PositionKey:
+    return collateral_token.lower(), index_token.lower(), is_long
+
+
+@dataclass(frozen=True)
+class PortfolioSnapshot:
+    block_number: int
+    block_hash: str
+    balances: BalanceSnapshot
+    positions: Dict[PositionKey, Optional[GMXV1Position]]   # None once a tracked position is closed
+    refreshed_at: float
+
+    def balance(self, token: str, holder: str) -> float:
+        return self.balances.get(token, holder)
+
+    def position(self, collateral_token: str, index_token: str, is_long: bool) -> Optional[GMXV1Position]:
+        return self.positions.get(position_key(collateral_token, index_token, is_long))
+
+    def leverage(self, collateral_token: str, index_token: str, is_long: bool) -> float:
+        p = self.position(collateral_token, index_token, is_long)
+        if not p or not p.collateral_size_denom_usd:
+            return 0.0
+        return (p.position_size_denom_usd or 0.0) / p.collateral_size_denom_usd
+
+
+@dataclass
+class PortfolioStats:
+    full_refreshes: int = 0
+    incremental_refreshes: int = 0
+    balances_refetched: int = 0
+    positions_refetched: int = 0
+    errors: int = 0                 # background refreshes that raised
+    last_refresh_seconds: float = 0.0
+
+
+@dataclass
+class _Changes:
+    balances: Set[Tuple[int, int]] = field(default_factory=set)   # (token row, holder column)
+    positions: Set[PositionKey] = field(default_factory=set)
+
+
+class _NewHeadsHandler(EulithWebsocketRequestHandler):
+    def __init__(self, wakeup: threading.Event):
+        self.wakeup = wakeup
+
+    def handle_result(self, message: Dict[Any, Any]):
+        self.wakeup.set()
+
+    def handle_error(self, message: Dict[Any, Any]):
+        pass
+
+
+def _topic(address: str) -> str:
+    return '0x' + '0' * 24 + address[2:].lower()
+
+
+def _word_address(data: bytes, index: int) -> str:
+    return '0x' + data[index * 32 + 12:(index + 1) * 32].hex()
+
+
+class PortfolioTracker:
+    def __init__(self, ew3: EulithWeb3, tokens: Sequence[Token], holders: Sequence[str],
+                 labels: Optional[Sequence[str]] = None, gmx_account: Optional[str] = None,
+                 gmx_positions: Sequence[Tuple[EulithERC20, EulithERC20, bool]] = (), max_log_range: int = 1000,
+                 poll_interval: float = 12.0):
+        """
+        :param tokens: Tokens to track; None for the chain's native currency.
+        :param labels: Names for the tokens, as in `snapshot_balances`.
+        :param gmx_account: Account whose GMX positions are tracked, usually the wallet.
+        :param gmx_positions: (collateral token, index token, is_long) of every position to track.
+        :param max_log_range: Larger gaps between refreshes are read in full instead of from logs.
+        :param poll_interval: How often `start()` refreshes when no newHeads notification arrives.
+        """
+        self.ew3 = ew3
+        self.tokens = list(tokens)
+        self.holders = [ew3.to_checksum_address(h) for h in holders]
+        self.labels = list(labels) if labels is not None else ['ETH' if t is None else t.symbol() for t in tokens]
+        self.gmx_account = ew3.to_checksum_address(gmx_account) if gmx_account else None
+        self.gmx_positions = list(gmx_positions)
+        self.max_log_range = max_log_range
+        self.poll_interval = poll_interval
+        self.stats = PortfolioStats()
+
+        self._snapshot: Optional[PortfolioSnapshot] = None
+        self._token_rows = {t.address.lower(): i for i, t in enumerate(self.tokens) if t is not None}
+        self._native_rows = [i for i, t in enumerate(self.tokens) if t is None]
+        self._holder_columns = {h.lower(): j for j, h in enumerate(self.holders)}
+        self._specs = {position_key(c.address, i.address, l): (c, i, l) for c, i, l in self.gmx_positions}
+        self._gmx = GmxV1Client(ew3) if self.gmx_positions else None
+        self._vault: Optional[str] = None
+
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heads: Optional[SubscriptionHandle] = None
+
+    @property
+    def snapshot(self) -> PortfolioSnapshot:
+        """
+        The latest snapshot, refreshing first if there isn't one yet. Never makes an RPC after that.
+        """
+        snapshot = self._snapshot
+        return snapshot if snapshot is not None else self.refresh()
+
+    def balance(self, token: str, holder: str) -> float:
+        return self.snapshot.balance(token, holder)
+
+    def position(self, collateral_token: str, index_token: str, is_long: bool) -> Optional[GMXV1Position]:
+        return self.snapshot.position(collateral_token, index_token, is_long)
+
+    def start(self) -> 'PortfolioTracker':
+        self.refresh()
+        self._heads = self.ew3.eulith_service.subscribe(SubscribeRequest(args=['newHeads']),
+                                                        _NewHeadsHandler(self._wakeup))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='portfolio', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._heads and self._heads.sub_details.subscription_id:
+            try:
+                self._heads.unsubscribe()
+            except (ValueError, EulithRpcException):
+                pass
+        self._heads = None
+
+    def __enter__(self) -> 'PortfolioTracker':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                # Transient RPC failures, but also a malformed log or position; the last snapshot stays current
+                # until the next block's refresh succeeds
+                self.stats.errors += 1
+                if not isinstance(e, (EulithRpcException, TimeoutError, IOError)):
+                    print(f'portfolio refresh failed: {type(e).__name__}: {e}')
+
+    def refresh(self) -> PortfolioSnapshot:
+        with self._refresh_lock:
+            start = time.monotonic()
+            previous = self._snapshot
+            if previous is None:
+                snapshot = self._full_refresh()
+            else:
+                snapshot = self._incremental_refresh(previous)
+            self.stats.last_refresh_seconds = time.monotonic() - start
+            self._snapshot = snapshot
+            return snapshot
+
+    def _full_refresh(self) -> PortfolioSnapshot:
+        head, = batch_request(self.ew3, [('eth_getBlockByNumber', ['latest', False])])
+        number = int(head['number'], 16)
+        balances = snapshot_balances(self.ew3, self.tokens, self.holders, number, labels=self.labels)
+        positions = self._fetch_positions(list(self._specs))
+        self.stats.full_refreshes += 1
+        return PortfolioSnapshot(number, head['hash'], balances, positions, time.time())
+
+    def _incremental_refresh(self, previous: PortfolioSnapshot) -> PortfolioSnapshot:
+        head, = batch_request(self.ew3, [('eth_getBlockByNumber', ['latest', False])])
+        number = int(head['number'], 16)
+        if number <= previous.block_number:
+            return previous
+        if number - previous.block_number > self.max_log_range:
+            return self._full_refresh()
+
+        from_block, to_block = hex(previous.block_number + 1), hex(number)
+        calls = [('eth_getBlockByNumber', [hex(previous.block_number), False])]
+        calls.extend(self._log_filters(from_block, to_block))
+        native_calls = [('eth_getBalance', [h, to_block]) for h in self.holders] if self._native_rows else []
+        results = batch_request(self.ew3, calls + native_calls)
+
+        seen, *logs = results[:len(calls)]
+        if not seen or seen['hash'] != previous.block_hash:
+            # The block our snapshot was built on was reorged out; its logs can't be trusted any more
+            return self._full_refresh()
+
+        changes = _Changes()
+        for batch in logs:
+            for log in batch:
+                self._apply_log(log, changes)
+
+        raw = [list(row) for row in previous.balances.raw]
+        amounts = previous.balances.amounts.copy()
+
+        native = [int(v, 16) for v in results[len(calls):]]
+        for i in self._native_rows:
+            for j, value in enumerate(native):
+                raw[i][j], amounts[i, j] = value, value / 1e18
+
+        self._refetch_balances(sorted(changes.balances), to_block, raw, amounts)
+
+        positions = previous.positions
+        if changes.positions:
+            positions = {**positions, **self._fetch_positions(sorted(changes.positions))}
+
+        self.stats.incremental_refreshes += 1
+        self.stats.balances_refetched += len(changes.balances)
+        self.stats.positions_refetched += len(changes.positions)
+        balances = replace(previous.balances, block_number=number, raw=raw, amounts=amounts)
+        return PortfolioSnapshot(number, head['hash'], balances, positions, time.time())
+
+    def _log_filters(self, from_block: str, to_block: str) -> List[Tuple[str, list]]:
+        filters = []
+        if self._token_rows:
+            holders = [_topic(h) for h in self.holders]
+            base = {'fromBlock': from_block, 'toBlock': to_block, 'address': list(self._token_rows)}
+            filters.append(('eth_getLogs', [{**base, 'topics': [_TRANSFER, holders]}]))
+            filters.append(('eth_getLogs', [{**base, 'topics': [_TRANSFER, None, holders]}]))
+        if self._specs and self.gmx_account:
+            if self._vault is None:
+                self._vault = self._gmx.get_address('vault')
+            filters.append(('eth_getLogs', [{'fromBlock': from_block, 'toBlock': to_block, 'address': self._vault,
+                                             'topics': [list(_GMX_EVENTS)]}]))
+        return filters
+
+    def _apply_log(self, log: Dict[str, Any], changes: _Changes):
+        topics = log.get('topics') or []
+        if not topics:
+            return
+
+        if topics[0] == _TRANSFER and len(topics) >= 3:
+            row = self._token_rows.get(log['address'].lower())
+            if row is None:
+                return
+            for topic in topics[1:3]:
+                column = self._holder_columns.get('0x' + topic[-40:].lower())
+                if column is not None:
+                    changes.balances.add((row, column))
+            return
+
+        is_long_word = _GMX_EVENTS.get(topics[0])
+        if is_long_word is None:
+            return
+        data = bytes.fromhex(log['data'][2:])
+        if _word_address(data, 1) != self.gmx_account.lower():
+            return
+        key = position_key(_word_address(data, 2), _word_address(data, 3), data[is_long_word * 32 + 31] == 1)
+        if key in self._specs:
+            changes.positions.add(key)
+
+    def _refetch_balances(self, touched: List[Tuple[int, int]], block: str, raw: List[List[int]],
+                          amounts: np.ndarray):
+        if not touched:
+            return
+        calls = []
+        for row, column in touched:
+            data = '0x' + (_BALANCE_OF + encode(['address'], [self.holders[column]])).hex()
+            calls.append(('eth_call', [{'to': self.tokens[row].address, 'data': data}, block]))
+
+        for (row, column), result in zip(touched, batch_request(self.ew3, calls, raise_errors=False)):
+            if isinstance(result, Exception) or not result or result == '0x':
+                raw[row][column], amounts[row, column] = 0, np.nan
+                continue
+            value = int(result, 16)
+            raw[row][column], amounts[row, column] = value, value / 10 ** self.tokens[row].decimals()
+
+    def _fetch_positions(self, keys: List[PositionKey]) -> Dict[PositionKey, Optional[GMXV1Position]]:
+        if not keys or not self.gmx_account:
+            return {}
+        specs = [self._specs[k] for k in keys]
+        positions = self._gmx.get_positions(self.gmx_account, [s[0] for s in specs], [s[1] for s in specs],
+                                            [s[2] for s in specs])
+        # Match on the position's own fields; a key that comes back without a position has been closed
+        found: Dict[PositionKey, Optional[GMXV1Position]] = {k: None for k in keys}
+        for requested, p in zip(keys, positions):
+            if p.collateral_token_address and p.index_token_address and p.is_long is not None:
+                found[position_key(p.collateral_token_address, p.index_token_address, p.is_long)] = p
+            else:
+                found[requested] = p
+        return found
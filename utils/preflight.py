@@ -0,0 +1,203 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from eth_abi import decode
+from eth_abi.exceptions import DecodingError
+from eulith_web3.eulith_web3 import EulithWeb3
+from web3.types import TxParams
+
+from utils.rpc_batch import batch_request
+
+"""
+Simulate transactions before signing them, and size their gas limits from real estimates.
+
+`Preflight.check` sends an eth_call and an eth_estimateGas for every transaction in one pipelined round trip, so a
+committed atomic transaction that would revert is caught (with its decoded revert reason) before any gas is paid.
+Estimates are remembered per target and function selector, so a repeat strategy whose amounts and deadlines change
+every run still skips eth_estimateGas, and the cached estimate is padded by `safety_margin`. Every atomic transaction
+goes to the same toolkit or Safe entry point with the same selector, though, so an entry also remembers the longest
+calldata it was estimated for: a transaction with more calldata than that (a 20-leg bundle after a 2-leg one) is
+estimated afresh instead of being sized from the smaller one. `Preflight(ew3)` uses one cache per chain for the whole
+process, so repeats hit it across Preflight instances and across runs in the warm runner.
+"""
+
+ERROR_SELECTOR = '08c379a0'  # Error(string)
+PANIC_SELECTOR = '4e487b71'  # Panic(uint256)
+
+PANIC_CODES = {
+    0x00: 'generic compiler panic',
+    0x01: 'assertion failed',
+    0x11: 'arithmetic overflow or underflow',
+    0x12: 'division or modulo by zero',
+    0x21: 'invalid enum value',
+    0x22: 'corrupt storage byte array',
+    0x31: 'pop on empty array',
+    0x32: 'array index out of bounds',
+    0x41: 'out of memory',
+    0x51: 'call to uninitialized function',
+}
+
+
+class PreflightFailed(Exception):
+    def __init__(self, result: 'PreflightResult'):
+        super().__init__(f'transaction would revert: {result.revert_reason}')
+        self.result = result
+
+
+def decode_revert(data: Optional[str]) -> str:
+    """
+    Human readable reason from revert return data.
+    """
+    if not data or data == '0x':
+        return 'reverted without a reason'
+
+    payload = data[2:] if data.startswith('0x') else data
+    selector, body = payload[:8], bytes.fromhex(payload[8:])
+    try:
+        if selector == ERROR_SELECTOR:
+            return decode(['string'], body)[0]
+        if selector == PANIC_SELECTOR:
+            code = decode(['uint256'], body)[0]
+            return f'panic 0x{code:02x}: {PANIC_CODES.get(code, "unknown panic code")}'
+    except DecodingError:
+        pass
+    return f'custom error 0x{selector}'
+
+
+@dataclass
+class PreflightResult:
+    ok: bool
+    gas_estimate: Optional[int] = None
+    gas_limit: Optional[int] = None
+    revert_reason: Optional[str] = None
+    return_data: Optional[str] = None
+    estimate_cached: bool = False
+
+
+class GasEstimateCache:
+    _shared: Dict[int, 'GasEstimateCache'] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, safety_margin: float = 1.2):
+        self.safety_margin = safety_margin
+        self._lock = threading.Lock()
+        # (to, selector) -> (largest estimate, longest calldata it covers, in hex characters)
+        self._estimates: Dict[Tuple[str, str], Tuple[int, int]] = {}
+
+    @classmethod
+    def shared(cls, chain_id: int) -> 'GasEstimateCache':
+        with cls._shared_lock:
+            cache = cls._shared.get(chain_id)
+            if cache is None:
+                cache = cls._shared[chain_id] = cls()
+            return cache
+
+    @staticmethod
+    def key(tx: TxParams) -> Tuple[str, str]:
+        call = _call_object(tx)
+        return str(call.get('to', '')).lower(), call['data'][:10].lower()
+
+    def get(self, tx: TxParams) -> Optional[int]:
+        with self._lock:
+            entry = self._estimates.get(self.key(tx))
+        if entry is None or len(_call_object(tx)['data']) > entry[1]:
+            return None
+        return entry[0]
+
+    def record(self, tx: TxParams, estimate: int):
+        # Keep the largest estimate seen, since the same function can take different paths
+        key, length = self.key(tx), len(_call_object(tx)['data'])
+        with self._lock:
+            known, known_length = self._estimates.get(key, (0, 0))
+            self._estimates[key] = max(estimate, known), max(length, known_length)
+
+    def forget(self, tx: Optional[TxParams] = None):
+        with self._lock:
+            if tx is None:
+                self._estimates.clear()
+            else:
+                self._estimates.pop(self.key(tx), None)
+
+    def limit(self, estimate: int) -> int:
+        return int(estimate * self.safety_margin)
+
+
+def _hex(value: Union[int, bytes, str]) -> str:
+    if isinstance(value, int):
+        return hex(value)
+    if isinstance(value, (bytes, bytearray)):
+        return '0x' + bytes(value).hex()
+    return value
+
+
+def _call_object(tx: TxParams) -> Dict[str, Any]:
+    # Only what the node needs to simulate; the nonce and any existing gas limit would skew the estimate
+    call = {k: _hex(tx[k]) for k in ('from', 'to', 'value') if tx.get(k) is not None}
+    call['data'] = _hex(tx.get('data') or tx.get('input') or '0x')
+    return call
+
+
+def _revert_data(error: Exception) -> Optional[str]:
+    rpc_error = getattr(error, 'rpc_error', None) or {}
+    data = rpc_error.get('data') if isinstance(rpc_error, dict) else None
+    # Some nodes nest the data one level deeper
+    if isinstance(data, dict):
+        data = data.get('data')
+    return data if isinstance(data, str) else None
+
+
+class Preflight:
+    def __init__(self, ew3: EulithWeb3, cache: Optional[GasEstimateCache] = None):
+        self.ew3 = ew3
+        self.cache = cache or GasEstimateCache.shared(getattr(ew3, 'chain_id', 0))
+
+    def check(self, txs: List[TxParams], block_identifier: str = 'latest') -> List[PreflightResult]:
+        calls, estimate_index = [], []
+        for tx in txs:
+            call = _call_object(tx)
+            calls.append(('eth_call', [call, block_identifier]))
+            if self.cache.get(tx) is None:
+                estimate_index.append(len(calls))
+                calls.append(('eth_estimateGas', [call, block_identifier]))
+            else:
+                estimate_index.append(None)
+
+        responses = batch_request(self.ew3, calls, raise_errors=False)
+
+        results, i = [], 0
+        for tx, est_at in zip(txs, estimate_index):
+            call_result = responses[i]
+            i += 1 if est_at is None else 2
+
+            if isinstance(call_result, Exception):
+                data = _revert_data(call_result)
+                reason = decode_revert(data) if data else str(call_result)
+                results.append(PreflightResult(ok=False, revert_reason=reason, return_data=data))
+                continue
+
+            if est_at is None:
+                estimate, cached = self.cache.get(tx), True
+            else:
+                estimate_result = responses[est_at]
+                if isinstance(estimate_result, Exception):
+                    # eth_call succeeded but estimation didn't: usually a revert that depends on the gas given
+                    results.append(PreflightResult(ok=False, revert_reason=str(estimate_result),
+                                                   return_data=call_result))
+                    continue
+                estimate, cached = int(estimate_result, 16), False
+                self.cache.record(tx, estimate)
+
+            results.append(PreflightResult(ok=True, gas_estimate=estimate, gas_limit=self.cache.limit(estimate),
+                                           return_data=call_result, estimate_cached=cached))
+        return results
+
+    def prepare(self, tx: TxParams, block_identifier: str = 'latest') -> TxParams:
+        """
+        Simulate `tx` and set its gas limit in place. Raises PreflightFailed instead of letting it revert on chain.
+        """
+        result, = self.check([tx], block_identifier)
+        if not result.ok:
+            raise PreflightFailed(result)
+        tx['gas'] = hex(result.gas_limit)
+        return tx
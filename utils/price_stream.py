@@ -0,0 +1,187 @@
+import math
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+import numpy as np
+from eulith_web3.websocket import EulithWebsocketRequestHandler
+
+"""
+Streaming aggregation for `subscribe_prices` ticks.
+
+Ticks land in fixed-size, array-backed ring buffers, so memory is flat no matter how long the subscription runs.
+Per-block OHLC bars, EWMA, rolling VWAP and rolling volatility are all updated in O(1) per tick. Readers never take a
+lock: the latest stats are published as an immutable snapshot, and ring buffer copies use a sequence counter to detect
+(and retry over) a concurrent write.
+
+Volume is whatever the feed sends with each tick. Ticks without one are stored with NaN volume and left out of the
+VWAP, so a feed that carries no volume at all has a NaN VWAP rather than a plain average labelled as one.
+"""
+
+
+class RingBuffer:
+    def __init__(self, capacity: int, **dtypes):
+        self.capacity = capacity
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in dtypes.items()}
+        self.count = 0   # total rows ever appended
+        self._seq = 0    # odd while a write is in progress
+
+    def append(self, **values):
+        self._seq += 1
+        i = self.count % self.capacity
+        for name, value in values.items():
+            self.columns[name][i] = value
+        self.count += 1
+        self._seq += 1
+
+    def update_last(self, **values):
+        self._seq += 1
+        i = (self.count - 1) % self.capacity
+        for name, value in values.items():
+            self.columns[name][i] = value
+        self._seq += 1
+
+    def latest(self, n: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """
+        Copy of the newest `n` rows (all retained rows by default), oldest first.
+        """
+        while True:
+            seq = self._seq
+            if seq % 2:
+                # Give the writer the GIL back instead of spinning through our whole timeslice
+                time.sleep(0)
+                continue
+
+            count = self.count
+            size = min(count, self.capacity) if n is None else min(n, count, self.capacity)
+            idx = np.arange(count - size, count) % self.capacity
+            rows = {name: column[idx] for name, column in self.columns.items()}
+
+            if self._seq == seq:
+                return rows
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+
+@dataclass(frozen=True)
+class PriceStats:
+    price: float
+    block_number: int
+    ticks: int
+    ewma: float
+    vwap: float         # over the last `vwap_window` ticks that carried volume, NaN if none did
+    volatility: float   # stdev of log returns over the rolling window
+    bar_open: float
+    bar_high: float
+    bar_low: float
+    bar_close: float
+
+
+class PriceAggregator(EulithWebsocketRequestHandler):
+    def __init__(self, capacity: int = 65536, bar_capacity: int = 4096, ewma_alpha: float = 0.05,
+                 volatility_window: int = 256, vwap_window: int = 256, invert: bool = False):
+        """
+        :param invert: Store 1 / price, e.g. to turn the pool's WETH per USDC into USDC per WETH.
+        """
+        self.invert = invert
+        self.ewma_alpha = ewma_alpha
+        self.volatility_window = volatility_window
+        self.vwap_window = vwap_window
+
+        self.ticks = RingBuffer(capacity, price=np.float64, volume=np.float64, block=np.int64, time=np.float64)
+        self.bars = RingBuffer(bar_capacity, block=np.int64, open=np.float64, high=np.float64, low=np.float64,
+                               close=np.float64, volume=np.float64)
+        self._returns = np.zeros(volatility_window)
+        self._pv = np.zeros(vwap_window)
+        self._volumes = np.zeros(vwap_window)
+
+        self._lock = threading.Lock()
+        self._ewma = math.nan
+        self._pv_sum = 0.0
+        self._volume_sum = 0.0
+        self._volume_count = 0
+        self._return_sum = 0.0
+        self._return_sq_sum = 0.0
+        self._return_count = 0
+        self._bar_block = -1
+
+        self.late_ticks = 0
+        self.errors = 0
+        self.stats: Optional[PriceStats] = None
+
+    def handle_result(self, message: Dict[Any, Any]):
+        result = message.get('params', {}).get('result', {})
+        if not isinstance(result, dict):
+            return
+        data = result.get('data')
+        if not data or data.get('price') is None:
+            return
+
+        price = data['price']
+        if self.invert:
+            price = 1 / price
+        volume = data.get('volume')
+        self.on_tick(price, int(data.get('block_number') or 0), math.nan if volume is None else float(volume))
+
+    def handle_error(self, message: Dict[Any, Any]):
+        self.errors += 1
+
+    def on_tick(self, price: float, block_number: int, volume: float = math.nan):
+        # The websocket provider can dispatch messages on several threads at once, so writers take turns.
+        with self._lock:
+            if block_number < self._bar_block:
+                self.late_ticks += 1
+                return
+
+            previous = self.stats.price if self.stats else None
+            self.ticks.append(price=price, volume=volume, block=block_number, time=time.time())
+
+            self._ewma = price if math.isnan(self._ewma) else self.ewma_alpha * price + (1 - self.ewma_alpha) * self._ewma
+            if not math.isnan(volume):
+                i = self._volume_count % self.vwap_window
+                if self._volume_count >= self.vwap_window:
+                    self._pv_sum -= self._pv[i]
+                    self._volume_sum -= self._volumes[i]
+                self._pv[i] = price * volume
+                self._volumes[i] = volume
+                self._pv_sum += price * volume
+                self._volume_sum += volume
+                self._volume_count += 1
+
+            if previous:
+                r = math.log(price / previous)
+                i = self._return_count % self.volatility_window
+                if self._return_count >= self.volatility_window:
+                    evicted = self._returns[i]
+                    self._return_sum -= evicted
+                    self._return_sq_sum -= evicted * evicted
+                self._returns[i] = r
+                self._return_sum += r
+                self._return_sq_sum += r * r
+                self._return_count += 1
+
+            if block_number != self._bar_block:
+                self._bar_block = block_number
+                bar_open = bar_high = bar_low = price
+                bar_volume = volume
+                self.bars.append(block=block_number, open=price, high=price, low=price, close=price, volume=volume)
+            else:
+                bar_open = self.stats.bar_open
+                bar_high = max(self.stats.bar_high, price)
+                bar_low = min(self.stats.bar_low, price)
+                bar_volume = self.bars.columns['volume'][(self.bars.count - 1) % self.bars.capacity]
+                if not math.isnan(volume):
+                    bar_volume = volume if math.isnan(bar_volume) else bar_volume + volume
+                self.bars.update_last(high=bar_high, low=bar_low, close=price, volume=bar_volume)
+
+            n = min(self._return_count, self.volatility_window)
+            variance = (self._return_sq_sum - self._return_sum * self._return_sum / n) / (n - 1) if n > 1 else 0.0
+
+            # Publishing is a single reference assignment, which readers on other threads see atomically
+            self.stats = PriceStats(price=price, block_number=block_number, ticks=self.ticks.count,
+                                    ewma=self._ewma,
+                                    vwap=self._pv_sum / self._volume_sum if self._volume_sum > 0 else math.nan,
+                                    volatility=math.sqrt(max(variance, 0.0)),
+                                    bar_open=bar_open, bar_high=bar_high, bar_low=bar_low, bar_close=price)
@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import Hashable, List, Sequence
+
+import numpy as np
+
+from utils.quotes import QuoteGrid
+
+"""
+A token x venue price matrix backed by a single float64 array.
+
+Missing quotes are NaN, so analytics run in one vectorized pass over the whole matrix and refreshing a single
+(token, venue) cell is an O(1) in-place write. Prices follow `get_swap_quote` (sell token per buy token), so when
+buying the lowest price is the best one.
+
+Outliers are flagged on modified z-scores (Iglewicz and Hoaglin): the distance from the row median in units of the
+median absolute deviation, scaled so it reads like a standard z-score. Both are robust, so a single wild quote can't
+hide itself by inflating the spread it is measured against, and a small venue count still leaves room to flag one.
+When more than half the venues agree exactly the MAD is zero; every venue that disagrees with them is then an outlier,
+with an infinite z-score.
+"""
+
+# Makes the MAD consistent with the standard deviation of normally distributed quotes
+_MAD_SCALE = 0.6745
+
+
+@dataclass
+class QuoteAnalytics:
+    best_price: np.ndarray      # per token, NaN when no venue quoted
+    best_venue: np.ndarray      # per token, index into `venues`, -1 when no venue quoted
+    median: np.ndarray          # per token
+    spread_bps: np.ndarray      # per token, (worst - best) / median in basis points
+    z_scores: np.ndarray        # token x venue modified z-scores, NaN for missing quotes
+    outliers: np.ndarray        # token x venue bool, |z| above the threshold
+
+
+class QuoteMatrix:
+    def __init__(self, tokens: Sequence[Hashable], venues: Sequence[Hashable]):
+        self.tokens = list(tokens)
+        self.venues = list(venues)
+        self._token_index = {t: i for i, t in enumerate(self.tokens)}
+        self._venue_index = {v: i for i, v in enumerate(self.venues)}
+        self.prices = np.full((len(self.tokens), len(self.venues)), np.nan)
+
+    @classmethod
+    def from_grid(cls, grid: QuoteGrid) -> 'QuoteMatrix':
+        matrix = cls(grid.tokens, grid.venues)
+        matrix.fill_from_grid(grid)
+        return matrix
+
+    def fill_from_grid(self, grid: QuoteGrid):
+        self.prices.fill(np.nan)
+        for (token, venue), quote in grid.quotes.items():
+            self.update(token, venue, quote.price)
+
+    def update(self, token: Hashable, venue: Hashable, price: float):
+        self.prices[self._token_index[token], self._venue_index[venue]] = price
+
+    def invalidate(self, token: Hashable, venue: Hashable):
+        self.prices[self._token_index[token], self._venue_index[venue]] = np.nan
+
+    def analyze(self, z_threshold: float = 3.5) -> QuoteAnalytics:
+        prices = self.prices
+        quoted = ~np.isnan(prices)
+        has_quote = quoted.any(axis=1)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # Missing cells are filled so the reductions never see an all-NaN row; those rows are masked back out.
+            lowest = np.where(quoted, prices, np.inf).min(axis=1)
+            highest = np.where(quoted, prices, -np.inf).max(axis=1)
+            best_venue = np.where(has_quote, np.where(quoted, prices, np.inf).argmin(axis=1), -1)
+
+            filled = np.where(has_quote[:, None], prices, 0.0)
+            row_median = np.nanmedian(filled, axis=1)
+            median = np.where(has_quote, row_median, np.nan)
+            mad = np.nanmedian(np.abs(filled - row_median[:, None]), axis=1) / _MAD_SCALE
+
+            best_price = np.where(has_quote, lowest, np.nan)
+            spread_bps = np.where(has_quote, (highest - lowest) / median * 1e4, np.nan)
+
+            # With a zero MAD this is 0 for the venues at the median and +-inf for the rest, so a token quoted by a
+            # single venue (or by venues that all agree) has no outliers
+            z_scores = np.where(prices == median[:, None], 0.0, (prices - median[:, None]) / mad[:, None])
+            z_scores = np.where(quoted, z_scores, np.nan)
+            outliers = np.abs(np.nan_to_num(z_scores)) > z_threshold
+
+        return QuoteAnalytics(best_price=best_price, best_venue=best_venue, median=median,
+                              spread_bps=spread_bps, z_scores=z_scores, outliers=outliers)
+
+    def outlier_venues(self, analytics: QuoteAnalytics, token: Hashable) -> List[Hashable]:
+        row = analytics.outliers[self._token_index[token]]
+        return [self.venues[i] for i in np.flatnonzero(row)]
@@ -0,0 +1,123 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.swap import EulithLiquiditySource, EulithSwapRequest
+
+"""
+Fan a token x venue grid of swap quotes out over a thread pool.
+
+A sweep is bounded by its slowest venue instead of the sum of every round trip. Venues that error out or miss
+their deadline are recorded as failures and never hold up the rest of the grid.
+"""
+
+
+@dataclass
+class Quote:
+    token: str
+    venue: EulithLiquiditySource
+    price: float
+    txs: list
+    latency: float
+
+
+@dataclass
+class QuoteGrid:
+    tokens: List[str]
+    venues: List[EulithLiquiditySource]
+    quotes: Dict[Tuple[str, EulithLiquiditySource], Quote] = field(default_factory=dict)
+    failures: Dict[Tuple[str, EulithLiquiditySource], str] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    def get(self, token: str, venue: EulithLiquiditySource) -> Optional[Quote]:
+        return self.quotes.get((token, venue))
+
+    def for_token(self, token: str) -> List[Quote]:
+        return [q for (t, _), q in self.quotes.items() if t == token]
+
+    def __len__(self):
+        return len(self.quotes)
+
+
+@dataclass
+class _QuoteJob:
+    key: Tuple[str, EulithLiquiditySource]
+    started: Optional[float] = None  # set once a worker picks it up; queued time doesn't count against the quote
+
+
+def _timed_quote(ew3: EulithWeb3, swap: EulithSwapRequest, job: _QuoteJob):
+    job.started = time.monotonic()
+    price, txs = ew3.v0.get_swap_quote(swap)
+    return price, txs, time.monotonic() - job.started
+
+
+def fan_out_quotes(ew3: EulithWeb3, sell_token: EulithERC20, buy_tokens: List[EulithERC20],
+                   venues: List[EulithLiquiditySource], sell_amount: float, slippage_tolerance: float = 0.01,
+                   max_workers: int = 16, quote_timeout: float = 5.0, sweep_timeout: float = 15.0) -> QuoteGrid:
+    """
+    Request every (buy_token, venue) quote concurrently, at most `max_workers` in flight.
+
+    A quote that hasn't answered `quote_timeout` seconds after it was sent is dropped right then, a venue that
+    raises is dropped on its own, and anything still outstanding after `sweep_timeout` seconds is abandoned, so the
+    call always returns within roughly `sweep_timeout`.
+    """
+    grid = QuoteGrid(tokens=[t.symbol() for t in buy_tokens], venues=list(venues))
+    sweep_start = time.monotonic()
+    sweep_deadline = sweep_start + sweep_timeout
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='quote')
+    pending = {}
+    for token, symbol in zip(buy_tokens, grid.tokens):
+        for venue in grid.venues:
+            swap = EulithSwapRequest(
+                sell_token=sell_token,
+                buy_token=token,
+                sell_amount=sell_amount,
+                liquidity_source=venue,
+                slippage_tolerance=slippage_tolerance)
+            job = _QuoteJob((symbol, venue))
+            pending[executor.submit(_timed_quote, ew3, swap, job)] = job
+
+    try:
+        while pending:
+            now = time.monotonic()
+            if now >= sweep_deadline:
+                break
+
+            # Wake up for whichever comes first: a quote finishing, a running quote's deadline, or the sweep's
+            running = [job.started + quote_timeout for job in pending.values() if job.started is not None]
+            timeout = min([sweep_deadline] + running) - now
+            done, _ = wait(pending, timeout=max(0.0, timeout), return_when=FIRST_COMPLETED)
+
+            for future in done:
+                key = pending.pop(future).key
+                try:
+                    price, txs, latency = future.result()
+                except Exception as e:
+                    grid.failures[key] = f'{type(e).__name__}: {e}'
+                    continue
+
+                if latency > quote_timeout:
+                    grid.failures[key] = f'timed out after {latency:.2f}s'
+                    continue
+
+                grid.quotes[key] = Quote(token=key[0], venue=key[1], price=price, txs=txs, latency=latency)
+
+            now = time.monotonic()
+            for future, job in list(pending.items()):
+                if job.started is not None and now - job.started >= quote_timeout:
+                    # Still on the wire; it finishes in the background and the result is dropped
+                    del pending[future]
+                    grid.failures[job.key] = f'timed out after {quote_timeout:.2f}s'
+
+        for job in pending.values():
+            grid.failures[job.key] = 'sweep deadline exceeded'
+    finally:
+        # Don't block on stragglers; any request still on the wire finishes in the background.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    grid.elapsed = time.monotonic() - sweep_start
+    return grid
@@ -0,0 +1,231 @@
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from eulith_web3.websocket import EulithWebsocketRequestHandler, SubscribeRequest, SubscriptionHandle
+from hexbytes import HexBytes
+from web3._utils.method_formatters import receipt_formatter
+from web3.datastructures import AttributeDict
+from web3.exceptions import TimeExhausted
+from web3.types import TxReceipt
+
+from utils.rpc_batch import batch_request
+
+"""
+Track many in-flight transactions with one batched receipt lookup per block.
+
+`wait_for_transaction_receipt` polls a single hash and blocks its caller. The watcher instead keeps every
+outstanding hash in one place and, whenever a new block arrives (via a `newHeads` subscription, with polling as a
+fallback), fetches all of their receipts in a single pipelined batch. Each hash resolves a Future, so callers can
+block, poll or attach callbacks.
+
+With `confirmations=N` a receipt only resolves once N more blocks sit on top of it. Receipts are re-fetched every
+block until then, so a transaction that gets reorged out (its receipt disappears or moves to another block) simply
+goes back to waiting.
+"""
+
+
+@dataclass
+class _Watch:
+    tx_hash: str
+    future: Future
+    deadline: float
+    seen_in: Optional[str] = None  # block hash the receipt was last seen in
+
+
+@dataclass
+class WatcherStats:
+    batches: int = 0
+    resolved: int = 0
+    timed_out: int = 0
+    reorgs: int = 0
+    errors: int = 0
+    last_block: int = -1
+    last_batch_size: int = 0
+    last_batch_seconds: float = 0.0
+
+
+class _NewHeadsHandler(EulithWebsocketRequestHandler):
+    def __init__(self, wakeup: threading.Event):
+        self.wakeup = wakeup
+
+    def handle_result(self, message: Dict[Any, Any]):
+        self.wakeup.set()
+
+    def handle_error(self, message: Dict[Any, Any]):
+        pass
+
+
+class ReceiptWatcher:
+    def __init__(self, ew3: EulithWeb3, confirmations: int = 0, timeout: float = 120.0, poll_interval: float = 2.0,
+                 subscribe_new_heads: bool = True):
+        """
+        :param confirmations: Extra blocks required on top of the receipt's block before it resolves.
+        :param timeout: Default seconds before a watched hash fails with TimeExhausted.
+        :param poll_interval: How often to check the head when no newHeads notification arrives.
+        """
+        self.ew3 = ew3
+        self.confirmations = confirmations
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.subscribe_new_heads = subscribe_new_heads
+        self.stats = WatcherStats()
+
+        self._watches: Dict[str, _Watch] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._heads: Optional[SubscriptionHandle] = None
+
+    def start(self) -> 'ReceiptWatcher':
+        if self.subscribe_new_heads:
+            self._heads = self.ew3.eulith_service.subscribe(SubscribeRequest(args=['newHeads']),
+                                                            _NewHeadsHandler(self._wakeup))
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='receipt-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._heads and self._heads.sub_details.subscription_id:
+            try:
+                self._heads.unsubscribe()
+            except (ValueError, EulithRpcException):
+                pass
+        self._heads = None
+
+    def __enter__(self) -> 'ReceiptWatcher':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def watch(self, tx_hash: Union[HexBytes, str], callback: Optional[Callable[[Future], None]] = None,
+              timeout: Optional[float] = None) -> Future:
+        """
+        Start tracking `tx_hash`. The returned Future resolves to the receipt, or fails with TimeExhausted.
+        `callback` is attached with `add_done_callback` and runs on the watcher thread.
+        """
+        key = HexBytes(tx_hash).hex().lower()
+        if not key.startswith('0x'):
+            key = '0x' + key
+
+        with self._lock:
+            watch = self._watches.get(key)
+            if watch is None:
+                deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+                watch = _Watch(key, Future(), deadline)
+                self._watches[key] = watch
+
+        if callback:
+            watch.future.add_done_callback(callback)
+        # A hash that is already mined shouldn't have to wait for the next block
+        self._wakeup.set()
+        return watch.future
+
+    def wait(self, tx_hash: Union[HexBytes, str], timeout: Optional[float] = None) -> TxReceipt:
+        return self._result(self.watch(tx_hash, timeout=timeout), tx_hash, timeout)
+
+    def wait_all(self, tx_hashes: List[Union[HexBytes, str]], timeout: Optional[float] = None) -> List[TxReceipt]:
+        futures = [self.watch(h, timeout=timeout) for h in tx_hashes]
+        return [self._result(f, h, timeout) for f, h in zip(futures, tx_hashes)]
+
+    def _result(self, future: Future, tx_hash: Union[HexBytes, str], timeout: Optional[float]) -> TxReceipt:
+        # The watcher fails the future at its deadline; the extra poll interval only matters if the thread is stuck
+        limit = (self.timeout if timeout is None else timeout) + self.poll_interval
+        try:
+            return future.result(limit)
+        except FutureTimeoutError:
+            raise TimeExhausted(f'Transaction {HexBytes(tx_hash).hex()} got no receipt within {limit:.0f}s') from None
+
+    def pending(self) -> int:
+        return len(self._watches)
+
+    def _run(self):
+        try:
+            while not self._stop.is_set():
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                if self._stop.is_set():
+                    return
+
+                with self._lock:
+                    watches = list(self._watches.values())
+                if not watches:
+                    continue
+
+                try:
+                    self._poll(watches)
+                except Exception:
+                    # Transient RPC failures, but also a terminated provider or a malformed receipt: keep going, and
+                    # keep enforcing deadlines while every poll fails
+                    self.stats.errors += 1
+                    self._expire(watches)
+        finally:
+            # Nothing resolves these any more; fail them rather than leave callers blocked
+            with self._lock:
+                watches = list(self._watches.values())
+            for watch in watches:
+                self._finish(watch, error=RuntimeError(f'receipt watcher stopped before {watch.tx_hash} resolved'))
+
+    def _poll(self, watches: List[_Watch]):
+        start = time.monotonic()
+        calls = [('eth_blockNumber', [])] + [('eth_getTransactionReceipt', [w.tx_hash]) for w in watches]
+        head, *receipts = batch_request(self.ew3, calls, raise_errors=False)
+        if isinstance(head, Exception):
+            raise head
+        head = int(head, 16)
+
+        self.stats.batches += 1
+        self.stats.last_block = head
+        self.stats.last_batch_size = len(watches)
+        self.stats.last_batch_seconds = time.monotonic() - start
+
+        now = time.monotonic()
+        for watch, raw in zip(watches, receipts):
+            if isinstance(raw, Exception):
+                raw = None
+
+            block_hash = raw.get('blockHash') if raw else None
+            if watch.seen_in and block_hash != watch.seen_in:
+                self.stats.reorgs += 1
+            watch.seen_in = block_hash
+
+            if raw and head - int(raw['blockNumber'], 16) >= self.confirmations:
+                try:
+                    receipt = AttributeDict.recursive(receipt_formatter(raw))
+                except Exception as e:
+                    # A receipt that can't be parsed fails its own future, not the rest of the batch
+                    self._finish(watch, error=e)
+                    continue
+                self._finish(watch, result=receipt)
+        self._expire(watches, now)
+
+    def _expire(self, watches: List[_Watch], now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        for watch in watches:
+            if now >= watch.deadline and not watch.future.done():
+                self._finish(watch, error=TimeExhausted(
+                    f'Transaction {watch.tx_hash} is not in the chain with {self.confirmations} confirmations'))
+
+    def _finish(self, watch: _Watch, result: Any = None, error: Optional[Exception] = None):
+        with self._lock:
+            self._watches.pop(watch.tx_hash, None)
+
+        if error:
+            if isinstance(error, TimeExhausted):
+                self.stats.timed_out += 1
+            watch.future.set_exception(error)
+        else:
+            self.stats.resolved += 1
+            watch.future.set_result(result)
@@ -0,0 +1,58 @@
+import time
+from typing import Any, List, Sequence, Tuple
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.exceptions import EulithRpcException
+from eulith_web3.websocket import EulithSyncResponse
+from web3.types import RPCEndpoint
+
+"""
+Pipeline many raw JSON-RPC calls over the Eulith websocket in one go.
+
+`make_request` sends one call and blocks on its response, so N calls cost N round trips. Here every request is
+queued on the provider's socket up front and the responses are collected as they arrive, so N calls cost roughly one
+round trip. The provider speaks single JSON-RPC messages rather than JSON-RPC array batches, which is why this
+pipelines instead of batching.
+
+Calls go straight to the provider, bypassing web3's middlewares and result formatters: params must already be in
+wire format (hex strings) and results come back raw.
+"""
+
+
+def batch_request(ew3: EulithWeb3, calls: Sequence[Tuple[str, list]], timeout: float = 30.0,
+                  raise_errors: bool = True) -> List[Any]:
+    """
+    Send every (method, params) in `calls` and return their results in the same order.
+
+    With `raise_errors=False` a call that failed yields its EulithRpcException in place of a result instead of
+    raising. Raises TimeoutError if any response takes longer than `timeout` seconds.
+    """
+    provider = ew3.eulith_service.eulith_provider
+    pending = []
+    for method, params in calls:
+        payload = provider.get_request_payload(RPCEndpoint(method), params)
+        response = EulithSyncResponse()
+        provider.send_queue.put((payload, response))
+        pending.append((payload['id'], response))
+
+    deadline = time.monotonic() + timeout
+    results = []
+    for request_id, response in pending:
+        if not response.event.wait(max(0.0, deadline - time.monotonic())):
+            # Nobody will read these any more, so don't leave them registered on the provider
+            for rid, _ in pending:
+                provider.awaiting_one_time_response.pop(rid)
+            raise TimeoutError(f'batch of {len(calls)} requests timed out after {timeout}s')
+
+        message = response.get_value()
+        if 'error' in message:
+            error = EulithRpcException('RPC Error: ' + str(message['error']))
+            # Keep the structured error too, e.g. for the revert data an eth_call error carries
+            error.rpc_error = message['error']
+            if raise_errors:
+                raise error
+            results.append(error)
+        else:
+            results.append(message.get('result'))
+
+    return results
@@ -0,0 +1,129 @@
+import json
+import os
+import threading
+import urllib.parse
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+from eulith_web3.erc20 import EulithERC20, EulithWETH, TokenSymbol
+from eulith_web3.eulith_web3 import EulithWeb3
+
+"""
+Opt-in, on-disk cache for lookups that never change for a given chain and account: ERC20 token addresses and
+decimals, toolkit contract addresses and armor/safe addresses.
+
+Set EULITH_RPC_CACHE=1 to turn it on (EULITH_RPC_CACHE_PATH overrides the file location). After the first run, a
+script that only needs these addresses makes no RPCs for them. Call invalidate() or delete the file if something
+gets redeployed.
+"""
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'eulith-examples', 'rpc_cache.json')
+
+
+def chain_key(ew3: EulithWeb3) -> str:
+    # eth-main.eulithrpc.com -> eth-main
+    host = urllib.parse.urlparse(str(ew3.eulith_service.eulith_url)).hostname or ''
+    return host.split('.')[0] or str(ew3.chain_id)
+
+
+class RpcCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, enabled: bool = True):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        if enabled:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> 'RpcCache':
+        enabled = os.environ.get('EULITH_RPC_CACHE', '').lower() in ('1', 'true', 'yes')
+        return cls(os.environ.get('EULITH_RPC_CACHE_PATH', DEFAULT_CACHE_PATH), enabled)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                self._data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self._data = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self._data, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def get(self, ew3: EulithWeb3, section: str, key: str) -> Any:
+        return self._data.get(chain_key(ew3), {}).get(section, {}).get(key)
+
+    def put(self, ew3: EulithWeb3, section: str, key: str, value: Any):
+        with self._lock:
+            self._data.setdefault(chain_key(ew3), {}).setdefault(section, {})[key] = value
+            if self.enabled:
+                self._save()
+
+    def get_erc_token(self, ew3: EulithWeb3, symbol: TokenSymbol) -> Union[EulithERC20, EulithWETH]:
+        if not self.enabled:
+            return ew3.v0.get_erc_token(symbol)
+
+        entry = self.get(ew3, 'tokens', symbol.value)
+        if entry is None:
+            address, decimals = ew3.eulith_service.lookup_token_symbol(symbol)
+            entry = {'address': ew3.to_checksum_address(address), 'decimals': decimals}
+            self.put(ew3, 'tokens', symbol.value, entry)
+
+        if symbol == TokenSymbol.WETH:
+            return EulithWETH(ew3, entry['address'])
+        return EulithERC20(ew3, entry['address'], entry['decimals'], symbol.value)
+
+    def ensure_toolkit_contract(self, ew3: EulithWeb3, account: str) -> str:
+        if not self.enabled:
+            return ew3.v0.ensure_toolkit_contract(account)
+
+        address = self.get(ew3, 'toolkit', account.lower())
+        if address is None:
+            address = ew3.v0.ensure_toolkit_contract(account)
+            self.put(ew3, 'toolkit', account.lower(), address)
+        return address
+
+    def get_armor_and_safe_addresses(self, ew3: EulithWeb3, account: str) -> Tuple[str, str]:
+        if not self.enabled:
+            return ew3.v0.get_armor_and_safe_addresses(account)
+
+        addresses = self.get(ew3, 'armor', account.lower())
+        if addresses is None:
+            armor, safe = ew3.v0.get_armor_and_safe_addresses(account)
+            # Not deployed yet is not a final answer, so only cache once the armor exists.
+            if not armor:
+                return armor, safe
+            addresses = [armor, safe]
+            self.put(ew3, 'armor', account.lower(), addresses)
+        return addresses[0], addresses[1]
+
+    def warm(self, ew3: EulithWeb3, symbols: Iterable[TokenSymbol] = (), account: Optional[str] = None):
+        """
+        Resolve everything a job will need up front, so later lookups are served from disk.
+        """
+        for symbol in symbols:
+            self.get_erc_token(ew3, symbol)
+        if account:
+            self.ensure_toolkit_contract(ew3, account)
+
+    def invalidate(self, ew3: Optional[EulithWeb3] = None, section: Optional[str] = None, key: Optional[str] = None):
+        """
+        Drop cached entries. With no arguments the whole cache is cleared; otherwise only the given chain,
+        section (e.g. 'tokens', 'toolkit' or 'armor') and key are removed.
+        """
+        with self._lock:
+            if ew3 is None:
+                self._data = {}
+            else:
+                chain = self._data.get(chain_key(ew3), {})
+                if section is None:
+                    chain.clear()
+                elif key is None:
+                    chain.pop(section, None)
+                else:
+                    chain.get(section, {}).pop(key, None)
+            if self.enabled:
+                self._save()
@@ -0,0 +1,280 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from eulith_web3.eulith_web3 import EulithWeb3
+from web3.types import RPCEndpoint, RPCResponse
+
+from utils.rpc_cache import chain_key
+
+"""
+Per-method RPC metrics: latency histograms, request/response sizes, errors and in-flight calls, per endpoint
+(eth-main, arb-main, poly-main, ...).
+
+`install(ew3)` wraps the websocket provider's make_request, below every middleware, so it sees web3's eth_* calls
+and also the eulith_* calls that EulithService sends to the provider directly; a middleware_onion middleware would
+miss those. `middleware` is there for plain Web3 instances. Pipelined `batch_request` calls and subscription
+messages bypass make_request and aren't counted.
+
+The hot path is two perf_counter reads, a lock and a bisect. Sizes need the JSON encoded again, so only every
+`size_sample_every`-th call per method is sized.
+
+Read the numbers with `snapshot()` in-process, `openmetrics()` as Prometheus/OpenMetrics text, or `serve(port)`
+for a scrape endpoint. Set EULITH_RPC_METRICS=1 to have the examples print a summary on exit (and
+EULITH_RPC_METRICS_PORT to serve /metrics while they run).
+"""
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class Histogram:
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last one is +Inf
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th quantile; the largest value seen if it falls in +Inf.
+        """
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.bounds, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def copy(self) -> 'Histogram':
+        h = Histogram(self.bounds)
+        h.counts, h.total, h.count, h.max = list(self.counts), self.total, self.count, self.max
+        return h
+
+
+@dataclass
+class MethodStats:
+    latency: Histogram = field(default_factory=lambda: Histogram(LATENCY_BUCKETS))
+    request_bytes: Histogram = field(default_factory=lambda: Histogram(SIZE_BUCKETS))
+    response_bytes: Histogram = field(default_factory=lambda: Histogram(SIZE_BUCKETS))
+    errors: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def calls(self) -> int:
+        return self.latency.count
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+    def copy(self) -> 'MethodStats':
+        return MethodStats(self.latency.copy(), self.request_bytes.copy(), self.response_bytes.copy(),
+                           dict(self.errors))
+
+
+@dataclass
+class MetricsSnapshot:
+    methods: Dict[Tuple[str, str], MethodStats]  # (endpoint, method) -> stats
+    in_flight: Dict[str, int]
+    max_in_flight: Dict[str, int]
+
+    def __str__(self):
+        lines = [f'{"endpoint":<12}{"method":<40}{"calls":>7}{"errors":>7}{"p50 ms":>9}{"p99 ms":>9}{"max ms":>9}']
+        for (endpoint, method), s in sorted(self.methods.items(), key=lambda kv: -kv[1].latency.total):
+            lines.append(f'{endpoint:<12}{method:<40}{s.calls:>7}{s.error_count:>7}'
+                         f'{s.latency.quantile(0.5) * 1000:>9.1f}{s.latency.quantile(0.99) * 1000:>9.1f}'
+                         f'{s.latency.max * 1000:>9.1f}')
+        return '\n'.join(lines)
+
+
+def _error_label(response: Any) -> Optional[str]:
+    if not isinstance(response, dict) or 'error' not in response:
+        return None
+    error = response['error']
+    code = error.get('code') if isinstance(error, dict) else None
+    # raise_if_error turns every one of these into an EulithRpcException; the code says which kind
+    return f'EulithRpcException:{code}' if code is not None else 'EulithRpcException'
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+class RpcMetrics:
+    def __init__(self, size_sample_every: int = 10, enabled: bool = True):
+        self.size_sample_every = size_sample_every
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._methods: Dict[Tuple[str, str], MethodStats] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._max_in_flight: Dict[str, int] = {}
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @classmethod
+    def from_env(cls) -> 'RpcMetrics':
+        enabled = os.environ.get('EULITH_RPC_METRICS', '').lower() in ('1', 'true', 'yes')
+        metrics = cls(enabled=enabled)
+        port = os.environ.get('EULITH_RPC_METRICS_PORT')
+        if enabled and port:
+            metrics.serve(int(port))
+        return metrics
+
+    def install(self, ew3: EulithWeb3) -> 'RpcMetrics':
+        if not self.enabled:
+            return self
+        provider = ew3.eulith_service.eulith_provider
+        provider.make_request = self._wrap(provider.make_request, chain_key(ew3))
+        # web3 caches the middleware chain with the old make_request bound into it
+        provider._request_func_cache = (None, None)
+        return self
+
+    def middleware(self, endpoint: str) -> Callable:
+        """
+        A web3 middleware recording under `endpoint`, e.g. `w3.middleware_onion.add(metrics.middleware('eth-main'))`.
+        """
+        def build(make_request, w3):
+            return self._wrap(make_request, endpoint)
+
+        return build
+
+    def _wrap(self, make_request: Callable[[RPCEndpoint, Any], RPCResponse], endpoint: str) -> Callable:
+        def instrumented(method: RPCEndpoint, params: Any) -> RPCResponse:
+            key = (endpoint, method)
+            with self._lock:
+                stats = self._methods.get(key)
+                if stats is None:
+                    stats = self._methods[key] = MethodStats()
+                in_flight = self._in_flight[endpoint] = self._in_flight.get(endpoint, 0) + 1
+                if in_flight > self._max_in_flight.get(endpoint, 0):
+                    self._max_in_flight[endpoint] = in_flight
+                sample_size = stats.calls % self.size_sample_every == 0
+
+            response, error = None, None
+            start = time.perf_counter()
+            try:
+                response = make_request(method, params)
+                error = _error_label(response)
+                return response
+            except Exception as e:
+                error = type(e).__name__
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                request_size = response_size = None
+                if sample_size:
+                    request_size = len(json.dumps(params, default=str))
+                    if response is not None:
+                        response_size = len(json.dumps(response, default=str))
+
+                with self._lock:
+                    self._in_flight[endpoint] -= 1
+                    stats.latency.observe(elapsed)
+                    if error:
+                        stats.errors[error] = stats.errors.get(error, 0) + 1
+                    if request_size is not None:
+                        stats.request_bytes.observe(request_size)
+                    if response_size is not None:
+                        stats.response_bytes.observe(response_size)
+
+        return instrumented
+
+    def snapshot(self) -> MetricsSnapshot:
+        with self._lock:
+            return MetricsSnapshot({k: s.copy() for k, s in self._methods.items()}, dict(self._in_flight),
+                                   dict(self._max_in_flight))
+
+    def reset(self):
+        with self._lock:
+            self._methods.clear()
+            self._max_in_flight = dict(self._in_flight)
+
+    def openmetrics(self) -> str:
+        snap = self.snapshot()
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, unit: str, pick: Callable[[MethodStats], Histogram]):
+            lines.append(f'# TYPE {name} histogram')
+            lines.append(f'# UNIT {name} {unit}')
+            lines.append(f'# HELP {name} {help_text}')
+            for (endpoint, method), stats in snap.methods.items():
+                h = pick(stats)
+                labels = f'endpoint="{_label(endpoint)}",method="{_label(method)}"'
+                cumulative = 0
+                for bound, n in zip(h.bounds + (float('inf'),), h.counts):
+                    cumulative += n
+                    le = '+Inf' if bound == float('inf') else repr(float(bound))
+                    lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{labels}}} {h.total}')
+                lines.append(f'{name}_count{{{labels}}} {h.count}')
+
+        histogram('eulith_rpc_request_duration_seconds', 'RPC round trip time.', 'seconds',
+                  lambda s: s.latency)
+        histogram('eulith_rpc_request_size_bytes', 'JSON-encoded params size, sampled.', 'bytes',
+                  lambda s: s.request_bytes)
+        histogram('eulith_rpc_response_size_bytes', 'JSON-encoded response size, sampled.', 'bytes',
+                  lambda s: s.response_bytes)
+
+        lines.append('# TYPE eulith_rpc_errors counter')
+        lines.append('# HELP eulith_rpc_errors RPC calls that raised or returned an error, by type.')
+        for (endpoint, method), stats in snap.methods.items():
+            for error, n in stats.errors.items():
+                lines.append(f'eulith_rpc_errors_total{{endpoint="{_label(endpoint)}",method="{_label(method)}",'
+                             f'error="{_label(error)}"}} {n}')
+
+        for name, values, help_text in (('eulith_rpc_in_flight', snap.in_flight, 'RPC calls awaiting a response.'),
+                                        ('eulith_rpc_max_in_flight', snap.max_in_flight,
+                                         'Most RPC calls awaiting a response at once.')):
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'# HELP {name} {help_text}')
+            for endpoint, n in values.items():
+                lines.append(f'{name}{{endpoint="{_label(endpoint)}"}} {n}')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        Serve `openmetrics()` at http://host:port/metrics from a daemon thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.openmetrics().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, name='rpc-metrics', daemon=True).start()
+        return self._server
+
+    def report(self):
+        """
+        Print the summary table if metrics are enabled.
+        """
+        if self.enabled:
+            print(f'\nRPC metrics:\n{self.snapshot()}')
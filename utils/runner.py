@@ -0,0 +1,274 @@
+import json
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+"""
+A resident runner that keeps the expensive parts of an example warm between runs.
+
+`python utils/runner.py serve` imports web3 and eulith_web3 once (about 1.7s on its own) and then runs scripts sent
+to it over a Unix socket, in-process with runpy. `EulithWeb3(...)` inside a script returns a pooled session, one
+per endpoint, token and signer, whose websocket stays open after the script's `with` block ends; `LocalSigner`
+is cached per key, and KMS signers come from `KmsSignerFactory.shared()`. Rarely used modules (boto3, the Ledger
+and KMS signers, ...) are not preloaded; they're imported the first time a script needs them and stay imported.
+
+`python utils/runner.py run examples/x.py [args]` is the client `run.sh` uses. It only imports the standard
+library, streams the script's output back and exits with its exit code; with no daemon listening it runs the
+script directly instead.
+
+Scripts run one at a time in the daemon's main thread, each for at most EULITH_RUNNER_TIMEOUT seconds (300 by
+default, 0 for no limit), so a hung script can't hold up the runs queued behind it; a script that times out exits
+124 and its sessions are dropped. They get no stdin, so interactive scripts (and streaming ones, which run until
+Ctrl-C) are better run directly. EULITH_* environment variables are passed through per run.
+"""
+
+DEFAULT_SOCKET_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'eulith-examples', 'runner.sock')
+SOCKET_PATH = os.environ.get('EULITH_RUNNER_SOCKET', DEFAULT_SOCKET_PATH)
+RUN_TIMEOUT = float(os.environ.get('EULITH_RUNNER_TIMEOUT', '300'))
+
+PRELOAD = [
+    'numpy',
+    'web3',
+    'eulith_web3.eulith_web3',
+    'eulith_web3.erc20',
+    'eulith_web3.signing',
+    'eulith_web3.swap',
+    'eulith_web3.uniswap',
+    'utils.banner',
+    'utils.rpc_cache',
+    'utils.nonce_manager',
+    'utils.receipt_watcher',
+    'utils.gas',
+]
+
+
+class _SocketStream:
+    """
+    File-like object that forwards writes to the client as JSON lines, tagged with the stream name.
+    """
+
+    def __init__(self, conn: socket.socket, name: str):
+        self.conn = conn
+        self.name = name
+        self.connected = True
+
+    def write(self, text: str) -> int:
+        if text and self.connected:
+            try:
+                self.conn.sendall(json.dumps({self.name: text}).encode() + b'\n')
+            except OSError:
+                # Client went away; let the script finish rather than fail it
+                self.connected = False
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+class _RunTimedOut(BaseException):
+    # BaseException so a script's own `except Exception` doesn't swallow it
+    pass
+
+
+def _raise_timed_out(signum, frame):
+    raise _RunTimedOut()
+
+
+class Runner:
+    def __init__(self, socket_path: str = SOCKET_PATH, run_timeout: float = RUN_TIMEOUT):
+        self.socket_path = socket_path
+        self.run_timeout = run_timeout
+        self.sessions: Dict[Any, Any] = {}
+        self.signers: Dict[str, Any] = {}
+        self.runs = 0
+
+    def preload(self):
+        import importlib
+
+        sys.path.insert(0, os.getcwd())
+        for module in PRELOAD:
+            importlib.import_module(module)
+        self._install_pools()
+
+    def _install_pools(self):
+        import eulith_web3.eulith_web3 as eulith_module
+        import eulith_web3.signing as signing_module
+
+        runner = self
+        real_eulith_web3 = eulith_module.EulithWeb3
+        real_local_signer = signing_module.LocalSigner
+
+        class PooledEulithWeb3(real_eulith_web3):
+            def __exit__(self, exc_type, exc_val, exc_tb):
+                # Stays connected for the next run; Runner.close() terminates it
+                pass
+
+        def eulith_web3(eulith_url, eulith_token, signing_middle_ware=None, private=False, **kwargs):
+            address = signing_middle_ware.address if signing_middle_ware else None
+            # repr keeps the key hashable whatever the values are
+            key = (str(eulith_url), eulith_token, address, private,
+                   tuple(sorted((name, repr(value)) for name, value in kwargs.items())))
+            session = runner.sessions.get(key)
+            if session is None or session.eulith_service.eulith_provider.shutdown_event.is_set():
+                session = runner.sessions[key] = PooledEulithWeb3(eulith_url, eulith_token, signing_middle_ware,
+                                                                  private, **kwargs)
+            return session
+
+        def local_signer(private_key, *args, **kwargs):
+            if args or kwargs:
+                return real_local_signer(private_key, *args, **kwargs)
+            signer = runner.signers.get(private_key)
+            if signer is None:
+                signer = runner.signers[private_key] = real_local_signer(private_key)
+            return signer
+
+        # Scripts import these names afresh on every run, so patching the modules is enough
+        eulith_module.EulithWeb3 = eulith_web3
+        signing_module.LocalSigner = local_signer
+
+    def _reset_sessions(self, before: Dict[Any, Any]):
+        for key, session in list(self.sessions.items()):
+            provider = session.eulith_service.eulith_provider
+            # Undo what a script may have left behind: an open atomic transaction, an instrumented make_request
+            session.eulith_service.atomic_params = None
+            if 'make_request' in provider.__dict__:
+                del provider.make_request
+                provider._request_func_cache = (None, None)
+            # A script that changed the middleware stack gets a fresh session next time
+            if key in before and tuple(session.middleware_onion.middlewares) != before[key]:
+                session.terminate()
+                del self.sessions[key]
+
+    def run_script(self, request: Dict[str, Any], conn: socket.socket) -> int:
+        import runpy
+
+        stdout, stderr = _SocketStream(conn, 'out'), _SocketStream(conn, 'err')
+        saved_streams = sys.stdout, sys.stderr, sys.stdin
+        saved_argv, saved_path = sys.argv, list(sys.path)
+        saved_env = {k: v for k, v in os.environ.items() if k.startswith('EULITH_')}
+        middlewares = {k: tuple(s.middleware_onion.middlewares) for k, s in self.sessions.items()}
+
+        for k in saved_env:
+            del os.environ[k]
+        os.environ.update(request.get('env', {}))
+        sys.argv = [request['script']] + request.get('argv', [])
+        sys.stdout, sys.stderr, sys.stdin = stdout, stderr, open(os.devnull)
+        code, timed_out = 0, False
+        previous_alarm = signal.signal(signal.SIGALRM, _raise_timed_out)
+        if self.run_timeout > 0:
+            signal.setitimer(signal.ITIMER_REAL, self.run_timeout)
+        try:
+            runpy.run_path(request['script'], run_name='__main__')
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if e.code is not None and not isinstance(e.code, int):
+                print(e.code, file=sys.stderr)
+        except KeyboardInterrupt:
+            # Meant for the daemon (SIGINT/SIGTERM), not the script
+            raise
+        except _RunTimedOut:
+            print(f'{request["script"]} timed out after {self.run_timeout:.0f}s', file=sys.stderr)
+            code, timed_out = 124, True
+        except BaseException:
+            import traceback
+            traceback.print_exc()
+            code = 1
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_alarm)
+            sys.stdin.close()
+            sys.stdout, sys.stderr, sys.stdin = saved_streams
+            sys.argv, sys.path[:] = saved_argv, saved_path
+            for k in [k for k in os.environ if k.startswith('EULITH_')]:
+                del os.environ[k]
+            os.environ.update(saved_env)
+            self._reset_sessions(middlewares)
+            if timed_out:
+                # Whatever the script left running may still be using them
+                self.close()
+        return code
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        start = time.perf_counter()
+        self.preload()
+        print(f'Preloaded in {time.perf_counter() - start:.2f}s')
+
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        server.listen(16)
+        print(f'Listening on {self.socket_path}', flush=True)
+
+        try:
+            while True:
+                conn, _ = server.accept()
+                with conn:
+                    request = json.loads(conn.makefile('rb').readline())
+                    started = time.perf_counter()
+                    code = self.run_script(request, conn)
+                    self.runs += 1
+                    print(f'{request["script"]} exited {code} in {time.perf_counter() - started:.2f}s '
+                          f'({len(self.sessions)} warm sessions)', flush=True)
+                    try:
+                        conn.sendall(json.dumps({'exit': code}).encode() + b'\n')
+                    except OSError:
+                        pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+            self.close()
+
+    def close(self):
+        for session in self.sessions.values():
+            session.terminate()
+        self.sessions.clear()
+
+
+def run(script: str, argv: List[str], socket_path: str = SOCKET_PATH) -> int:
+    """
+    Run `script` on the daemon, streaming its output here. Falls back to running it directly.
+    """
+    conn: Optional[socket.socket] = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(socket_path)
+    except (FileNotFoundError, ConnectionRefusedError):
+        conn.close()
+        os.execv(sys.executable, [sys.executable, script] + argv)
+
+    env = {k: v for k, v in os.environ.items() if k.startswith('EULITH_')}
+    with conn:
+        conn.sendall(json.dumps({'script': script, 'argv': argv, 'env': env}).encode() + b'\n')
+        for line in conn.makefile('rb'):
+            message = json.loads(line)
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'exit' in message:
+                return message['exit']
+    print('runner closed the connection without an exit code', file=sys.stderr)
+    return 1
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 2 and sys.argv[1] == 'serve':
+        Runner().serve()
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'run':
+        sys.exit(run(sys.argv[2], sys.argv[3:]))
+    else:
+        print('usage: python utils/runner.py serve | run <script> [args...]', file=sys.stderr)
+        sys.exit(2)
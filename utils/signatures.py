@@ -0,0 +1,101 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, List, Optional, Sequence
+
+from eulith_web3.signer import Signer
+
+"""
+Collect signatures from several Safe owners at once.
+
+Owners' submissions (e.g. `ew3.v0.submit_enable_module_signature(auth_address, owner)`) run on `threshold` workers,
+so with KMS or other remote signers the whole round costs about one signer's latency instead of the sum. The other
+owners queue behind them and are only asked when an earlier one fails, so a healthy round doesn't make signers
+beyond the threshold sign at all. As soon as `threshold` owners have succeeded the call returns; submissions that
+haven't started are cancelled and ones already in flight finish in the background.
+"""
+
+
+@dataclass
+class OwnerResult:
+    owner: str
+    ok: bool
+    latency: float
+    error: Optional[str] = None
+
+
+@dataclass
+class SignatureReport:
+    threshold: int
+    results: List[OwnerResult] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)    # owners not waited for: threshold met first, or timed out
+    elapsed: float = 0.0
+
+    @property
+    def collected(self) -> int:
+        return sum(1 for r in self.results if r.ok)
+
+    @property
+    def met(self) -> bool:
+        return self.collected >= self.threshold
+
+    @property
+    def failures(self) -> List[OwnerResult]:
+        return [r for r in self.results if not r.ok]
+
+    def __str__(self):
+        lines = [f'{self.collected}/{self.threshold} signatures in {self.elapsed:.2f}s']
+        for r in self.results:
+            status = 'ok' if r.ok else f'failed: {r.error}'
+            lines.append(f'  {r.owner}: {status} ({r.latency * 1000:.0f}ms)')
+        for owner in self.skipped:
+            lines.append(f'  {owner}: {"not needed" if self.met else "no response before timeout"}')
+        return '\n'.join(lines)
+
+
+def _timed_submit(submit: Callable[[Signer], Any], owner: Signer) -> OwnerResult:
+    start = time.monotonic()
+    try:
+        status = submit(owner)
+    except Exception as e:
+        # Signers fail in signer-specific ways (RPC errors, KMS ClientErrors, timeouts); record and carry on
+        return OwnerResult(owner.address, False, time.monotonic() - start, f'{type(e).__name__}: {e}')
+
+    latency = time.monotonic() - start
+    if not status:
+        return OwnerResult(owner.address, False, latency, f'rejected ({status!r})')
+    return OwnerResult(owner.address, True, latency)
+
+
+def collect_signatures(submit: Callable[[Signer], Any], owners: Sequence[Signer], threshold: Optional[int] = None,
+                       max_workers: Optional[int] = None, timeout: Optional[float] = None) -> SignatureReport:
+    """
+    Call `submit(owner)` for the owners, in order and `max_workers` (`threshold` by default) at a time, until
+    `threshold` of them succeed (all of them by default). A submission succeeds when it returns a truthy status
+    without raising.
+
+    Never raises for individual owners; check `report.met` and `report.failures`.
+    """
+    threshold = len(owners) if threshold is None else threshold
+    report = SignatureReport(threshold=threshold)
+    start = time.monotonic()
+    deadline = None if timeout is None else start + timeout
+
+    executor = ThreadPoolExecutor(max_workers=max_workers or threshold or 1, thread_name_prefix='signature')
+    pending = {executor.submit(_timed_submit, submit, owner): owner for owner in owners}
+    try:
+        while pending and not report.met:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                report.results.append(future.result())
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    report.skipped = [owner.address for owner in pending.values()]
+    report.elapsed = time.monotonic() - start
+    return report
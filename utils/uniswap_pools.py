@@ -0,0 +1,80 @@
+from typing import Dict, Optional, Tuple
+
+from eth_utils import keccak, to_checksum_address
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.uniswap import EulithUniswapPoolLookupRequest, EulithUniswapV3Pool, UniswapPoolFee
+
+from utils.rpc_cache import RpcCache
+
+"""
+Uniswap V3 pool addresses are fully determined by (token0, token1, fee), so we derive them locally with CREATE2
+instead of asking the RPC for every pair we watch. Only chains without a known factory fall back to
+`ew3.v0.get_univ3_pool`.
+
+Note that a derived address is where the pool *would* live; if a pair has no pool for that fee tier, the first call
+against the handle will fail.
+"""
+
+UNISWAP_V3_FACTORY = '0x1F98431c8aD98523631AE4a59f267346ea31F984'
+UNISWAP_V3_POOL_INIT_CODE_HASH = bytes.fromhex('e34f199b19b2b4f47f68442619d555527d244f78a3297ea89325f843f87b8b54')
+
+# chain id -> factory. Ethereum, Arbitrum and Polygon all use the canonical deployment.
+UNISWAP_V3_FACTORIES = {
+    1: UNISWAP_V3_FACTORY,
+    42161: UNISWAP_V3_FACTORY,
+    137: UNISWAP_V3_FACTORY,
+}
+
+
+def sort_tokens(token_a: str, token_b: str) -> Tuple[str, str]:
+    a, b = to_checksum_address(token_a), to_checksum_address(token_b)
+    return (a, b) if int(a, 16) < int(b, 16) else (b, a)
+
+
+def compute_pool_address(token_a: str, token_b: str, fee: int, factory: str = UNISWAP_V3_FACTORY) -> str:
+    token0, token1 = sort_tokens(token_a, token_b)
+    # keccak256(abi.encode(token0, token1, fee))
+    salt = keccak(bytes.fromhex(token0[2:]).rjust(32, b'\0') +
+                  bytes.fromhex(token1[2:]).rjust(32, b'\0') +
+                  int(fee).to_bytes(32, 'big'))
+    digest = keccak(b'\xff' + bytes.fromhex(factory[2:]) + salt + UNISWAP_V3_POOL_INIT_CODE_HASH)
+    return to_checksum_address(digest[12:])
+
+
+class PoolRegistry:
+    def __init__(self, ew3: EulithWeb3, cache: Optional[RpcCache] = None):
+        self.ew3 = ew3
+        self.cache = cache or RpcCache.from_env()
+        self.factory = UNISWAP_V3_FACTORIES.get(ew3.chain_id)
+        self._pools: Dict[Tuple[str, str, int], EulithUniswapV3Pool] = {}
+
+    def get_pool(self, token_a: EulithERC20, token_b: EulithERC20, fee: UniswapPoolFee) -> EulithUniswapV3Pool:
+        token0, token1 = sort_tokens(token_a.address, token_b.address)
+        key = (token0, token1, int(fee))
+
+        pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+
+        cache_key = f'{token0}:{token1}:{int(fee)}'
+        address = self.cache.get(self.ew3, 'univ3_pools', cache_key)
+
+        if address is None and self.factory:
+            address = compute_pool_address(token0, token1, int(fee), self.factory)
+            self.cache.put(self.ew3, 'univ3_pools', cache_key, address)
+
+        if address is None:
+            # Unknown factory for this chain, so we have to ask
+            pool = self.ew3.v0.get_univ3_pool(EulithUniswapPoolLookupRequest(token_a=token_a, token_b=token_b, fee=fee))
+            self.cache.put(self.ew3, 'univ3_pools', cache_key, pool.address)
+        else:
+            pool = EulithUniswapV3Pool(self.ew3, address, UniswapPoolFee(int(fee)), token0, token1)
+
+        self._pools[key] = pool
+        return pool
+
+    def forget(self, token_a: EulithERC20, token_b: EulithERC20, fee: UniswapPoolFee):
+        token0, token1 = sort_tokens(token_a.address, token_b.address)
+        self._pools.pop((token0, token1, int(fee)), None)
+        self.cache.invalidate(self.ew3, 'univ3_pools', f'{token0}:{token1}:{int(fee)}')
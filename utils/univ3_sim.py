@@ -0,0 +1,412 @@
+import bisect
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from eulith_web3.erc20 import EulithERC20
+from eulith_web3.eulith_web3 import EulithWeb3
+from eulith_web3.uniswap import EulithUniswapV3Pool
+
+"""
+In-process Uniswap V3 exact-input swap simulator.
+
+The math is a straight port of the pool's TickMath, SqrtPriceMath and SwapMath libraries in exact integer
+arithmetic, so results match the `swap` the pool would run against the same state. A PoolSnapshot is fetched once
+(or loaded from a recorded JSON file), after which sizing a trade costs microseconds instead of a `get_quote`
+round trip per candidate size.
+
+`record_fixture` saves a snapshot together with the pool's own `get_quote` answers from the same block;
+tests/test_univ3_sim.py checks the simulator against every tests/fixtures/univ3_recorded_*.json saved that way.
+"""
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+
+Q96 = 1 << 96
+MAX_UINT256 = (1 << 256) - 1
+FEE_DENOMINATOR = 1_000_000
+_LOG2_TICK_BASE = math.log2(1.0001)
+
+_TICK_RATIOS = [
+    (0x2, 0xfff97272373d413259a46990580e213a),
+    (0x4, 0xfff2e50f5f656932ef12357cf3c7fdcc),
+    (0x8, 0xffe5caca7e10e4e61c3624eaa0941cd0),
+    (0x10, 0xffcb9843d60f6159c9db58835c926644),
+    (0x20, 0xff973b41fa98c081472e6896dfb254c0),
+    (0x40, 0xff2ea16466c96a3843ec78b326b52861),
+    (0x80, 0xfe5dee046a99a2a811c461f1969c3053),
+    (0x100, 0xfcbe86c7900a88aedcffc83b479aa3a4),
+    (0x200, 0xf987a7253ac413176f2b074cf7815e54),
+    (0x400, 0xf3392b0822b70005940c7a398e4b70f3),
+    (0x800, 0xe7159475a2c29b7443b29c7fa6e889d9),
+    (0x1000, 0xd097f3bdfd2022b8845ad8f792aa5825),
+    (0x2000, 0xa9f746462d870fdf8a65dc1f90e061e5),
+    (0x4000, 0x70d869a156d2a1b890bb3df62baf32f7),
+    (0x8000, 0x31be135f97d08fd981231505542fcfa6),
+    (0x10000, 0x9aa508b5b7a84e1c677de54f3e99bc9),
+    (0x20000, 0x5d6af8dedb81196699c329225ee604),
+    (0x40000, 0x2216e584f5fa1ea926041bedfe98),
+    (0x80000, 0x48a170391f7dc42444e8fa2),
+]
+
+
+def _div_rounding_up(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def _mul_div_rounding_up(a: int, b: int, denominator: int) -> int:
+    return _div_rounding_up(a * b, denominator)
+
+
+def get_sqrt_ratio_at_tick(tick: int) -> int:
+    abs_tick = abs(tick)
+    if abs_tick > MAX_TICK:
+        raise ValueError(f'tick {tick} out of range')
+
+    ratio = 0xfffcb933bd6fad37aa2d162d1a594001 if abs_tick & 0x1 else 1 << 128
+    for mask, multiplier in _TICK_RATIOS:
+        if abs_tick & mask:
+            ratio = (ratio * multiplier) >> 128
+
+    if tick > 0:
+        ratio = MAX_UINT256 // ratio
+
+    return (ratio >> 32) + (0 if ratio % (1 << 32) == 0 else 1)
+
+
+def get_tick_at_sqrt_ratio(sqrt_price_x96: int) -> int:
+    # Greatest tick whose sqrt ratio is <= the price; same answer as TickMath.getTickAtSqrtRatio. A float log gets
+    # within a tick or so, and the exact ratios settle the rest.
+    if not MIN_SQRT_RATIO <= sqrt_price_x96 < MAX_SQRT_RATIO:
+        raise ValueError(f'sqrt price {sqrt_price_x96} out of range')
+
+    tick = math.floor(2 * (math.log2(sqrt_price_x96) - 96) / _LOG2_TICK_BASE)
+    tick = min(max(tick, MIN_TICK), MAX_TICK)
+    while tick > MIN_TICK and get_sqrt_ratio_at_tick(tick) > sqrt_price_x96:
+        tick -= 1
+    while tick < MAX_TICK and get_sqrt_ratio_at_tick(tick + 1) <= sqrt_price_x96:
+        tick += 1
+    return tick
+
+
+def get_amount0_delta(sqrt_a: int, sqrt_b: int, liquidity: int, round_up: bool) -> int:
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    numerator1 = liquidity << 96
+    numerator2 = sqrt_b - sqrt_a
+    if round_up:
+        return _div_rounding_up(_mul_div_rounding_up(numerator1, numerator2, sqrt_b), sqrt_a)
+    return (numerator1 * numerator2 // sqrt_b) // sqrt_a
+
+
+def get_amount1_delta(sqrt_a: int, sqrt_b: int, liquidity: int, round_up: bool) -> int:
+    if sqrt_a > sqrt_b:
+        sqrt_a, sqrt_b = sqrt_b, sqrt_a
+    if round_up:
+        return _mul_div_rounding_up(liquidity, sqrt_b - sqrt_a, Q96)
+    return liquidity * (sqrt_b - sqrt_a) // Q96
+
+
+def _next_sqrt_price_from_amount0_rounding_up(sqrt_price: int, liquidity: int, amount: int) -> int:
+    if amount == 0:
+        return sqrt_price
+    numerator1 = liquidity << 96
+    product = amount * sqrt_price
+    # Mirror the contract's overflow branch so rounding matches exactly
+    if product <= MAX_UINT256:
+        denominator = numerator1 + product
+        if denominator <= MAX_UINT256:
+            return _mul_div_rounding_up(numerator1, sqrt_price, denominator)
+    return _div_rounding_up(numerator1, numerator1 // sqrt_price + amount)
+
+
+def _next_sqrt_price_from_amount1_rounding_down(sqrt_price: int, liquidity: int, amount: int) -> int:
+    return sqrt_price + (amount << 96) // liquidity
+
+
+def compute_swap_step(sqrt_price: int, sqrt_target: int, liquidity: int, amount_remaining: int, fee_pips: int):
+    """
+    One exact-input step of SwapMath.computeSwapStep. Returns (sqrt_price_next, amount_in, amount_out, fee_amount).
+    """
+    zero_for_one = sqrt_price >= sqrt_target
+    amount_remaining_less_fee = amount_remaining * (FEE_DENOMINATOR - fee_pips) // FEE_DENOMINATOR
+
+    if zero_for_one:
+        amount_in = get_amount0_delta(sqrt_target, sqrt_price, liquidity, True)
+    else:
+        amount_in = get_amount1_delta(sqrt_price, sqrt_target, liquidity, True)
+
+    if amount_remaining_less_fee >= amount_in:
+        sqrt_next = sqrt_target
+    elif zero_for_one:
+        sqrt_next = _next_sqrt_price_from_amount0_rounding_up(sqrt_price, liquidity, amount_remaining_less_fee)
+    else:
+        sqrt_next = _next_sqrt_price_from_amount1_rounding_down(sqrt_price, liquidity, amount_remaining_less_fee)
+
+    reached_target = sqrt_next == sqrt_target
+    if zero_for_one:
+        if not reached_target:
+            amount_in = get_amount0_delta(sqrt_next, sqrt_price, liquidity, True)
+        amount_out = get_amount1_delta(sqrt_next, sqrt_price, liquidity, False)
+    else:
+        if not reached_target:
+            amount_in = get_amount1_delta(sqrt_price, sqrt_next, liquidity, True)
+        amount_out = get_amount0_delta(sqrt_price, sqrt_next, liquidity, False)
+
+    if not reached_target:
+        fee_amount = amount_remaining - amount_in
+    else:
+        fee_amount = _mul_div_rounding_up(amount_in, fee_pips, FEE_DENOMINATOR - fee_pips)
+
+    return sqrt_next, amount_in, amount_out, fee_amount
+
+
+@dataclass
+class PoolSnapshot:
+    sqrt_price_x96: int
+    tick: int
+    liquidity: int
+    fee: int
+    tick_spacing: int
+    # initialized tick -> liquidityNet
+    ticks: Dict[int, int]
+    # bitmap words [min_word, max_word] the snapshot covers; swaps that run past them raise
+    min_word: int
+    max_word: int
+    token0: str = ''
+    token1: str = ''
+    block_number: Optional[int] = None
+    _compressed: List[int] = field(default_factory=list, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.ticks = {int(t): int(n) for t, n in self.ticks.items()}
+        self._compressed = sorted(t // self.tick_spacing for t in self.ticks)
+
+    def to_dict(self) -> dict:
+        return {
+            'sqrt_price_x96': str(self.sqrt_price_x96),
+            'tick': self.tick,
+            'liquidity': str(self.liquidity),
+            'fee': self.fee,
+            'tick_spacing': self.tick_spacing,
+            'ticks': {str(t): str(n) for t, n in sorted(self.ticks.items())},
+            'min_word': self.min_word,
+            'max_word': self.max_word,
+            'token0': self.token0,
+            'token1': self.token1,
+            'block_number': self.block_number,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> 'PoolSnapshot':
+        return cls(sqrt_price_x96=int(d['sqrt_price_x96']), tick=int(d['tick']), liquidity=int(d['liquidity']),
+                   fee=int(d['fee']), tick_spacing=int(d['tick_spacing']), ticks=d['ticks'],
+                   min_word=int(d['min_word']), max_word=int(d['max_word']), token0=d.get('token0', ''),
+                   token1=d.get('token1', ''), block_number=d.get('block_number'))
+
+    def save(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @classmethod
+    def load(cls, path: str) -> 'PoolSnapshot':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def next_initialized_tick(self, tick: int, lte: bool):
+        """
+        TickBitmap.nextInitializedTickWithinOneWord against the snapshot. Returns (next_tick, initialized).
+        """
+        compressed = tick // self.tick_spacing
+        if lte:
+            word = compressed >> 8
+            if word < self.min_word:
+                raise ValueError('swap moves below the ticks covered by this snapshot')
+            word_start = word << 8
+            i = bisect.bisect_right(self._compressed, compressed) - 1
+            if i >= 0 and self._compressed[i] >= word_start:
+                return self._compressed[i] * self.tick_spacing, True
+            return word_start * self.tick_spacing, False
+
+        compressed += 1
+        word = compressed >> 8
+        if word > self.max_word:
+            raise ValueError('swap moves above the ticks covered by this snapshot')
+        word_end = (word << 8) + 255
+        i = bisect.bisect_left(self._compressed, compressed)
+        if i < len(self._compressed) and self._compressed[i] <= word_end:
+            return self._compressed[i] * self.tick_spacing, True
+        return word_end * self.tick_spacing, False
+
+
+@dataclass
+class SwapResult:
+    amount_in: int          # including the fee
+    amount_out: int
+    fee_paid: int
+    sqrt_price_x96_after: int
+    tick_after: int
+
+    @property
+    def sqrt_limit_price(self) -> str:
+        # The same representation `get_quote` returns in its swap request
+        return str(self.sqrt_price_x96_after)
+
+
+@dataclass
+class _SwapState:
+    amount_in: int
+    amount_out: int
+    fee_paid: int
+    sqrt_price: int
+    tick: int
+    liquidity: int
+
+
+def _swap(snapshot: PoolSnapshot, zero_for_one: bool, amount_in: int, state: _SwapState,
+          boundaries: Optional[List[_SwapState]] = None) -> _SwapState:
+    """
+    The pool's swap loop for an exact-input amount, starting from `state`. When `boundaries` is given, the state at
+    the start of every step is appended to it.
+    """
+    sqrt_limit = MIN_SQRT_RATIO + 1 if zero_for_one else MAX_SQRT_RATIO - 1
+
+    sqrt_price, tick, liquidity = state.sqrt_price, state.tick, state.liquidity
+    spent, out, fees = state.amount_in, state.amount_out, state.fee_paid
+
+    while spent < amount_in and sqrt_price != sqrt_limit:
+        if boundaries is not None:
+            boundaries.append(_SwapState(spent, out, fees, sqrt_price, tick, liquidity))
+
+        tick_next, initialized = snapshot.next_initialized_tick(tick, zero_for_one)
+        tick_next = min(max(tick_next, MIN_TICK), MAX_TICK)
+        sqrt_next = get_sqrt_ratio_at_tick(tick_next)
+        if zero_for_one:
+            sqrt_target = sqrt_limit if sqrt_next < sqrt_limit else sqrt_next
+        else:
+            sqrt_target = sqrt_limit if sqrt_next > sqrt_limit else sqrt_next
+
+        step_start = sqrt_price
+        sqrt_price, step_in, step_out, fee_amount = compute_swap_step(
+            sqrt_price, sqrt_target, liquidity, amount_in - spent, snapshot.fee)
+        spent += step_in + fee_amount
+        out += step_out
+        fees += fee_amount
+
+        if sqrt_price == sqrt_next:
+            if initialized:
+                liquidity_net = snapshot.ticks[tick_next]
+                liquidity += -liquidity_net if zero_for_one else liquidity_net
+            tick = tick_next - 1 if zero_for_one else tick_next
+        elif sqrt_price != step_start:
+            tick = get_tick_at_sqrt_ratio(sqrt_price)
+
+    return _SwapState(spent, out, fees, sqrt_price, tick, liquidity)
+
+
+def _initial_state(snapshot: PoolSnapshot) -> _SwapState:
+    return _SwapState(0, 0, 0, snapshot.sqrt_price_x96, snapshot.tick, snapshot.liquidity)
+
+
+def _result(state: _SwapState) -> SwapResult:
+    return SwapResult(state.amount_in, state.amount_out, state.fee_paid, state.sqrt_price, state.tick)
+
+
+def simulate_swap(snapshot: PoolSnapshot, zero_for_one: bool, amount_in: int) -> SwapResult:
+    """
+    Exact-input swap of `amount_in` raw token units (fee included) against the snapshot.
+    """
+    return _result(_swap(snapshot, zero_for_one, amount_in, _initial_state(snapshot)))
+
+
+def simulate_ladder(snapshot: PoolSnapshot, zero_for_one: bool, amounts_in: Sequence[int]) -> List[SwapResult]:
+    """
+    Evaluate a whole ladder of exact-input sizes in one call.
+
+    The swap loop runs once for the largest size while recording the state at every step boundary. Every step but
+    the last is a full step whose cost doesn't depend on the amount left, so each smaller size resumes from the
+    last boundary it gets past and only computes its final partial step. Results are identical to calling
+    simulate_swap for each size.
+    """
+    if not amounts_in:
+        return []
+
+    boundaries: List[_SwapState] = []
+    _swap(snapshot, zero_for_one, max(amounts_in), _initial_state(snapshot), boundaries)
+    if not boundaries:
+        boundaries.append(_initial_state(snapshot))
+    spent_at = [b.amount_in for b in boundaries]
+
+    results = []
+    for amount in amounts_in:
+        start = boundaries[max(bisect.bisect_left(spent_at, amount) - 1, 0)]
+        results.append(_result(_swap(snapshot, zero_for_one, amount, start)))
+    return results
+
+
+def fetch_snapshot(ew3: EulithWeb3, pool: EulithUniswapV3Pool, words_each_side: int = 2,
+                   block_identifier='latest', max_workers: int = 16) -> PoolSnapshot:
+    """
+    Read the pool state the simulator needs, pinned to one block. `words_each_side` bitmap words (256 tick
+    spacings each) are loaded on either side of the current tick; larger trades need more.
+    """
+    contract = ew3.eth.contract(address=pool.address, abi=pool.abi)
+    functions = contract.functions
+    block = ew3.eth.get_block(block_identifier)['number']
+
+    slot0 = functions.slot0().call(block_identifier=block)
+    sqrt_price_x96, tick = slot0[0], slot0[1]
+    liquidity = functions.liquidity().call(block_identifier=block)
+    fee = functions.fee().call(block_identifier=block)
+    tick_spacing = functions.tickSpacing().call(block_identifier=block)
+
+    current_word = (tick // tick_spacing) >> 8
+    words = range(current_word - words_each_side, current_word + words_each_side + 1)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        bitmaps = list(executor.map(lambda w: functions.tickBitmap(w).call(block_identifier=block), words))
+
+        initialized = []
+        for word, bitmap in zip(words, bitmaps):
+            for bit in range(256):
+                if bitmap >> bit & 1:
+                    initialized.append(((word << 8) + bit) * tick_spacing)
+
+        tick_infos = executor.map(lambda t: functions.ticks(t).call(block_identifier=block), initialized)
+        ticks = {t: info[1] for t, info in zip(initialized, tick_infos)}
+
+    return PoolSnapshot(sqrt_price_x96=sqrt_price_x96, tick=tick, liquidity=liquidity, fee=fee,
+                        tick_spacing=tick_spacing, ticks=ticks, min_word=words[0], max_word=words[-1],
+                        token0=pool.get_token_zero().address, token1=pool.get_token_one().address,
+                        block_number=block)
+
+
+def record_fixture(ew3: EulithWeb3, pool: EulithUniswapV3Pool, sell_token: EulithERC20, amounts: Sequence[float],
+                   path: str, words_each_side: int = 4, attempts: int = 5) -> dict:
+    """
+    Save a snapshot plus `get_quote` outputs for selling each of `amounts` (whole `sell_token` units) to `path`.
+    Quotes are taken against the latest block, so the recording is retried until the head doesn't move while it
+    runs; otherwise the quotes and the snapshot could disagree.
+    """
+    for _ in range(attempts):
+        block = ew3.eth.block_number
+        snapshot = fetch_snapshot(ew3, pool, words_each_side, block)
+        quotes = []
+        for amount in amounts:
+            price, fee, swap_request = pool.get_quote(sell_token, amount)
+            quotes.append({'amount': amount, 'amount_in': str(sell_token.float_to_int(amount)), 'price': price,
+                           'sqrt_limit_price': str(swap_request['sqrt_limit_price'])})
+        if ew3.eth.block_number != block:
+            continue
+
+        fixture = {'source': f'get_quote at block {block}', 'snapshot': snapshot.to_dict(),
+                   'zero_for_one': sell_token.address == snapshot.token0, 'quotes': quotes}
+        with open(path, 'w') as f:
+            json.dump(fixture, f, indent=2)
+        return fixture
+
+    raise RuntimeError(f'a new block arrived during each of {attempts} attempts to record {path}')